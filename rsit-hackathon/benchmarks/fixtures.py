@@ -0,0 +1,141 @@
+import os
+import json
+from datetime import datetime, timedelta
+import numpy as np
+import h5py
+import rasterio
+from rasterio.transform import from_origin
+from rasterio.warp import transform as warp_transform
+
+# SPL4SMGP: global EASE-Grid 2.0 at 9 km, float32 with -9999 fill, chunked and gzip-compressed
+SMAP_SHAPE = (1624, 3856)
+SMAP_CHUNKS = (406, 964)
+SMAP_FILL = -9999.0
+
+# ECOSTRESS L2T tiles: 1568 x 1568 pixels of 70 m on an MGRS (UTM) grid, uint16 LST scaled by 0.02 K
+ECO_SIZE = 1568
+ECO_RES = 70.0
+ECO_CRS = "EPSG:32618"
+ECO_BLOCK = 256
+
+CENTER = (-77.45, 39.0)  # Ashburn, VA
+
+# Bumped when the generated data changes, so pools from older versions are not reused
+FIXTURE_VERSION = 2
+
+def ease2_grid():
+    """Separable lat/lon arrays of the global EASE-Grid 2.0 (equal-area rows, uniform columns)."""
+    rows, cols = SMAP_SHAPE
+    sin_max = np.sin(np.radians(85.044))
+    lat = np.degrees(np.arcsin(np.linspace(sin_max, -sin_max, rows))).astype(np.float32)
+    lon = (-180 + (np.arange(cols) + 0.5) * 360 / cols).astype(np.float32)
+    return np.repeat(lat[:, None], cols, axis=1), np.repeat(lon[None, :], rows, axis=0)
+
+def smap_name(t):
+    return f"SMAP_L4_SM_gph_{t:%Y%m%dT%H%M%S}_Vv7032_001.h5"
+
+def eco_name(t, suffix):
+    return f"ECOv002_L2T_LSTE_28527_006_18SUJ_{t:%Y%m%dT%H%M%S}_0710_01_{suffix}.tif"
+
+def write_smap(path, rng, grid):
+    """SPL4SMGP-shaped file: /cell_lat, /cell_lon and /Geophysical_Data/sm_* with ocean fill."""
+    lat, lon = grid
+    land = (np.abs(lat) < 60) & (np.sin(np.radians(lon) * 3) > -0.3)
+    with h5py.File(path, "w") as f:
+        for name, data in (("cell_lat", lat), ("cell_lon", lon)):
+            f.create_dataset(name, data=data, chunks=SMAP_CHUNKS, compression="gzip", compression_opts=2)
+        group = f.create_group("Geophysical_Data")
+        for name, scale in (("sm_surface", 0.35), ("sm_rootzone", 0.3)):
+            values = np.where(land, rng.random(SMAP_SHAPE, dtype=np.float32) * scale + 0.05, SMAP_FILL)
+            ds = group.create_dataset(name, data=values.astype(np.float32), chunks=SMAP_CHUNKS,
+                                      compression="gzip", compression_opts=2, fillvalue=SMAP_FILL)
+            ds.attrs["units"] = "m3 m-3"
+            ds.attrs["_FillValue"] = np.float32(SMAP_FILL)
+
+def write_ecostress(lst_path, qc_path, rng, nodata_fraction=0.1, qc_fraction=0.2):
+    """LST/QC GeoTIFF pair in UTM centered on CENTER, with a nodata swath and QC flags set."""
+    x, y = warp_transform("EPSG:4326", ECO_CRS, [CENTER[0]], [CENTER[1]])
+    half = ECO_SIZE * ECO_RES / 2
+    transform = from_origin(x[0] - half, y[0] + half, ECO_RES, ECO_RES)
+    profile = {"driver": "GTiff", "width": ECO_SIZE, "height": ECO_SIZE, "count": 1, "dtype": "uint16",
+               "crs": ECO_CRS, "transform": transform, "tiled": True, "blockxsize": ECO_BLOCK,
+               "blockysize": ECO_BLOCK, "compress": "deflate"}
+
+    kelvin = 295 + 15 * rng.random((ECO_SIZE, ECO_SIZE), dtype=np.float32)
+    lst = (kelvin / 0.02).astype(np.uint16)
+    swath = int(ECO_SIZE * nodata_fraction)
+    lst[:, ECO_SIZE - swath:] = 0
+
+    # Mandatory QA bits 0-1 plus cloud/data-quality bits on a random subset of pixels
+    qc = np.zeros((ECO_SIZE, ECO_SIZE), dtype=np.uint16)
+    flagged = rng.random((ECO_SIZE, ECO_SIZE)) < qc_fraction
+    qc[flagged] = rng.choice(np.array([0b01, 0b10, 0b11, 0b0100_0000_0001], dtype=np.uint16), flagged.sum())
+
+    with rasterio.open(lst_path, "w", nodata=0, **profile) as dst:
+        dst.write(lst, 1)
+    with rasterio.open(qc_path, "w", **profile) as dst:
+        dst.write(qc, 1)
+
+def make_fixtures(root, n_files, seed=0):
+    """Writes n_files SMAP and ECOSTRESS granules three hours apart into `root` (reused if present).
+
+    Every file draws from its own generator seeded by (seed, granule, product), so its content
+    does not depend on which files already exist or on the order cases grow the pool.
+    """
+    os.makedirs(root, exist_ok=True)
+    grid = None
+    start = datetime(2023, 7, 1, 16, 30)
+    for i in range(n_files):
+        t = start + timedelta(hours=3 * i)
+        smap_path = os.path.join(root, smap_name(t))
+        if not os.path.exists(smap_path):
+            grid = grid if grid is not None else ease2_grid()
+            write_smap(smap_path + ".tmp", np.random.default_rng([seed, i, 0]), grid)
+            os.replace(smap_path + ".tmp", smap_path)
+        eco_time = t + timedelta(minutes=20)
+        lst_path = os.path.join(root, eco_name(eco_time, "LST"))
+        if not os.path.exists(lst_path):
+            qc_path = os.path.join(root, eco_name(eco_time, "QC"))
+            write_ecostress(lst_path + ".tmp.tif", qc_path, np.random.default_rng([seed, i, 1]))
+            os.replace(lst_path + ".tmp.tif", lst_path)
+    return root
+
+def granule_dir(root, n_files):
+    """Directory with links to the first n_files granule pairs of a fixture pool."""
+    root = os.path.join(root, f"v{FIXTURE_VERSION}")
+    make_fixtures(os.path.join(root, "pool"), n_files)
+    target = os.path.join(root, f"files-{n_files}")
+    os.makedirs(target, exist_ok=True)
+    names = sorted(os.listdir(os.path.join(root, "pool")))
+    smap = [n for n in names if n.endswith(".h5")][:n_files]
+    eco = [n for n in names if n.endswith("_LST.tif")][:n_files]
+    for name in smap + eco + [n.replace("_LST.tif", "_QC.tif") for n in eco]:
+        link = os.path.join(target, name)
+        if not os.path.lexists(link):
+            os.symlink(os.path.join(root, "pool", name), link)
+    return target
+
+def aoi_catalog(path, n_aois, span=0.3):
+    """{name: bbox} catalog of n_aois boxes tiled around CENTER, all within the ECOSTRESS tile."""
+    side = int(np.ceil(np.sqrt(n_aois)))
+    step = 0.8 / side
+    catalog = {}
+    for i in range(n_aois):
+        r, c = divmod(i, side)
+        minx = CENTER[0] - 0.4 + c * step
+        miny = CENTER[1] - 0.4 + r * step
+        catalog[f"aoi{i}"] = [minx, miny, minx + min(span, step), miny + min(span, step)]
+    with open(path, "w") as f:
+        json.dump(catalog, f)
+    return path
+
+def rsi_columns(n_aois, n_days, seed=0):
+    """Daily (date, aoi, rsi, price) columns shaped like fetch_past_data_from_es output."""
+    rng = np.random.default_rng(seed)
+    dates = np.datetime64("2023-07-01") + np.arange(n_days)
+    return {
+        "date": np.tile(dates, n_aois).astype("datetime64[ns]"),
+        "aoi": np.repeat([f"aoi{i}" for i in range(n_aois)], n_days).astype(object),
+        "rsi": rng.random(n_aois * n_days),
+        "price": 130 + np.cumsum(rng.normal(0, 1, n_aois * n_days)),
+    }
@@ -0,0 +1,199 @@
+"""Offline benchmarks for the processing and merge stages.
+
+Each case runs in its own subprocess so peak RSS is measured per case. Results are
+compared with a JSON baseline and cases slower or larger than the threshold are flagged.
+
+    python benchmarks/run.py                    # compare with benchmarks/baseline.json
+    python benchmarks/run.py --quick            # smaller scaling grid
+    python benchmarks/run.py --update-baseline  # record this machine's baseline
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import contextlib
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(HERE, "..", "src")
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+DEFAULT_FIXTURES = os.path.join(tempfile.gettempdir(), "rsit-bench-fixtures")
+
+# case -> list of parameter sets (full grid, quick grid)
+GRID = {
+    "smap": ([{"files": 1}, {"files": 4}], [{"files": 1}]),
+    "ecostress": ([{"files": 1}, {"files": 4}], [{"files": 1}]),
+    "process_main": ([{"files": 2, "aois": 1}, {"files": 8, "aois": 1}, {"files": 8, "aois": 25}],
+                     [{"files": 2, "aois": 1}, {"files": 2, "aois": 9}]),
+    "merge": ([{"aois": 10, "days": 7}, {"aois": 1000, "days": 7}, {"aois": 1000, "days": 90}],
+              [{"aois": 10, "days": 7}, {"aois": 200, "days": 30}]),
+}
+
+def case_id(case, params):
+    return f"{case}[" + ",".join(f"{k}={v}" for k, v in sorted(params.items())) + "]"
+
+# --- Cases (run in the child process) ---
+
+def bench_smap(params, fixtures):
+    import fixtures as fx
+    from process_data import get_smap_data
+    root = fx.granule_dir(fixtures, params["files"])
+    paths = sorted(p for p in os.listdir(root) if p.endswith(".h5"))
+    bbox = (-77.6, 38.85, -77.3, 39.15)
+    return lambda: [get_smap_data(os.path.join(root, p), bbox) for p in paths]
+
+def bench_ecostress(params, fixtures):
+    import fixtures as fx
+    from process_data import get_ecostress_data
+    root = fx.granule_dir(fixtures, params["files"])
+    paths = sorted(p for p in os.listdir(root) if p.endswith("_LST.tif"))
+    bbox = (-77.6, 38.85, -77.3, 39.15)
+    return lambda: [get_ecostress_data(os.path.join(root, p), bbox) for p in paths]
+
+def bench_process_main(params, fixtures):
+    import fixtures as fx
+    import process_data
+    root = fx.granule_dir(fixtures, params["files"])
+    catalog = fx.aoi_catalog(os.path.join(fixtures, f"aois-{params['aois']}.json"), params["aois"])
+    os.environ.update({"DOWNLOAD_DIR": root, "AOI_CATALOG": catalog, "PROCESS_MODE": "batch",
+                       "OUTPUT_FILE": os.path.join(fixtures, "out", "result.json")})
+    os.environ.pop("RESULT_STORE", None)
+    return process_data.main
+
+def bench_merge(params, fixtures):
+    import fixtures as fx
+    from merge_finance import merge_and_forecast
+    columns = fx.rsi_columns(params["aois"], params["days"])
+    return lambda: merge_and_forecast(columns, 3, forecast_engine="local")
+
+CASES = {"smap": bench_smap, "ecostress": bench_ecostress, "process_main": bench_process_main, "merge": bench_merge}
+
+def child(case, params, fixtures, repeat):
+    """Times one case: the best of `repeat` runs after setup and a warm-up, plus the process's peak RSS."""
+    sys.path[:0] = [SRC, HERE]
+    # Keep the window/schema caches out of the user's cache directory
+    os.environ["SMAP_WINDOW_INDEX"] = os.path.join(fixtures, "smap_windows.json")
+    os.environ["HDF5_SCHEMA_FILE"] = os.path.join(fixtures, "hdf5_schema.json")
+    os.environ.pop("GRANULE_CACHE_DIR", None)
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        run = CASES[case](params, fixtures)
+        run()  # Warm-up: imports, window/schema caches, OS page cache
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - t0)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_kb //= 1024  # bytes on macOS
+    print(json.dumps({"seconds": min(times), "peak_rss_mb": round(peak_kb / 1024, 1)}))
+
+def prepare(params, fixtures):
+    """Generates the fixtures a case needs up front, so their cost stays out of its timing."""
+    sys.path.insert(0, HERE)
+    import fixtures as fx
+    if "files" in params:
+        fx.granule_dir(fixtures, params["files"])
+
+def _run_child(*args):
+    # Linux keeps ru_maxrss across exec, so the parent never loads data itself and each
+    # child starts from a small process
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), *args], capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def run_case(case, params, fixtures, repeat):
+    prepared = _run_child("--prepare", json.dumps(params), "--fixtures", fixtures)
+    if "error" in prepared:
+        return prepared
+    return _run_child("--child", case, json.dumps(params), "--fixtures", fixtures, "--repeat", str(repeat))
+
+def compare(result, baseline, threshold, min_delta=0.05):
+    """Regression flags for one case: 'time' and/or 'rss' beyond (1 + threshold) x baseline.
+    Slowdowns under `min_delta` seconds are ignored; they are timer noise on tiny cases."""
+    if not baseline or "error" in result:
+        return []
+    flags = []
+    if result["seconds"] > max(baseline["seconds"] * (1 + threshold), baseline["seconds"] + min_delta):
+        flags.append("time")
+    if result["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + threshold):
+        flags.append("rss")
+    return flags
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run RSIT benchmarks on synthetic fixtures.")
+    parser.add_argument("--quick", action="store_true", help="Use the small scaling grid")
+    parser.add_argument("--cases", default=",".join(CASES), help="Comma-separated cases to run")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case (best is kept)")
+    parser.add_argument("--fixtures", default=os.environ.get("BENCH_FIXTURES", DEFAULT_FIXTURES))
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="Write results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative slowdown/growth")
+    parser.add_argument("--min-delta", type=float, default=0.05, help="Ignore slowdowns below this many seconds")
+    parser.add_argument("--child", nargs=2, metavar=("CASE", "PARAMS"), help=argparse.SUPPRESS)
+    parser.add_argument("--prepare", metavar="PARAMS", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.child:
+        child(args.child[0], json.loads(args.child[1]), args.fixtures, args.repeat)
+        return 0
+    if args.prepare:
+        prepare(json.loads(args.prepare), args.fixtures)
+        print(json.dumps({"prepared": True}))
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        baseline = {"cases": {}}
+        if not args.update_baseline:
+            # Timings are machine-specific, so no baseline ships with the repo
+            print(f"No baseline at {args.baseline}: nothing will be flagged. "
+                  f"Record one on this machine first with --update-baseline.")
+
+    print(f"Fixtures: {args.fixtures}")
+    results, regressions, unbaselined = {}, [], []
+    for case in args.cases.split(","):
+        for params in GRID[case][1 if args.quick else 0]:
+            cid = case_id(case, params)
+            result = run_case(case, params, args.fixtures, args.repeat)
+            results[cid] = result
+            if "error" in result:
+                print(f"{cid:<45} ERROR {result['error']}")
+                continue
+            flags = compare(result, baseline["cases"].get(cid), args.threshold, args.min_delta)
+            base = baseline["cases"].get(cid)
+            ref = f" (baseline {base['seconds']:.3f}s, {base['peak_rss_mb']:.0f} MB)" if base else " (no baseline)"
+            if not base:
+                unbaselined.append(cid)
+            print(f"{cid:<45} {result['seconds']:8.3f}s {result['peak_rss_mb']:8.1f} MB{ref}"
+                  + (f"  REGRESSION: {', '.join(flags)}" if flags else ""))
+            if flags:
+                regressions.append(cid)
+
+    if args.update_baseline:
+        baseline["cases"].update({k: v for k, v in results.items() if "error" not in v})
+        baseline["machine"] = {"python": platform.python_version(), "platform": platform.platform(),
+                               "cpus": os.cpu_count()}
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+
+    if unbaselined and not args.update_baseline:
+        print(f"{len(unbaselined)} case(s) not compared, missing from the baseline: {', '.join(unbaselined)}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
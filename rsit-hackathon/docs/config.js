@@ -1,4 +1,9 @@
 window.RSIT_DATA_FILE = "data/merged_with_forecast.json";
+// Per-AOI monthly chunks; RSIT_DATA_FILE is only used when the manifest is missing
+window.RSIT_MANIFEST_FILE = "data/aoi/manifest.json";
+window.RSIT_MONTHS = 3;
+// Hourly/daily/weekly/monthly RSI rollups (src/rollups.py); the chart uses the resolution that fits its width
+window.RSIT_ROLLUP_MANIFEST = "data/rollups/manifest.json";
 window.RSIT_AOIS = {
   ashburn: { lat: 39.0438, lon: -77.4874, name: "Ashburn, VA" },
   phoenix: { lat: 33.4484, lon: -112.0740, name: "Phoenix, AZ" },
@@ -21,6 +21,9 @@ map.on('drag', function() { map.panInsideBounds(bounds, { animate: false }); });
 // --- Global State ---
 let chart;
 let fullData = [];
+let manifest = null;
+const rollupRows = {};
+const loadedAOIs = new Set();
 const selectedAOIs = new Set();
 const aoiMarkers = {};
 
@@ -46,7 +49,7 @@ function toggleAoiSelection(aoiKey) {
         if(checkbox) checkbox.checked = true;
     }
     updateMarkerStyles();
-    updateRsiPriceChart(); 
+    Promise.all([loadAoiChunks(aoiKey), loadRollups(aoiKey)]).then(updateRsiPriceChart);
 }
 
 function createAoiCheckboxes() {
@@ -109,18 +112,36 @@ function updateRsiPriceChart() {
     const aoiColors = ['#ff4d7a', '#ff9f40', '#ffcd56'];
     const selectedAoiKeys = Array.from(selectedAOIs);
 
-    const rsiDs = selectedAoiKeys.map((a,i)=>({ 
-      label:`RSI (${(window.RSIT_AOIS[a]?.name||a)})`,
-      data: datesWithAny
+    // Observed RSI comes from the rollup buckets when available; forecasts always from the data file
+    const rsiPoints = a => {
+      const points = datesWithAny
         .map(dt => {
           const v = byAoi[a]?.[dt]?.rsi;
           return (v==null) ? null : {x:new Date(dt), y:v, kind:byAoi[a][dt]?.kind||'past'};
         })
-        .filter(Boolean),
+        .filter(Boolean);
+      if (!rollupRows[a]) return points;
+      const observed = rollupRows[a].map(r => ({x:r.x, y:r.mean, kind:'past'}));
+      return observed.concat(points.filter(p => p.kind === 'forecast')).sort((p, q) => p.x - q.x);
+    };
+
+    const rsiDs = selectedAoiKeys.map((a,i)=>({ 
+      label:`RSI (${(window.RSIT_AOIS[a]?.name||a)})`,
+      data: rsiPoints(a),
       yAxisID:'y-rsi', borderColor: aoiColors[i % aoiColors.length], backgroundColor: aoiColors[i % aoiColors.length]+'26', tension:.3,
       segment:{ borderDash: ctx => ctx.p1.raw.kind==='forecast' ? [5,5] : undefined }
     }));
 
+    // Min-max band of each rollup bucket, filled between the two (unlabelled) edges
+    const bandDs = selectedAoiKeys.filter(a => rollupRows[a]).flatMap(a => {
+      const color = aoiColors[selectedAoiKeys.indexOf(a) % aoiColors.length];
+      const edge = key => rollupRows[a].map(r => ({x:r.x, y:r[key]}));
+      return [
+        { label:'', data:edge('max'), yAxisID:'y-rsi', borderWidth:0, backgroundColor:color+'1a', fill:'+1', tension:.3 },
+        { label:'', data:edge('min'), yAxisID:'y-rsi', borderWidth:0, fill:false, tension:.3 }
+      ];
+    });
+
     const priceDs = selectedAoiKeys.map((a,i)=>({ 
       label:`Price (${(window.RSIT_AOIS[a]?.name||a)}) (shift3)`,
       data: datesWithAny
@@ -136,7 +157,7 @@ function updateRsiPriceChart() {
       segment:{ borderDash: ctx => ctx.p1.raw.kind==='forecast' ? [5,5] : undefined }
     }));
 
-    const datasets = [...rsiDs, ...priceDs];
+    const datasets = [...rsiDs, ...bandDs, ...priceDs];
 
     const firstForecastDate = datesWithAny.find(d =>
         fullData.some(x => x.date === d && x.kind === 'forecast')
@@ -149,7 +170,8 @@ function updateRsiPriceChart() {
             responsive: true, maintainAspectRatio: false, parsing: false, spanGaps: true,
             elements: { point: { radius: 0 } },
             plugins:{
-              legend:{position:'top'}, tooltip:{mode:'index',intersect:false}, 
+              legend:{position:'top', labels:{filter: item => item.text !== ''}},
+              tooltip:{mode:'index',intersect:false, filter: item => item.dataset.label !== ''}, 
               annotation:{ annotations:{
                 forecastBox:{type:'box', xMin:firstForecastDate, xMax:datesWithAny[datesWithAny.length-1], backgroundColor:'rgba(100,100,100,0.08)', borderColor:'rgba(0,0,0,0)'}, 
                 warnLine:{type:'line', yMin:window.RSIT_THRESHOLDS.warn, yMax:window.RSIT_THRESHOLDS.warn, yScaleID:'y-rsi', borderColor:'orange', borderWidth:2, borderDash:[5,5], label:{content:'Warn',display:true}}, 
@@ -164,21 +186,65 @@ function updateRsiPriceChart() {
     });
 }
 
-// --- Initial Load ---
-createAoiCheckboxes();
+// --- Data Loading ---
+// Columnar chunk {date:[...], rsi:[...], ...} -> row objects used by the chart
+function chunkRows(chunk) {
+    const columns = Object.keys(chunk).filter(c => Array.isArray(chunk[c]));
+    return chunk.date.map((_, i) => {
+        const row = { aoi: chunk.aoi };
+        columns.forEach(c => { row[c] = chunk[c][i]; });
+        return row;
+    });
+}
 
-const url = (window.RSIT_DATA_FILE || 'data/merged_from_es.json') + '?t=' + Date.now();
-fetch(url, { cache: 'no-store' })
-  .then(r => r.json())
-  .then(arr => {
-    if(!Array.isArray(arr) || arr.length===0) throw new Error('No RSI data');
-    fullData = arr.sort((a,b)=> (a.date<b.date?-1:1));
+// Fetches only the last RSIT_MONTHS monthly chunks of one AOI, once
+function loadAoiChunks(aoiKey) {
+    if (!manifest || loadedAOIs.has(aoiKey)) return Promise.resolve();
+    loadedAOIs.add(aoiKey);
+    const base = window.RSIT_MANIFEST_FILE.replace(/[^/]*$/, '');
+    const chunks = (manifest.aois[aoiKey]?.chunks || []).slice(-(window.RSIT_MONTHS || 3));
+    return Promise.all(chunks.map(c => fetch(`${base}${c.file}?t=${manifest.updated}`).then(r => r.json())))
+        .then(parts => {
+            parts.forEach(p => { fullData = fullData.concat(chunkRows(p)); });
+            fullData.sort((a,b)=> (a.date<b.date?-1:1));
+        })
+        .catch(e => { loadedAOIs.delete(aoiKey); console.error(e); });
+}
+
+// Rollup manifest, or null when the rollups are not published
+const rollupManifest = window.RSIT_ROLLUP_MANIFEST
+  ? fetch(window.RSIT_ROLLUP_MANIFEST + '?t=' + Date.now(), { cache: 'no-store' })
+      .then(r => r.ok ? r.json() : null)
+      .catch(() => null)
+  : Promise.resolve(null);
+
+// Finest resolution with at most `width` buckets over the range, as rollups.select_resolution
+function pickResolution(resolutions, entry, startMs, endMs, width) {
+    const available = Object.keys(resolutions).filter(r => entry[r]);
+    return available.find(r => (endMs - startMs) / 1000 / resolutions[r] <= width) || available[available.length - 1];
+}
 
-    const latestByAoi = fullData.reduce((acc, d) => {
-        if(d.kind !== 'forecast') acc[d.aoi] = d;
-        return acc;
-    }, {});
+// Fetches one AOI's rollup rows for the last RSIT_MONTHS months at the chart's resolution, once
+function loadRollups(aoiKey) {
+    return rollupManifest.then(m => {
+        const entry = m?.aois?.[aoiKey];
+        if (!entry || rollupRows[aoiKey]) return;
+        const endMs = Date.parse(m.high_water || Object.values(entry)[0].end);
+        const startMs = endMs - (window.RSIT_MONTHS || 3) * 30 * 86400e3;
+        const width = document.getElementById('rsiPriceChart').clientWidth || 800;
+        const resolution = pickResolution(m.resolutions, entry, startMs, endMs, width);
+        const base = window.RSIT_ROLLUP_MANIFEST.replace(/[^/]*$/, '');
+        return fetch(`${base}${entry[resolution].file}?t=${m.updated}`)
+            .then(r => r.json())
+            .then(p => {
+                rollupRows[aoiKey] = p.bucket
+                    .map((b, i) => ({x:new Date(b), mean:p.rsi_mean[i], min:p.rsi_min[i], max:p.rsi_max[i]}))
+                    .filter(r => r.mean != null && r.x >= startMs);
+            });
+    }).catch(e => console.warn(`Rollups unavailable for ${aoiKey}:`, e));
+}
 
+function addAoiMarkers(latestByAoi) {
     Object.keys(window.RSIT_AOIS).forEach(aoiKey => {
         const aoiConfig = window.RSIT_AOIS[aoiKey];
         if (!aoiConfig) return;
@@ -195,10 +261,60 @@ fetch(url, { cache: 'no-store' })
         marker.on('click', () => toggleAoiSelection(aoiKey));
         aoiMarkers[aoiKey] = marker;
     });
+}
 
-    updateMarkerStyles();
-    updateRsiPriceChart();
-  })
+function loadFromManifest() {
+    return fetch(window.RSIT_MANIFEST_FILE + '?t=' + Date.now(), { cache: 'no-store' })
+      .then(r => { if (!r.ok) throw new Error(`Manifest ${r.status}`); return r.json(); })
+      .then(m => {
+        manifest = m;
+        const latestByAoi = Object.fromEntries(Object.entries(m.aois).map(([k, a]) => [k, a.latest]));
+        addAoiMarkers(latestByAoi);
+        updateMarkerStyles();
+        return Promise.all([...selectedAOIs].flatMap(a => [loadAoiChunks(a), loadRollups(a)]));
+      })
+      .then(() => {
+        if (fullData.length === 0) throw new Error('No RSI data');
+        updateRsiPriceChart();
+      });
+}
+
+// Single row-oriented file with every AOI
+function loadFromDataFile() {
+    const url = (window.RSIT_DATA_FILE || 'data/merged_from_es.json') + '?t=' + Date.now();
+    return fetch(url, { cache: 'no-store' })
+      .then(r => r.json())
+      .then(arr => {
+        if(!Array.isArray(arr) || arr.length===0) throw new Error('No RSI data');
+        fullData = arr.sort((a,b)=> (a.date<b.date?-1:1));
+
+        const latestByAoi = fullData.reduce((acc, d) => {
+            if(d.kind !== 'forecast') acc[d.aoi] = d;
+            return acc;
+        }, {});
+
+        addAoiMarkers(latestByAoi);
+        updateMarkerStyles();
+        return Promise.all([...selectedAOIs].map(loadRollups));
+      })
+      .then(updateRsiPriceChart);
+}
+
+// --- Initial Load ---
+createAoiCheckboxes();
+
+const initialLoad = window.RSIT_MANIFEST_FILE
+  ? loadFromManifest().catch(e => {
+      console.warn('Falling back to RSIT_DATA_FILE:', e);
+      manifest = null;
+      fullData = [];
+      Object.values(aoiMarkers).forEach(m => m.remove());
+      Object.keys(aoiMarkers).forEach(k => delete aoiMarkers[k]);
+      return loadFromDataFile();
+    })
+  : loadFromDataFile();
+
+initialLoad
   .catch(e => {
     console.error(e);
     const chartCtx = document.getElementById('rsiPriceChart').getContext('2d');
@@ -2,41 +2,33 @@
 set -euo pipefail
 
 # 입력 파라미터(기본값 제공)
-export AOI_NAME="${AOI_NAME:-ashburn}"    # ashburn | dublin | shanghai
+export AOI_NAME="${AOI_NAME:-ashburn}"    # aois.geojson의 AOI 이름 (ashburn | dublin | shanghai | ...)
 export START_DATE="${START_DATE:-2023-07-15}"
 export END_DATE="${END_DATE:-2023-07-15}"
 export MAX_FILES="${MAX_FILES:-2}"
+# BBOX를 지정하지 않으면 pipeline.py가 aois.geojson에서 AOI_NAME의 좌표를 찾음
 
-# AOI 좌표 프리셋
-if [ "$AOI_NAME" = "ashburn" ]; then
-  export BBOX="-77.6,38.85,-77.3,39.15"
-elif [ "$AOI_NAME" = "dublin" ]; then
-  export BBOX="-6.54,53.23,-6.02,53.48"
-elif [ "$AOI_NAME" = "shanghai" ]; then
-  export BBOX="121.0,31.0,121.8,31.6"
-else
-  echo "Unknown AOI_NAME=$AOI_NAME"; exit 1
-fi
-
-# 임시 폴더 및 출력 경로 설정
+# 다운로드 폴더 및 출력 경로 설정
+# DOWNLOAD_DIR에는 캐시를 가리키는 링크만 있으므로 다음 실행에서 변경 여부 판단을 위해 유지
+# (이번 실행의 파일 목록은 granules.json에 기록되므로 이전 AOI/날짜의 링크는 처리되지 않음)
 export DOWNLOAD_DIR="./tmp_data"
+# 공유 그래뉼 캐시(여러 AOI 실행이 함께 사용, LRU로 용량 관리)
+export GRANULE_CACHE_DIR="${GRANULE_CACHE_DIR:-$HOME/.cache/rsit/granules}"
+export GRANULE_CACHE_MAX_BYTES="${GRANULE_CACHE_MAX_BYTES:-50000000000}"
 export OUTPUT_FILE="./docs/data/result.json"
+export TIME_RANGE="$START_DATE,$END_DATE"
 mkdir -p "$DOWNLOAD_DIR" "$(dirname "$OUTPUT_FILE")"
 
 # 파이썬 가상환경 활성화(필요 시 경로 수정)
 PY=./.venv/bin/python
 
-# 환경 변수 설정
-export TIME_RANGE="$START_DATE,$END_DATE"
-
-# 1) 임시 다운로드
-echo "--- Running prepare_data.py ---"
-$PY ./src/prepare_data.py
-
-# 2) 처리 → 결과 JSON을 docs/data로
-echo "\n--- Running process_data.py ---"
-$PY ./src/process_data.py
-
-# 3) 임시 데이터 정리(선택)
-rm -rf "$DOWNLOAD_DIR"
-echo "\nDONE: $OUTPUT_FILE updated for $AOI_NAME ($START_DATE..$END_DATE)"
+# 다운로드 → 처리, 금융 데이터는 병렬로 실행. 입력이 바뀌지 않은 단계는 건너뜀
+# Elasticsearch 자격 증명이 있으면 처리 결과를 인덱스에 업서트(ingest)까지 수행
+TARGETS="process finance"
+if [ -f ../.secrets/es_url ]; then
+  TARGETS="$TARGETS ingest"
+fi
+# END_DATE가 과거이면 prepare는 같은 조건으로 다시 검색하지 않음(오늘 이후이면 하루 한 번 재검색)
+# 늦게 게시된 그래뉼을 다시 찾으려면: ./run_local.sh --force prepare
+$PY ./src/pipeline.py $TARGETS "$@"
+echo "DONE: $OUTPUT_FILE updated for $AOI_NAME ($START_DATE..$END_DATE)"
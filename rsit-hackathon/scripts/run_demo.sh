@@ -7,14 +7,16 @@ if [ ! -d ".venv" ]; then
 fi
 source .venv/bin/activate
 
-echo "--- Installing dependencies ---"
-pip install -r requirements.txt
-
-echo "--- Seeding Elasticsearch with initial data ---"
-python src/seed_es.py
+# Reinstall only when requirements.txt changed since the last install
+STAMP=".venv/.requirements.sha256"
+if ! sha256sum -c --status "$STAMP" 2>/dev/null; then
+    echo "--- Installing dependencies ---"
+    pip install -r requirements.txt
+    sha256sum requirements.txt > "$STAMP"
+fi
 
-echo "--- Running data processing and forecasting pipeline ---"
-python src/merge_finance.py
+echo "--- Seeding Elasticsearch and running the forecasting pipeline ---"
+python src/pipeline.py merge rollups "$@"
 
 echo "--- Demo setup complete! ---"
 echo "You can now serve the 'docs' directory with a local web server."
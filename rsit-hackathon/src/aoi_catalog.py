@@ -0,0 +1,29 @@
+import json
+from ecostress_grid import bbox_polygon, geometry_points
+
+def make_aoi(name, bbox=None, geometry=None):
+    """AOI record used across the pipeline: a name, a WGS84 geometry and its (minx, miny, maxx, maxy) bbox."""
+    if geometry is None:
+        geometry = bbox_polygon(bbox)
+    if bbox is None:
+        xs, ys = zip(*geometry_points(geometry['coordinates']))
+        bbox = (min(xs), min(ys), max(xs), max(ys))
+    return {"name": name, "bbox": tuple(float(v) for v in bbox), "geometry": geometry}
+
+def load_catalog(path):
+    """Loads AOIs from a GeoJSON FeatureCollection (named by a 'name' property) or a JSON
+    object mapping names to [minx, miny, maxx, maxy] bboxes."""
+    with open(path) as f:
+        data = json.load(f)
+
+    if data.get("type") == "FeatureCollection":
+        aois = []
+        for i, feature in enumerate(data["features"]):
+            name = (feature.get("properties") or {}).get("name") or feature.get("id") or f"aoi-{i}"
+            geometry = feature["geometry"]
+            if geometry["type"] not in ("Polygon", "MultiPolygon"):
+                raise ValueError(f"AOI '{name}' must be a Polygon or MultiPolygon, got {geometry['type']}.")
+            aois.append(make_aoi(name, geometry=geometry))
+        return aois
+
+    return [make_aoi(name, bbox=bbox) for name, bbox in data.items()]
@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import time
+import fcntl
+import argparse
+from contextlib import contextmanager
+import numpy as np
+
+# Per-AOI directory of append-only raw arrays, one file per variable, plus index.json mapping
+# each granule's slice (time, offset, pixel count) into them. Arrays are read back with
+# np.memmap, so re-analysis never decodes a granule again.
+#   lst  stream: lst.f4 (raw, unscaled LST values) and qc.u2, AOI pixels of one ECOSTRESS granule
+#   sm   stream: sm_surface.f4 and sm_rootzone.f4, the SMAP window cells (fill as NaN)
+STREAMS = {
+    "lst": {"lst": np.float32, "qc": np.uint16},
+    "sm": {"sm_surface": np.float32, "sm_rootzone": np.float32},
+}
+INDEX_FILE = "index.json"
+# Pixels reduced per pass in recompute_rsi, bounding its temporaries whatever the history length
+CHUNK_PIXELS = 4 * 1024 ** 2
+
+def cube_root():
+    """Cube directory from AOI_CUBE_DIR, or None when cubes are not written."""
+    root = os.environ.get("AOI_CUBE_DIR")
+    return os.path.abspath(root) if root else None
+
+def aoi_dir(root, aoi_name):
+    return os.path.join(root, aoi_name.replace(os.sep, "_"))
+
+def _empty_index():
+    return {stream: {"granule": [], "time": [], "offset": [], "count": [], "nodata": []} for stream in STREAMS}
+
+def load_index(directory):
+    try:
+        with open(os.path.join(directory, INDEX_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return _empty_index()
+
+@contextmanager
+def _locked(directory):
+    """Serializes appends to one AOI across processes (extraction may run in a process pool)."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+def append(root, aoi_name, stream, timestamp, granule, arrays, nodata=None):
+    """Appends one granule's pixels for an AOI; a granule already in the index is skipped.
+
+    `arrays` maps each variable of the stream to a 1-D array of the same length. Data is
+    appended and synced before the index is replaced, so a crash leaves at most unreferenced
+    bytes at the end of a file. Returns True if the slice was written.
+    """
+    directory = aoi_dir(root, aoi_name)
+    with _locked(directory):
+        index = load_index(directory)
+        entries = index[stream]
+        if granule in entries["granule"]:
+            return False
+        count = None
+        for name, dtype in STREAMS[stream].items():
+            values = np.ascontiguousarray(arrays[name], dtype=dtype).ravel()
+            count = values.size if count is None else count
+            if values.size != count:
+                raise ValueError(f"Arrays of stream '{stream}' differ in length.")
+        offset = None
+        for name, dtype in STREAMS[stream].items():
+            path = os.path.join(directory, f"{name}.{np.dtype(dtype).str[1:]}")
+            with open(path, "ab") as f:
+                # Offsets come from the file size, so orphaned bytes from a crash are skipped over
+                position = f.tell() // np.dtype(dtype).itemsize
+                offset = position if offset is None else offset
+                if position != offset:
+                    raise ValueError(f"Cube files of {aoi_name} are out of step; rebuild the cube.")
+                np.ascontiguousarray(arrays[name], dtype=dtype).ravel().tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+        entries["granule"].append(granule)
+        entries["time"].append(int(timestamp.timestamp()) if hasattr(timestamp, "timestamp") else int(timestamp))
+        entries["offset"].append(int(offset))
+        entries["count"].append(int(count))
+        entries["nodata"].append(None if nodata is None else float(nodata))
+        path = os.path.join(directory, INDEX_FILE)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, path)
+    return True
+
+def open_stream(root, aoi_name, stream):
+    """(index columns as arrays, {variable: read-only memmap}) for one stream of an AOI."""
+    directory = aoi_dir(root, aoi_name)
+    entries = load_index(directory)[stream]
+    columns = {
+        "granule": np.array(entries["granule"], dtype=str),
+        "time": np.array(entries["time"], dtype="datetime64[s]"),
+        "offset": np.array(entries["offset"], dtype=np.int64),
+        "count": np.array(entries["count"], dtype=np.int64),
+        "nodata": np.array([np.nan if v is None else v for v in entries["nodata"]], dtype=np.float64),
+    }
+    arrays = {}
+    for name, dtype in STREAMS[stream].items():
+        path = os.path.join(directory, f"{name}.{np.dtype(dtype).str[1:]}")
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        arrays[name] = np.memmap(path, dtype=dtype, mode="r") if size else np.empty(0, dtype=dtype)
+    return columns, arrays
+
+def _segment_sums(values, starts, ends):
+    """Sums of values[start:end] per segment with np.add.reduceat on interleaved bounds, which
+    also skips gaps between segments; accumulated in float64. Empty segments give 0."""
+    padded = np.append(values, np.zeros(1, dtype=values.dtype))
+    bounds = np.empty(starts.size * 2, dtype=np.int64)
+    bounds[0::2], bounds[1::2] = starts, ends
+    sums = np.add.reduceat(padded, bounds, dtype=np.float64)[0::2]
+    return np.where(ends > starts, sums, 0.0)
+
+def _chunks(offsets, counts, limit):
+    """Groups consecutive slices so each group spans at most `limit` elements (or one slice)."""
+    groups, first = [], 0
+    for i in range(1, offsets.size + 1):
+        if i == offsets.size or offsets[i] + counts[i] - offsets[first] > limit:
+            groups.append((first, i))
+            first = i
+    return groups
+
+def slice_means(columns, arrays, value_fn, chunk_pixels=CHUNK_PIXELS):
+    """Mean per slice of the finite values of value_fn(views, expand), NaN for slices without any.
+
+    `views` are the memmapped arrays over a span of consecutive slices (no copy) and
+    expand(per_slice) broadcasts one value per slice to the span's pixels, e.g. a nodata value.
+    """
+    n = columns["offset"].size
+    sums, counts = np.zeros(n), np.zeros(n)
+    order = np.argsort(columns["offset"], kind="stable")
+    offsets, lengths = columns["offset"][order], columns["count"][order]
+    for first, last in _chunks(offsets, lengths, chunk_pixels):
+        lo, hi = offsets[first], offsets[last - 1] + lengths[last - 1]
+        views = {name: a[lo:hi] for name, a in arrays.items()}
+        starts, ends = offsets[first:last] - lo, offsets[first:last] + lengths[first:last] - lo
+        slices = order[first:last]
+
+        def expand(per_slice):
+            # Slices and the gaps after them alternate; gap pixels get NaN
+            values = np.full(slices.size * 2, np.nan, dtype=np.float32)
+            values[0::2] = per_slice[slices]
+            runs = np.zeros(slices.size * 2, dtype=np.int64)
+            runs[0::2], runs[1:-1:2] = ends - starts, starts[1:] - ends[:-1]
+            return np.repeat(values, runs)
+
+        values = value_fn(views, expand)
+        valid = np.isfinite(values)
+        sums[slices] = _segment_sums(np.where(valid, values, np.float32(0)), starts, ends)
+        counts[slices] = _segment_sums(valid, starts, ends)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+def recompute_rsi(root, aoi_name, lst_scale=0.02, lst_offset=-273.15, lst_min=-50.0, lst_range=40.0,
+                  sm_range=0.5, weights=(0.6, 0.4), qc_mask=0xFFFF, tolerance_hours=3.0):
+    """Recomputes the RSI history of one AOI from its cube with new constants.
+
+    Defaults reproduce process_data: LST pixels with any QC bit in `qc_mask` set, at nodata or
+    below `lst_min` are dropped; each ECOSTRESS slice is paired with the nearest SMAP slice
+    within `tolerance_hours` (neutral moisture 0.5 without one). Returns columns sorted by time.
+    """
+    lst_cols, lst_arrays = open_stream(root, aoi_name, "lst")
+    sm_cols, sm_arrays = open_stream(root, aoi_name, "sm")
+
+    def lst_values(views, expand):
+        raw = views["lst"]
+        lst = raw * np.float32(lst_scale) + np.float32(lst_offset)
+        bad = ((views["qc"] & qc_mask) != 0) | (raw == expand(lst_cols["nodata"])) | (lst < lst_min)
+        lst[bad] = np.nan
+        return lst
+
+    lst_c = slice_means(lst_cols, lst_arrays, lst_values)
+    sm_surface = slice_means(sm_cols, sm_arrays, lambda views, expand: views["sm_surface"])
+
+    # Nearest SMAP slice in time for every LST slice
+    t = lst_cols["time"].astype(np.int64)
+    sm_order = np.argsort(sm_cols["time"], kind="stable")
+    ts = sm_cols["time"].astype(np.int64)[sm_order]
+    m_norm = np.full(t.size, np.nan)
+    if ts.size:
+        right = np.clip(np.searchsorted(ts, t), 0, ts.size - 1)
+        left = np.clip(right - 1, 0, ts.size - 1)
+        nearest = np.where(np.abs(ts[left] - t) <= np.abs(ts[right] - t), left, right)
+        within = np.abs(ts[nearest] - t) < tolerance_hours * 3600
+        m_norm = np.where(within, np.clip(sm_surface[sm_order][nearest] / sm_range, 0, 1), np.nan)
+
+    t_norm = np.clip(lst_c / lst_range, 0, 1)
+    m_used = np.where(np.isnan(m_norm), 0.5, m_norm)
+    rsi = weights[0] * t_norm + weights[1] * (1 - m_used)
+    order = np.argsort(lst_cols["time"], kind="stable")
+    return {"time": lst_cols["time"][order], "granule": lst_cols["granule"][order], "lst_c": lst_c[order],
+            "sm_surface": m_norm[order], "t_norm": t_norm[order], "m_norm": m_used[order], "rsi": rsi[order]}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Recompute RSI from an AOI data cube with new constants.")
+    parser.add_argument("aoi", help="AOI name")
+    parser.add_argument("--cube-dir", default=os.environ.get("AOI_CUBE_DIR"), help="Cube root (default: AOI_CUBE_DIR)")
+    parser.add_argument("--lst-range", type=float, default=40.0, help="LST (degC) mapped to t_norm = 1")
+    parser.add_argument("--sm-range", type=float, default=0.5, help="Soil moisture mapped to m_norm = 1")
+    parser.add_argument("--weights", default="0.6,0.4", help="Temperature and moisture-deficit weights")
+    parser.add_argument("--qc-mask", type=lambda v: int(v, 0), default=0xFFFF, help="QC bits that reject a pixel")
+    parser.add_argument("--tolerance-hours", type=float, default=3.0, help="Max ECOSTRESS/SMAP time difference")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not args.cube_dir:
+        print("Set AOI_CUBE_DIR or pass --cube-dir.")
+        sys.exit(1)
+    t0 = time.perf_counter()
+    result = recompute_rsi(args.cube_dir, args.aoi, lst_range=args.lst_range, sm_range=args.sm_range,
+                           weights=tuple(map(float, args.weights.split(","))), qc_mask=args.qc_mask,
+                           tolerance_hours=args.tolerance_hours)
+    elapsed = time.perf_counter() - t0
+    records = [{"timestamp": str(result["time"][i]) + "Z", "granule": str(result["granule"][i]),
+                "lst_c": None if np.isnan(result["lst_c"][i]) else round(float(result["lst_c"][i]), 2),
+                "rsi": None if np.isnan(result["rsi"][i]) else round(float(result["rsi"][i]), 4)}
+               for i in range(result["time"].size)]
+    print(json.dumps(records, indent=2))
+    print(f"Recomputed {len(records)} slices in {elapsed:.2f}s", file=sys.stderr)
@@ -1,65 +1,165 @@
 import os
 import json
-import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from elasticsearch import Elasticsearch
+import json_cache
 
-def main():
-    es_url = os.environ.get("ELASTICSEARCH_URL")
-    api_key = os.environ.get("ELASTIC_API_KEY")
+OUTPUT_PATH = "docs/data/merged_from_es.json"
+STATE_FILE = os.path.join(json_cache.CACHE_DIR, "es_export_state.json")
 
-    if not es_url or not api_key:
-        print("Error: ELASTICSEARCH_URL and ELASTIC_API_KEY environment variables must be set.")
-        sys.exit(1)
+def get_client(es_url, api_key, pool_size=8):
+    """One keep-alive client shared by every AOI export; connections are pooled per node."""
+    return Elasticsearch(es_url, api_key=api_key, connections_per_node=pool_size, request_timeout=60,
+                         retry_on_timeout=True, max_retries=3)
 
+def fetch_new_rows(es_client, index, aoi, after=None, days=30, page_size=1000):
+    """Returns (rows, last_sort) for documents of `aoi` after the `after` sort values.
+
+    Documents are ordered by (@timestamp, doc_id): timestamps need not be unique, and the
+    keyword doc_id makes the order total, so documents sharing a timestamp are neither
+    skipped at a page boundary nor at the stored high-water mark. Without a mark the export
+    starts `days` back.
+    """
+    filters = [{"term": {"aoi": aoi}}]
+    if after is None:
+        filters.append({"range": {"@timestamp": {"gte": f"now-{days}d"}}})
+    elif len(after) == 1:
+        # Mark saved before the tiebreaker: resume at that timestamp, so rows sharing it may repeat
+        after = [after[0], ""]
     query = {
-        "size": 200,
-        "sort": [{"@timestamp": "asc"}],
-        "query": {
-            "bool": {
-                "filter": [
-                    {"term": {"aoi": "ashburn"}},
-                    {"range": {"@timestamp": {"gte": "now-30d"}}}
-                ]
-            }
-        },
-        "_source": ["@timestamp", "rsi", "price", "price_shift3"]
+        "size": page_size,
+        "sort": [{"@timestamp": "asc"}, {"doc_id": {"order": "asc", "unmapped_type": "keyword"}}],
+        "query": {"bool": {"filter": filters}},
+        "_source": ["@timestamp", "rsi", "price", "price_shift3"],
+        "track_total_hits": False,
     }
 
-    try:
-        res = subprocess.check_output([
-            "curl", "-sS", "-X", "POST", f"{es_url}/rsit-rsi/_search",
-            "-H", f"Authorization: ApiKey {api_key}",
-            "-H", "Content-Type: application/json",
-            "-d", json.dumps(query)
-        ])
-        
-        hits = json.loads(res).get("hits", {}).get("hits", [])
-        arr = []
+    rows = []
+    while True:
+        if after is not None:
+            query["search_after"] = after
+        hits = es_client.search(index=index, body=query)["hits"]["hits"]
         for h in hits:
             s = h.get("_source", {})
             ts = s.get("@timestamp", "")
-            date = ts[:10] if len(ts) >= 10 else ts
-            arr.append({
-                "date": date,
+            rows.append({
+                "date": ts[:10] if len(ts) >= 10 else ts,
+                "timestamp": ts,
+                "aoi": aoi,
                 "rsi": s.get("rsi"),
                 "price": s.get("price"),
                 "price_shift3": s.get("price_shift3")
             })
-        
-        output_path = "docs/data/merged_from_es.json"
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        with open(output_path, "w") as f:
-            f.write(json.dumps(arr, indent=2))
-        
-        print(f"Wrote {len(arr)} records to {output_path}")
-
-    except subprocess.CalledProcessError as e:
-        print(f"Curl command failed: {e}")
-        print(f"Response: {e.output.decode()}")
-    except json.JSONDecodeError:
-        print(f"Error decoding JSON from Elasticsearch. Response: {res.decode()}")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        if hits:
+            after = hits[-1]["sort"]
+        if len(hits) < page_size:
+            return rows, after
+
+def _last_non_space(f, end):
+    """Offset and value of the last non-whitespace byte before `end`, or (-1, b"")."""
+    pos = end
+    while pos > 0:
+        step = min(4096, pos)
+        pos -= step
+        f.seek(pos)
+        chunk = f.read(step).rstrip()
+        if chunk:
+            return pos + len(chunk) - 1, chunk[-1:]
+    return -1, b""
+
+def write_rows(path, rows):
+    """Replaces the file with a JSON array of rows, one per line, via a temp file and rename."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write("[\n" + ",\n".join("  " + json.dumps(r) for r in rows) + ("\n" if rows else "") + "]\n")
+    os.replace(tmp_path, path)
+
+def append_rows(path, rows):
+    """Appends rows to a JSON array file in place: seeks back over the closing ']' and writes
+    only the new elements, so the cost does not depend on the size of the existing file."""
+    if not rows:
+        return
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        write_rows(path, rows)
+        return
+
+    with open(path, "r+b") as f:
+        close, byte = _last_non_space(f, f.seek(0, os.SEEK_END))
+        if byte != b"]":
+            raise ValueError(f"{path} does not end with a JSON array.")
+        _, before = _last_non_space(f, close)
+        separator = "\n" if before == b"[" else ",\n"
+
+        f.seek(close)
+        try:
+            f.write((separator + ",\n".join("  " + json.dumps(r) for r in rows) + "\n]\n").encode())
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+        except OSError:
+            # Restore the original closing bracket so the file stays valid JSON
+            f.seek(close)
+            f.write(b"]\n")
+            f.truncate()
+            raise
+
+def main():
+    es_url = os.environ.get("ELASTICSEARCH_URL")
+    api_key = os.environ.get("ELASTIC_API_KEY")
+
+    if not es_url or not api_key:
+        print("Error: ELASTICSEARCH_URL and ELASTIC_API_KEY environment variables must be set.")
+        sys.exit(1)
+
+    index = os.environ.get("ES_INDEX", "rsit-rsi-*")
+    aois = [a.strip() for a in os.environ.get("EXPORT_AOIS", "ashburn").split(",") if a.strip()]
+    days = int(os.environ.get("EXPORT_DAYS", "30"))
+    page_size = int(os.environ.get("EXPORT_PAGE_SIZE", "1000"))
+    # Not OUTPUT_FILE: run_local.sh and the pipeline point that at process_data's result.json
+    output_path = os.environ.get("EXPORT_OUTPUT_FILE", OUTPUT_PATH)
+    state_file = os.environ.get("EXPORT_STATE_FILE", STATE_FILE)
+
+    # High-water marks only hold for the file they were exported into. If any AOI has none,
+    # its rows may already be in the file, so the file is rewritten instead of appended to
+    state = json_cache.load(state_file) if os.path.exists(output_path) else {}
+    state_key = lambda aoi: f"{os.path.abspath(output_path)}|{index}|{aoi}"
+    rewrite = any(state.get(state_key(aoi)) is None for aoi in aois)
+    if rewrite:
+        state = {}
+        print(f"No export marks for every AOI in {output_path}; rewriting it from the last {days} days.")
+
+    es_client = get_client(es_url, api_key, pool_size=min(len(aois), 8) or 1)
+    total, exported, marks = 0, [], {}
+    with ThreadPoolExecutor(max_workers=min(len(aois), 8) or 1) as pool:
+        futures = {pool.submit(fetch_new_rows, es_client, index, aoi, state.get(state_key(aoi)) or None, days, page_size): aoi
+                   for aoi in aois}
+        for future in as_completed(futures):
+            aoi = futures[future]
+            try:
+                rows, last_sort = future.result()
+                if not rewrite:
+                    append_rows(output_path, rows)
+            except Exception as e:
+                print(f"Export failed for AOI '{aoi}': {e}")
+                continue
+            # Advance the mark only after the rows are durably in the file
+            if rewrite:
+                exported += rows
+                marks[aoi] = last_sort or []  # [] marks an AOI exported without any rows yet
+            elif last_sort is not None:
+                json_cache.update(state_file, state_key(aoi), last_sort)
+            total += len(rows)
+            print(f"  {aoi}: {len(rows)} new records")
+
+    if rewrite:
+        write_rows(output_path, exported)
+        for aoi, last_sort in marks.items():
+            json_cache.update(state_file, state_key(aoi), last_sort)
+        print(f"Wrote {total} records to {output_path}")
+    else:
+        print(f"Appended {total} records to {output_path}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,87 @@
+import os
+import gzip
+import json
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+COLUMNS = ["date", "kind", "rsi", "rsi_lower", "rsi_upper", "price", "price_shift3"]
+MANIFEST_FILE = "manifest.json"
+
+def _brotli():
+    """brotli is optional; without it only the gzip variant is written."""
+    if os.environ.get("DASHBOARD_BROTLI", "1") == "0":
+        return None
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+def _column(values):
+    """JSON-ready list with NaN as null; floats are rounded to 6 decimals to drop binary noise."""
+    if values.dtype.kind == "f":
+        return [None if np.isnan(v) else round(float(v), 6) for v in values]
+    return [None if v is None or (isinstance(v, float) and np.isnan(v)) else v for v in values.tolist()]
+
+def _write(path, data, brotli=None):
+    """Writes one payload plus its precompressed variants, each via a temp file and rename."""
+    variants = [(path, data), (path + ".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((path + ".br", brotli.compress(data, quality=11)))
+    for target, payload in variants:
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, target)
+    return len(variants[1][1])
+
+def write_artifacts(df, out_dir):
+    """Writes the dashboard data as columnar per-AOI, per-month chunks plus a manifest.
+
+    Each chunk holds one array per column, so key names are not repeated per row, and is
+    written with .gz (and .br when brotli is installed) siblings for static hosting. The
+    manifest lists each AOI's chunks and its latest observed point, which is enough to draw
+    the map before any chunk is fetched. Returns the manifest.
+    """
+    df = df.sort_values(["aoi", "date"])
+    dates = pd.to_datetime(df["date"])
+    columns = [c for c in COLUMNS if c in df.columns]
+    arrays = {c: df[c].to_numpy() for c in columns}
+    arrays["date"] = dates.dt.strftime("%Y-%m-%d").to_numpy()
+    aois = df["aoi"].to_numpy()
+    months = dates.dt.strftime("%Y-%m").to_numpy()
+    kinds = arrays.get("kind", np.full(len(df), "past", dtype=object))
+    brotli = _brotli()
+
+    # Rows are sorted by (aoi, date), so every (aoi, month) chunk is a contiguous slice
+    if len(df):
+        change = (aois[1:] != aois[:-1]) | (months[1:] != months[:-1])
+        bounds = np.concatenate([[0], np.flatnonzero(change) + 1, [len(df)]])
+    else:
+        bounds = np.array([0])
+
+    manifest = {"updated": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "columns": columns, "compression": ["gzip"] + (["br"] if brotli else []), "aois": {}}
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        aoi, month = aois[lo], months[lo]
+        entry = manifest["aois"].get(aoi)
+        if entry is None:
+            os.makedirs(os.path.join(out_dir, aoi), exist_ok=True)
+            entry = manifest["aois"][aoi] = {"chunks": [], "latest": None}
+
+        payload = {"aoi": aoi, "month": month}
+        payload.update({c: _column(arrays[c][lo:hi]) for c in columns})
+        name = f"{aoi}/{month}.json"
+        size = _write(os.path.join(out_dir, name), json.dumps(payload, separators=(",", ":")).encode(), brotli)
+        entry["chunks"].append({"month": month, "file": name, "rows": int(hi - lo),
+                                "start": arrays["date"][lo], "end": arrays["date"][hi - 1], "gzip_bytes": size})
+
+        rsi = arrays["rsi"][lo:hi].astype(np.float64)
+        observed = np.flatnonzero((kinds[lo:hi] != "forecast") & ~np.isnan(rsi))
+        if observed.size:
+            entry["latest"] = {"date": arrays["date"][lo + observed[-1]], "rsi": float(rsi[observed[-1]])}
+
+    # Manifest last, so readers never see chunk entries that are not written yet
+    _write(os.path.join(out_dir, MANIFEST_FILE), json.dumps(manifest, separators=(",", ":")).encode(), brotli)
+    return manifest
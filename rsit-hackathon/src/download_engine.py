@@ -0,0 +1,158 @@
+import os
+import time
+import fcntl
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import instrument
+
+DATA_EXTENSIONS = (".h5", ".hdf5", ".tif", ".tiff")
+CHUNK_SIZE = 1024 * 1024
+
+_thread_state = threading.local()
+
+def default_session_factory():
+    """Returns an authenticated Earthdata requests session (requires earthaccess.login)."""
+    import earthaccess
+    return earthaccess.get_requests_https_session()
+
+def get_session(session_factory):
+    """This thread's session, created with `session_factory` on first use.
+
+    One session per thread, since requests.Session is not thread-safe. The download workers
+    and remote_io's range reads in a thread share it.
+    """
+    session = getattr(_thread_state, "session", None)
+    if session is None:
+        session = session_factory()
+        _thread_state.session = session
+    return session
+
+def granule_files(granule):
+    """Lists the downloadable data files of a CMR granule with their expected size and checksum."""
+    umm = granule.get("umm", {}) if hasattr(granule, "get") else {}
+    archive_info = umm.get("DataGranule", {}).get("ArchiveAndDistributionInformation", [])
+    info_by_name = {a.get("Name"): a for a in archive_info if a.get("Name")}
+    granule_id = umm.get("GranuleUR")
+    version = umm.get("CollectionReference", {}).get("Version")
+
+    files = []
+    for url in granule.data_links():
+        name = os.path.basename(url)
+        if not name.endswith(DATA_EXTENSIONS):
+            continue
+        info = info_by_name.get(name, {})
+        checksum = info.get("Checksum") or {}
+        files.append({
+            "url": url,
+            "name": name,
+            "granule_id": granule_id or name,
+            "version": version,
+            "size": info.get("SizeInBytes"),
+            "checksum": (checksum.get("Algorithm"), checksum.get("Value")) if checksum.get("Value") else None,
+        })
+    return files
+
+def file_checksum(path, algorithm):
+    """Computes a file digest, accepting CMR algorithm names such as 'MD5' or 'SHA-256'."""
+    h = hashlib.new(algorithm.replace("-", "").lower())
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _is_complete(path, size=None, checksum=None):
+    if not os.path.exists(path):
+        return False
+    if size is not None and os.path.getsize(path) != int(size):
+        return False
+    if checksum is not None:
+        algorithm, value = checksum
+        return file_checksum(path, algorithm) == value.lower()
+    return True
+
+def download_file(session, url, dest_path, size=None, checksum=None, retries=3, backoff=2.0):
+    """Downloads one file, resuming from a '.part' file and verifying size/checksum.
+
+    Files already on disk with the expected size are skipped. Each failed attempt
+    keeps the partial data so the next attempt only requests the missing range.
+    A lock file next to the destination lets several processes share one directory.
+    """
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    with open(dest_path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return _download_locked(session, url, dest_path, size, checksum, retries, backoff)
+
+def _download_locked(session, url, dest_path, size, checksum, retries, backoff):
+    if os.path.exists(dest_path) and (size is None or os.path.getsize(dest_path) == int(size)):
+        return dest_path, False
+
+    part_path = dest_path + ".part"
+    # One attempt plus `retries` retries; the error of the last attempt is raised
+    for attempt in range(retries + 1):
+        try:
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            if size is not None and offset > int(size):
+                os.remove(part_path)
+                offset = 0
+
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            with session.get(url, headers=headers, stream=True, timeout=60) as r:
+                if r.status_code == 416 and offset:
+                    pass  # The .part file already holds the whole body.
+                else:
+                    r.raise_for_status()
+                    mode = "ab" if offset and r.status_code == 206 else "wb"
+                    with open(part_path, mode) as f:
+                        for block in r.iter_content(chunk_size=CHUNK_SIZE):
+                            f.write(block)
+                            instrument.count("bytes_downloaded", len(block))
+
+            if not _is_complete(part_path, size, checksum):
+                # A size mismatch can still be resumed; a bad checksum cannot.
+                if checksum is not None and (size is None or os.path.getsize(part_path) == int(size)):
+                    os.remove(part_path)
+                raise IOError(f"Incomplete or corrupt download for {os.path.basename(dest_path)}")
+
+            os.replace(part_path, dest_path)
+            return dest_path, True
+        except Exception as e:
+            if attempt == retries:
+                raise
+            wait = backoff ** (attempt + 1)
+            instrument.count("retries")
+            print(f"Download of {os.path.basename(dest_path)} failed (attempt {attempt+1}): {e}. Retrying in {wait:.0f}s...")
+            time.sleep(wait)
+
+def download_granules(files, download_dir, session_factory=default_session_factory, workers=4, retries=3, backoff=2.0):
+    """Downloads many files concurrently with at most `workers` transfers in flight.
+
+    `files` are dicts as returned by `granule_files`; an optional "dest" key overrides
+    the target path. Returns (paths, failures, fetched), where paths keep the input order,
+    failures is a list of (name, error message) and fetched counts the files actually
+    transferred (the others were already complete on disk).
+    """
+    def fetch(item):
+        dest = item.get("dest") or os.path.join(download_dir, item["name"])
+        with instrument.span("download.file", file=item["name"]):
+            return download_file(get_session(session_factory), item["url"], dest,
+                                 size=item.get("size"), checksum=item.get("checksum"),
+                                 retries=retries, backoff=backoff)
+
+    paths = [None] * len(files)
+    failures = []
+    fetched_count = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(fetch, item): i for i, item in enumerate(files)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                path, fetched = future.result()
+                paths[i] = path
+                fetched_count += fetched
+                print(f" - {'downloaded' if fetched else 'already present'}: {files[i]['name']}")
+            except Exception as e:
+                failures.append((files[i]["name"], str(e)))
+                print(f" - FAILED: {files[i]['name']}: {e}")
+
+    return [p for p in paths if p is not None], failures, fetched_count
@@ -0,0 +1,86 @@
+import json
+import math
+from rasterio.features import geometry_mask
+import numpy as np
+from rasterio.enums import Resampling
+from rasterio.warp import reproject, transform_bounds, transform_geom
+from rasterio.windows import Window, from_bounds
+from rasterio import windows
+
+# (CRS, transform, shape, geometry) -> (block-aligned Window, outside-AOI mask) or (None, None).
+# ECOSTRESS tiles of the same MGRS tile share a grid, so the warp is done once per tile.
+_windows = {}
+
+def bbox_polygon(bbox):
+    """GeoJSON polygon for a (minx, miny, maxx, maxy) bbox in WGS84."""
+    return {'type': 'Polygon', 'coordinates': [[(bbox[0], bbox[1]), (bbox[2], bbox[1]), (bbox[2], bbox[3]), (bbox[0], bbox[3]), (bbox[0], bbox[1])]]}
+
+def geometry_points(coords):
+    """Flattens (Multi)Polygon coordinate arrays to a list of (x, y) points."""
+    if isinstance(coords[0], (int, float)):
+        return [coords]
+    return [pt for part in coords for pt in geometry_points(part)]
+
+def _block_aligned(window, src):
+    """Expands a window outward to the raster's internal block boundaries, clipped to the raster."""
+    block_h, block_w = src.block_shapes[0]
+    row0 = (int(window.row_off) // block_h) * block_h
+    col0 = (int(window.col_off) // block_w) * block_w
+    row1 = min(math.ceil((window.row_off + window.height) / block_h) * block_h, src.height)
+    col1 = min(math.ceil((window.col_off + window.width) / block_w) * block_w, src.width)
+    return Window(col0, row0, col1 - col0, row1 - row0)
+
+def warped_window(src, warped):
+    """Block-aligned window of a raster covering a geometry already in the raster's CRS,
+    or None when the raster bounds do not intersect it."""
+    xs, ys = zip(*geometry_points(warped['coordinates']))
+    left, bottom, right, top = src.bounds
+    if min(xs) >= right or max(xs) <= left or min(ys) >= top or max(ys) <= bottom:
+        return None
+    window = from_bounds(min(xs), min(ys), max(xs), max(ys), transform=src.transform)
+    window = window.round_offsets(op='floor').round_lengths(op='ceil')
+    window = window.intersection(Window(0, 0, src.width, src.height))
+    return _block_aligned(window, src)
+
+def aoi_window(src, geom):
+    """Returns (window, outside) for a WGS84 geometry on an open raster's grid.
+
+    `window` is block-aligned and `outside` is a boolean array of the window's shape that
+    is True for pixels outside the geometry. Returns (None, None) when the raster bounds do
+    not intersect the geometry, using only the header.
+    """
+    key = (src.crs.to_string(), tuple(src.transform)[:6], src.width, src.height, json.dumps(geom, sort_keys=True))
+    if key in _windows:
+        return _windows[key]
+
+    warped = transform_geom('EPSG:4326', src.crs, geom)
+    window = warped_window(src, warped)
+    if window is None:
+        _windows[key] = (None, None)
+        return _windows[key]
+
+    outside = geometry_mask([warped], out_shape=(int(window.height), int(window.width)),
+                            transform=windows.transform(window, src.transform))
+    _windows[key] = (window, outside)
+    return _windows[key]
+
+def read_onto(src, crs, transform, shape, fill=0):
+    """Reads band 1 of `src` resampled (nearest) onto another grid given by crs, transform, shape.
+
+    Only the part of `src` covering the target grid is read. Target pixels it does not cover
+    keep `fill`.
+    """
+    out = np.full(shape, fill, dtype=src.dtypes[0])
+    bounds = windows.bounds(Window(0, 0, shape[1], shape[0]), transform)
+    if crs != src.crs:
+        bounds = transform_bounds(crs, src.crs, *bounds)
+    try:
+        window = from_bounds(*bounds, transform=src.transform)
+        window = window.round_offsets(op='floor').round_lengths(op='ceil')
+        window = window.intersection(Window(0, 0, src.width, src.height))
+    except windows.WindowError:
+        return out  # No overlap
+    data = src.read(1, window=window)
+    reproject(data, out, src_transform=windows.transform(window, src.transform), src_crs=src.crs,
+              src_nodata=None, dst_transform=transform, dst_crs=crs, resampling=Resampling.nearest)
+    return out
@@ -0,0 +1,161 @@
+import io
+import os
+import sys
+import threading
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+import requests
+import json_cache
+
+COLUMNS = ("open", "high", "low", "close", "volume")
+STORE_DIR = os.path.join(json_cache.CACHE_DIR, "finance")
+BASE_URL = "https://stooq.com/q/d/l/"
+
+_thread_state = threading.local()
+
+def store_dir():
+    return os.environ.get("FINANCE_STORE_DIR", STORE_DIR)
+
+def base_url():
+    """Stooq CSV endpoint; FINANCE_BASE_URL points it at a local CSV-serving stand-in."""
+    return os.environ.get("FINANCE_BASE_URL", BASE_URL)
+
+def stooq_symbol(symbol):
+    """'AMZN' -> 'amzn.us'; symbols that already carry a market suffix are kept."""
+    symbol = symbol.lower()
+    return symbol if "." in symbol else f"{symbol}.us"
+
+def _session():
+    session = getattr(_thread_state, "session", None)
+    if session is None:
+        session = requests.Session()
+        _thread_state.session = session
+    return session
+
+def _path(symbol, root):
+    return os.path.join(root, f"{symbol.upper()}.npz")
+
+def _empty():
+    columns = {"date": np.array([], dtype="datetime64[D]")}
+    columns.update({c: np.array([], dtype=np.float64) for c in COLUMNS})
+    return columns
+
+def _load(symbol, root):
+    """(columns, covered_from): the first day requested so far may predate the first bar (weekends, holidays)."""
+    try:
+        with np.load(_path(symbol, root)) as data:
+            columns = {k: data[k] for k in data.files if not k.startswith("_")}
+            covered_from = data["_covered_from"][()] if "_covered_from" in data.files else None
+            return columns, covered_from
+    except (OSError, ValueError):
+        return _empty(), None
+
+def load(symbol, root=None):
+    """Columns of a symbol (date as datetime64[D], sorted; OHLCV as float64), empty if not stored."""
+    return _load(symbol, root or store_dir())[0]
+
+def _save(symbol, columns, covered_from, root):
+    os.makedirs(root, exist_ok=True)
+    path = _path(symbol, root)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+    np.savez(tmp_path, _covered_from=np.datetime64(covered_from, "D"), **columns)
+    os.replace(tmp_path, path)
+
+def parse_csv(text):
+    """Parses a stooq daily CSV (Date,Open,High,Low,Close,Volume) into columns; 'No data' gives empty columns."""
+    lines = [line for line in text.strip().splitlines()[1:] if line.count(",") >= 5]
+    if not lines:
+        return _empty()
+    table = np.genfromtxt(io.StringIO("\n".join(lines)), delimiter=",", dtype=None, encoding="utf-8",
+                          names=("date",) + COLUMNS, usecols=range(6))
+    table = np.atleast_1d(table)
+    columns = {"date": table["date"].astype("datetime64[D]")}
+    columns.update({c: table[c].astype(np.float64) for c in COLUMNS})
+    return columns
+
+def fetch(symbol, start=None, end=None, timeout=30):
+    """Requests daily bars for [start, end] (dates; open-ended when None) in one call."""
+    params = {"s": stooq_symbol(symbol), "i": "d"}
+    if start is not None:
+        params["d1"] = start.strftime("%Y%m%d")
+        params["d2"] = (end or date.today()).strftime("%Y%m%d")
+    response = _session().get(base_url(), params=params, timeout=timeout)
+    response.raise_for_status()
+    return parse_csv(response.text)
+
+def _merge(old, new):
+    """Union of two column sets by date; rows from `new` win on overlapping dates."""
+    keep = ~np.isin(old["date"], new["date"])
+    merged = {k: np.concatenate([old[k][keep], new[k]]) for k in old}
+    order = np.argsort(merged["date"], kind="stable")
+    return {k: v[order] for k, v in merged.items()}
+
+def _as_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], "%Y-%m-%d").date()
+
+def update(symbol, start=None, root=None):
+    """Brings a symbol up to date and returns the number of rows fetched.
+
+    Only the missing tail is requested, starting at the last stored day so a bar fetched
+    intraday gets refreshed. With `start` earlier than any day requested before, the gap
+    before it is fetched too. An empty store fetches from `start`, or the full history without one.
+    """
+    root = root or store_dir()
+    start = _as_date(start)
+    stored, covered_from = _load(symbol, root)
+    if stored["date"].size:
+        first = covered_from.astype(date) if covered_from is not None else stored["date"][0].astype(date)
+        last = stored["date"][-1].astype(date)
+        ranges = [(last, None)]
+        if start is not None and start < first:
+            ranges.append((start, first - timedelta(days=1)))
+            first = start
+    else:
+        ranges = [(start, None)]
+        first = start
+
+    fetched = 0
+    for range_start, range_end in ranges:
+        new = fetch(symbol, range_start, range_end)
+        fetched += new["date"].size
+        stored = _merge(stored, new)
+    if first is None:
+        first = stored["date"][0].astype(date) if stored["date"].size else date.today()
+    _save(symbol, stored, first, root)
+    return fetched
+
+def update_watchlist(symbols, start=None, workers=4, root=None):
+    """Updates many symbols concurrently. Returns {symbol: rows fetched, or None on failure}."""
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(symbols)))) as pool:
+        futures = {pool.submit(update, s, start, root): s for s in symbols}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                results[symbol] = future.result()
+                print(f"  {symbol}: {results[symbol]} rows fetched")
+            except Exception as e:
+                print(f"Error updating {symbol}: {e}")
+                results[symbol] = None
+    return results
+
+def slice_range(columns, start=None, end=None):
+    """Rows with start <= date <= end as views, located by binary search on the sorted dates."""
+    dates = columns["date"]
+    lo = 0 if start is None else np.searchsorted(dates, np.datetime64(_as_date(start), "D"), side="left")
+    hi = dates.size if end is None else np.searchsorted(dates, np.datetime64(_as_date(end), "D"), side="right")
+    return {k: v[lo:hi] for k, v in columns.items()}
+
+def read_range(symbol, start=None, end=None, root=None):
+    return slice_range(load(symbol, root), start, end)
+
+def watchlist():
+    return [s.strip() for s in os.environ.get("FINANCE_WATCHLIST", "AMZN").split(",") if s.strip()]
+
+if __name__ == "__main__":
+    symbols = sys.argv[1:] or watchlist()
+    print(f"Updating {len(symbols)} symbols in {store_dir()}")
+    update_watchlist(symbols, start=os.environ.get("FINANCE_START"), workers=int(os.environ.get("FINANCE_WORKERS", "4")))
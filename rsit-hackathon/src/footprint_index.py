@@ -0,0 +1,193 @@
+import math
+
+# Grid cell size of the footprint index in degrees. Footprints spanning more cells than
+# LARGE_CELLS (global SMAP granules) are kept in a separate list checked for every AOI.
+CELL_DEG = 1.0
+LARGE_CELLS = 1024
+# Granules covering less than this fraction of an AOI are not downloaded for it
+MIN_COVERAGE = 0.25
+
+def _ring_points(points):
+    ring = [(float(p["Longitude"]), float(p["Latitude"])) for p in points]
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring = ring[:-1]
+    return ring
+
+def footprints(granule):
+    """Footprint rings [(lon, lat), ...] of a CMR granule from its UMM spatial extent.
+
+    GPolygons give their outer boundary; bounding rectangles crossing the antimeridian are
+    split in two. Returns [] when the granule has no horizontal extent.
+    """
+    umm = granule.get("umm", {}) if hasattr(granule, "get") else {}
+    geometry = umm.get("SpatialExtent", {}).get("HorizontalSpatialDomain", {}).get("Geometry", {})
+    rings = [_ring_points(p["Boundary"]["Points"]) for p in geometry.get("GPolygons", [])]
+    for r in geometry.get("BoundingRectangles", []):
+        west, east = r["WestBoundingCoordinate"], r["EastBoundingCoordinate"]
+        south, north = r["SouthBoundingCoordinate"], r["NorthBoundingCoordinate"]
+        spans = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+        rings += [[(w, south), (e, south), (e, north), (w, north)] for w, e in spans]
+    return [ring for ring in rings if len(ring) >= 3]
+
+def cloud_cover(granule):
+    """Cloud cover percentage from UMM CloudCover or a cloud additional attribute, else None."""
+    umm = granule.get("umm", {}) if hasattr(granule, "get") else {}
+    if umm.get("CloudCover") is not None:
+        return float(umm["CloudCover"])
+    for attr in umm.get("AdditionalAttributes", []):
+        if "cloud" in attr.get("Name", "").lower():
+            try:
+                return float(attr.get("Values", [])[0])
+            except (IndexError, TypeError, ValueError):
+                continue
+    return None
+
+def granule_key(granule):
+    meta = granule.get("meta", {}) if hasattr(granule, "get") else {}
+    umm = granule.get("umm", {}) if hasattr(granule, "get") else {}
+    return meta.get("concept-id") or umm.get("GranuleUR") or id(granule)
+
+# --- Polygon geometry (planar lon/lat, adequate for AOI-sized areas) ---
+
+def area(ring):
+    """Unsigned shoelace area of a ring."""
+    return abs(sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1]))) / 2
+
+def convex_hull(points):
+    """Counter-clockwise convex hull (monotone chain)."""
+    pts = sorted(set(points))
+    if len(pts) < 3:
+        return pts
+    cross = lambda o, a, b: (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+    lower, upper = [], []
+    for p in pts:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+    for p in reversed(pts):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+    return lower[:-1] + upper[:-1]
+
+def clip(subject, clip_ring):
+    """Sutherland-Hodgman: the part of `subject` inside the convex, counter-clockwise `clip_ring`."""
+    output = list(subject)
+    for (ax, ay), (bx, by) in zip(clip_ring, clip_ring[1:] + clip_ring[:1]):
+        if not output:
+            break
+        inside = lambda p: (bx - ax) * (p[1] - ay) - (by - ay) * (p[0] - ax) >= 0
+        def intersect(p, q):
+            # Point on p -> q where it crosses the clip edge line a -> b
+            dx, dy = q[0] - p[0], q[1] - p[1]
+            t = ((bx - ax) * (ay - p[1]) - (by - ay) * (ax - p[0])) / ((bx - ax) * dy - (by - ay) * dx)
+            return (p[0] + t * dx, p[1] + t * dy)
+        polygon, output = output, []
+        for p, q in zip(polygon[-1:] + polygon[:-1], polygon):
+            if inside(q):
+                if not inside(p):
+                    output.append(intersect(p, q))
+                output.append(q)
+            elif inside(p):
+                output.append(intersect(p, q))
+    return output
+
+def aoi_rings(aoi):
+    """Outer rings of an AOI's (Multi)Polygon geometry; holes are ignored."""
+    geometry = aoi["geometry"]
+    polygons = [geometry["coordinates"]] if geometry["type"] == "Polygon" else geometry["coordinates"]
+    rings = []
+    for polygon in polygons:
+        ring = [(float(x), float(y)) for x, y, *_ in polygon[0]]
+        rings.append(ring[:-1] if len(ring) > 1 and ring[0] == ring[-1] else ring)
+    return rings
+
+def coverage(rings, aoi):
+    """Fraction of the AOI area inside the union of footprint rings (overlaps summed, capped at 1).
+
+    Footprints are taken as their convex hull, which is exact for the quadrilateral tiles CMR
+    reports. Footprints spanning more than 180 degrees of longitude (antimeridian crossings)
+    count as full coverage rather than being rejected.
+    """
+    parts = aoi_rings(aoi)
+    total = sum(area(r) for r in parts)
+    if total == 0:
+        return 1.0
+    covered = 0.0
+    for ring in rings:
+        xs = [x for x, _ in ring]
+        if max(xs) - min(xs) > 180:
+            return 1.0
+        hull = convex_hull(ring)
+        if len(hull) < 3:
+            continue
+        covered += sum(area(clip(part, hull)) for part in parts)
+    return min(covered / total, 1.0)
+
+# --- Grid index ---
+
+def _cells(bbox, cell):
+    minx, miny, maxx, maxy = bbox
+    return (range(math.floor(minx / cell), math.floor(maxx / cell) + 1),
+            range(math.floor(miny / cell), math.floor(maxy / cell) + 1))
+
+def build_index(granules, cell=CELL_DEG):
+    """Uniform lon/lat grid over granule footprint bboxes: {"cells": {(i, j): [granule index]}}."""
+    index = {"cell": cell, "cells": {}, "large": [], "rings": [], "granules": list(granules)}
+    for n, granule in enumerate(index["granules"]):
+        rings = footprints(granule)
+        index["rings"].append(rings)
+        if not rings:
+            index["large"].append(n)  # No footprint: cannot be excluded spatially
+            continue
+        xs = [x for r in rings for x, _ in r]
+        ys = [y for r in rings for _, y in r]
+        cols, rows = _cells((min(xs), min(ys), max(xs), max(ys)), cell)
+        if len(cols) * len(rows) > LARGE_CELLS:
+            index["large"].append(n)
+            continue
+        for i in cols:
+            for j in rows:
+                index["cells"].setdefault((i, j), []).append(n)
+    return index
+
+def candidates(index, bbox):
+    """Indices of granules whose footprint bbox shares a grid cell with `bbox`."""
+    found = set(index["large"])
+    cols, rows = _cells(bbox, index["cell"])
+    for i in cols:
+        for j in rows:
+            found.update(index["cells"].get((i, j), ()))
+    return sorted(found)
+
+def rank(index, aoi, min_coverage=MIN_COVERAGE):
+    """[(coverage, cloud cover, granule)] for one AOI, best first, dropping granules below
+    `min_coverage`. Coverage is compared to two decimals so cloud cover breaks near-ties;
+    granules without cloud metadata come after those with it, in search order."""
+    scored = []
+    for n in candidates(index, aoi["bbox"]):
+        rings = index["rings"][n]
+        cov = coverage(rings, aoi) if rings else 1.0
+        if cov < min_coverage:
+            continue
+        cloud = cloud_cover(index["granules"][n])
+        scored.append((cov, cloud, n))
+    scored.sort(key=lambda s: (-round(s[0], 2), s[1] is None, s[1] or 0.0, s[2]))
+    return [(cov, cloud, index["granules"][n]) for cov, cloud, n in scored]
+
+def assign(granules, aois, max_files, min_coverage=MIN_COVERAGE):
+    """Assigns one search result to many AOIs: each AOI gets its `max_files` best granules.
+
+    Returns (selected, per_aoi): the distinct granules to download, in assignment order,
+    and {aoi name: [(coverage, cloud cover, granule)]}.
+    """
+    index = build_index(granules)
+    selected, seen, per_aoi = [], set(), {}
+    for aoi in aois:
+        per_aoi[aoi["name"]] = rank(index, aoi, min_coverage)[:max_files]
+        for _, _, granule in per_aoi[aoi["name"]]:
+            key = granule_key(granule)
+            if key not in seen:
+                seen.add(key)
+                selected.append(granule)
+    return selected, per_aoi
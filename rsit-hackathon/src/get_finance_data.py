@@ -1,36 +1,26 @@
 import os
 import json
 import requests
-import csv
-import io
+import finance_store
 
 output_path = "docs/data/finance_amzn_2023-07.json"
 os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-url = "https://stooq.com/q/d/l/?s=amzn.us&i=d"
+symbol = "AMZN"
+start, end = "2023-07-01", "2023-07-31"
 
 try:
-    print(f"Fetching data from {url}")
-    response = requests.get(url, timeout=30)
-    response.raise_for_status()
-    csv_bytes = response.content
+    # Only dates missing from the local store are requested
+    print(f"Updating {symbol} from {finance_store.base_url()}")
+    finance_store.update(symbol, start=start)
+    columns = finance_store.read_range(symbol, start, end)
+
+    rows = [{"date": str(d), "close": float(c), "volume": int(v)}
+            for d, c, v in zip(columns["date"], columns["close"], columns["volume"])]
 
-    rows = []
-    # Use StringIO to treat the byte string as a file
-    csv_file = io.StringIO(csv_bytes.decode("utf-8"))
-    reader = csv.reader(csv_file)
-    
-    for i, r in enumerate(reader):
-        if i == 0 or not r or r[0] < "2023-07-01" or r[0] > "2023-07-31":
-            continue
-        # Date,Open,High,Low,Close,Volume format
-        rows.append({"date": r[0], "close": float(r[4]), "volume": int(r[5])})
-    
-    rows.sort(key=lambda x: x["date"])
-    
     with open(output_path, "w") as f:
-        json.dump({"symbol": "AMZN", "daily": rows}, f, indent=2)
-        
+        json.dump({"symbol": symbol, "daily": rows}, f, indent=2)
+
     print(f"Wrote {len(rows)} rows to {output_path}")
 
 except requests.exceptions.RequestException as e:
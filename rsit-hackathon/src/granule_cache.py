@@ -0,0 +1,87 @@
+import os
+import time
+import fcntl
+import shutil
+import hashlib
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "rsit", "granules")
+DEFAULT_MAX_BYTES = 50 * 1024 ** 3
+# Entries used this recently are never evicted, so a concurrent run cannot lose files it just linked.
+EVICTION_GRACE_SECONDS = 3600
+
+def cache_root():
+    """Returns the cache directory from GRANULE_CACHE_DIR, or None if caching is disabled (empty value)."""
+    root = os.environ.get("GRANULE_CACHE_DIR", DEFAULT_CACHE_DIR)
+    return os.path.abspath(root) if root else None
+
+def cache_max_bytes():
+    return int(float(os.environ.get("GRANULE_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)))
+
+def entry_dir(root, granule_id, version):
+    """Content address of a granule: one directory per (granule ID, version)."""
+    key = hashlib.sha256(f"{granule_id}|{version}".encode()).hexdigest()
+    return os.path.join(root, "objects", key[:2], key)
+
+def entry_path(root, granule_id, version, name):
+    return os.path.join(entry_dir(root, granule_id, version), name)
+
+def touch(path):
+    """Marks the cache entry holding `path` (or the target of a link to it) as recently used."""
+    entry = os.path.dirname(os.path.realpath(path))
+    if os.sep + "objects" + os.sep in entry:
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+
+def link_into(path, dest_dir):
+    """Exposes a cached file in a run's working directory via an atomically replaced symlink."""
+    os.makedirs(dest_dir, exist_ok=True)
+    link_path = os.path.join(dest_dir, os.path.basename(path))
+    if os.path.realpath(link_path) == os.path.realpath(path):
+        return link_path
+    tmp_path = f"{link_path}.{os.getpid()}.tmp"
+    os.symlink(path, tmp_path)
+    os.replace(tmp_path, link_path)
+    return link_path
+
+def _entries(root):
+    objects_dir = os.path.join(root, "objects")
+    if not os.path.isdir(objects_dir):
+        return []
+    entries = []
+    for prefix in os.listdir(objects_dir):
+        prefix_dir = os.path.join(objects_dir, prefix)
+        for key in os.listdir(prefix_dir):
+            path = os.path.join(prefix_dir, key)
+            try:
+                size = sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+                entries.append((os.stat(path).st_mtime, size, path))
+            except OSError:
+                continue  # Removed by a concurrent eviction
+    return entries
+
+def evict(root, max_bytes=None, grace_seconds=EVICTION_GRACE_SECONDS):
+    """Removes least recently used entries until the cache fits in `max_bytes`.
+
+    Eviction is serialized across processes with a lock file. Returns the number of bytes freed.
+    """
+    max_bytes = cache_max_bytes() if max_bytes is None else max_bytes
+    os.makedirs(root, exist_ok=True)
+    freed = 0
+    with open(os.path.join(root, ".evict.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        entries = sorted(_entries(root))
+        total = sum(size for _, size, _ in entries)
+        now = time.time()
+        for last_used, size, path in entries:
+            if total <= max_bytes:
+                break
+            if now - last_used < grace_seconds:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            freed += size
+    if freed:
+        print(f"Granule cache: evicted {freed / 1024**2:.1f} MB, {total / 1024**2:.1f} MB in use.")
+    return freed
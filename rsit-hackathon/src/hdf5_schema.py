@@ -0,0 +1,101 @@
+import os
+import re
+import h5py
+import json_cache
+
+DEFAULT_SCHEMA_FILE = os.path.join(json_cache.CACHE_DIR, "hdf5_schema.json")
+
+# Logical variable -> (keywords that must all appear in the name, priority keywords) for discovery
+VARIABLES = {
+    "sm_surface": (['soil', 'moisture'], ['surface']),
+    "sm_rootzone": (['soil', 'moisture'], ['root']),
+    "cell_lat": (['lat'], ['cell']),
+    "cell_lon": (['lon'], ['cell']),
+}
+
+# Layouts documented by the data producers, tried before walking the group tree
+KNOWN_PATHS = {
+    "SPL4SMGP": {
+        "sm_surface": "/Geophysical_Data/sm_surface",
+        "sm_rootzone": "/Geophysical_Data/sm_rootzone",
+        "cell_lat": "/cell_lat",
+        "cell_lon": "/cell_lon",
+    },
+}
+
+# File name prefixes of products whose short name does not appear in the file name
+FILENAME_PRODUCTS = {
+    "SMAP_L4_SM_gph": "SPL4SMGP",
+}
+
+_schemas = None
+
+def schema_file():
+    return os.environ.get("HDF5_SCHEMA_FILE", DEFAULT_SCHEMA_FILE)
+
+def find_hdf5_variable(group, keywords, priority_keywords):
+    """Recursively search for a dataset, prioritizing certain keywords."""
+    candidates = {}
+    for key in group:
+        if isinstance(group[key], h5py.Dataset):
+            if all(k in key.lower() for k in keywords):
+                candidates[key] = group[key]
+        elif isinstance(group[key], h5py.Group):
+            found = find_hdf5_variable(group[key], keywords, priority_keywords)
+            if found: return found
+
+    if not candidates: return None
+
+    for p_key in priority_keywords:
+        for c_key in candidates:
+            if p_key in c_key.lower():
+                return candidates[c_key]
+
+    return list(candidates.values())[0]
+
+def product_key(file_path):
+    """Derives 'short_name|version' from a granule file name, e.g. SMAP_L4_SM_gph_..._Vv7032_001.h5."""
+    tokens = os.path.splitext(os.path.basename(file_path))[0].split('_')
+    ts_idx = next((i for i, t in enumerate(tokens) if re.fullmatch(r'\d{8}T\d{6}', t)), len(tokens))
+    prefix = '_'.join(tokens[:ts_idx])
+    short_name = FILENAME_PRODUCTS.get(prefix, prefix)
+    version = next((t for t in tokens[ts_idx + 1:] if t.startswith('V')), '')
+    return f"{short_name}|{version}"
+
+def discover(f, short_name=None):
+    """Finds the path of every logical variable, trying the documented layout before a tree walk."""
+    known = KNOWN_PATHS.get(short_name, {})
+    paths = {}
+    for name, (keywords, priority_keywords) in VARIABLES.items():
+        path = known.get(name)
+        if path is None or not isinstance(f.get(path), h5py.Dataset):
+            found = find_hdf5_variable(f, keywords, priority_keywords)
+            path = found.name if found is not None else None
+        paths[name] = path
+    return paths
+
+def resolve(f, file_path):
+    """Returns {variable: h5py.Dataset or None} for an open file, using the cached layout of its product.
+
+    The cached paths are checked once against the file; if any no longer points to a dataset,
+    the layout is rediscovered and the registry updated.
+    """
+    global _schemas
+    if _schemas is None:
+        _schemas = json_cache.load(schema_file())
+
+    key = product_key(file_path)
+    paths = _schemas.get(key)
+    if paths is not None:
+        datasets = {name: f.get(p) if p else None for name, p in paths.items()}
+        # A cached path must still name a dataset; f.get() gives None for one that disappeared
+        if set(paths) == set(VARIABLES) and all(
+                (paths[name] is None) == (d is None) and (d is None or isinstance(d, h5py.Dataset))
+                for name, d in datasets.items()):
+            return datasets
+        print(f"HDF5 layout of {key} changed, rediscovering variable paths.")
+
+    paths = discover(f, key.split('|')[0])
+    _schemas[key] = paths
+    json_cache.update(schema_file(), key, paths)
+    return {name: f[p] if p else None for name, p in paths.items()}
@@ -0,0 +1,150 @@
+import os
+import sys
+import json
+import queue
+import argparse
+import threading
+from elasticsearch.helpers import streaming_bulk
+from seed_es import get_es_client, doc_id
+from result_store import RESULTS_FILE
+
+FIELDS = ["rsi", "price", "price_shift3", "lst_c", "sm_surface", "sm_root", "t_norm", "m_norm", "kind"]
+_DONE = object()
+
+def _iter_json_array(f, block_size=64 * 1024):
+    """Decodes the elements of a top-level JSON array one at a time from a file positioned after '['."""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+    while True:
+        # Skip whitespace and the separator before the next element
+        while True:
+            while pos < len(buf) and (buf[pos].isspace() or buf[pos] == ","):
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            buf, pos = f.read(block_size), 0
+            eof = not buf
+        if pos >= len(buf):
+            raise ValueError(f"Unterminated JSON array in {f.name}")
+        if buf[pos] == "]":
+            return
+        try:
+            value, end = decoder.raw_decode(buf, pos)
+        except ValueError:
+            if eof:
+                raise
+            value, end = None, None
+        # An element is only complete once its delimiter is read: "1.5e" would decode as 1.5
+        if end is not None and end < len(buf) and (buf[end].isspace() or buf[end] in ",]"):
+            yield value
+            pos = end
+            continue
+        if eof:
+            raise ValueError(f"Malformed JSON array in {f.name} at '{buf[pos:pos + 40]}'")
+        more = f.read(block_size)
+        buf, pos, eof = buf[pos:] + more, 0, not more
+
+def iter_records(path):
+    """Yields records from an NDJSON file (e.g. the result store) line by line, or from a JSON array
+    element by element, without loading the file."""
+    with open(path) as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        if first == "[":
+            yield from _iter_json_array(f)
+            return
+        f.seek(0)
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def to_action(record, index, default_aoi=None):
+    """Maps a process_data or merge_finance record to an upsert action keyed by (aoi, timestamp)."""
+    aoi = record.get("aoi")
+    aoi = aoi.get("name") if isinstance(aoi, dict) else aoi or default_aoi
+    timestamp = record.get("timestamp") or f"{record['date']}T00:00:00Z"
+    doc = {"@timestamp": timestamp, "aoi": aoi, "doc_id": doc_id(aoi, timestamp)}
+    doc.update({k: record[k] for k in FIELDS if record.get(k) is not None})
+    return {"_op_type": "update", "_index": index, "_id": doc_id(aoi, timestamp), "doc": doc, "doc_as_upsert": True}
+
+def _produce(paths, index, default_aoi, buffer, errors):
+    """Reader thread: blocks when the bounded buffer is full, so memory stays flat however large the input.
+    A read or parse error ends the stream and is left in `errors` for ingest() to raise."""
+    try:
+        for path in paths:
+            for record in iter_records(path):
+                buffer.put(to_action(record, index, default_aoi))
+    except Exception as e:
+        errors.append(e)
+    finally:
+        buffer.put(_DONE)
+
+def _drain(buffer):
+    while True:
+        action = buffer.get()
+        if action is _DONE:
+            return
+        yield action
+
+def ingest(client, paths, index="rsit-rsi-000001", default_aoi=None, chunk_size=500, max_chunk_bytes=5 * 1024 * 1024,
+           max_retries=5, initial_backoff=2, max_backoff=60, queue_size=10000):
+    """Streams records from files into `index` as idempotent upserts.
+
+    Requests are cut by document count and bytes; 429 rejections are retried with
+    exponential backoff by streaming_bulk. Returns (succeeded, failed). An input that cannot be
+    read or parsed raises after the documents before it have been sent.
+    """
+    buffer = queue.Queue(maxsize=queue_size)
+    errors = []
+    reader = threading.Thread(target=_produce, args=(paths, index, default_aoi, buffer, errors), daemon=True)
+    reader.start()
+
+    succeeded, failed = 0, 0
+    for ok, item in streaming_bulk(client, _drain(buffer), chunk_size=chunk_size, max_chunk_bytes=max_chunk_bytes,
+                                   max_retries=max_retries, initial_backoff=initial_backoff, max_backoff=max_backoff,
+                                   raise_on_error=False, raise_on_exception=False):
+        if ok:
+            succeeded += 1
+        else:
+            failed += 1
+            if failed <= 5:
+                print(f"Failed to index document: {item}")
+    reader.join()
+    if errors:
+        raise errors[0]
+    return succeeded, failed
+
+def default_inputs():
+    """The result store's records when RESULT_STORE is set, else process_data's OUTPUT_FILE."""
+    store_dir = os.environ.get("RESULT_STORE")
+    if store_dir:
+        return [os.path.join(store_dir, RESULTS_FILE)]
+    return [os.environ.get("OUTPUT_FILE", "./docs/data/result.json")]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Upsert process_data/merge records into Elasticsearch.")
+    parser.add_argument("inputs", nargs="*", help="JSON array or NDJSON files of records (default: RESULT_STORE or OUTPUT_FILE)")
+    parser.add_argument("--index", default=os.environ.get("ES_INDEX", "rsit-rsi-000001"))
+    parser.add_argument("--aoi", default=os.environ.get("AOI_NAME"), help="AOI for records without one")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Max documents per bulk request")
+    parser.add_argument("--max-chunk-bytes", type=int, default=5 * 1024 * 1024, help="Max bytes per bulk request")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries for 429 responses")
+    parser.add_argument("--queue-size", type=int, default=10000, help="Max actions buffered ahead of the bulk sender")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    es = get_es_client()
+    if not es:
+        sys.exit(1)
+    inputs = args.inputs or default_inputs()
+    try:
+        ok, failed = ingest(es, inputs, index=args.index, default_aoi=args.aoi, chunk_size=args.chunk_size,
+                            max_chunk_bytes=args.max_chunk_bytes, max_retries=args.max_retries,
+                            queue_size=args.queue_size)
+    except (OSError, ValueError) as e:
+        print(f"Ingestion stopped: {e}")
+        sys.exit(1)
+    print(f"Upserted {ok} documents into '{args.index}' ({failed} failed).")
+    sys.exit(1 if failed else 0)
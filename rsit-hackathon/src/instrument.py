@@ -0,0 +1,213 @@
+import os
+import sys
+import json
+import time
+import uuid
+import atexit
+import resource
+import threading
+from functools import wraps
+
+# RSIT_TRACE=<file.jsonl> enables tracing: one JSON line per finished span, appended by every
+# process of the run (worker processes inherit the variable). RSIT_TRACE_CHROME=<file.json>
+# additionally converts the run to a Chrome trace-event file (chrome://tracing, Perfetto) at exit.
+_trace_path = os.environ.get("RSIT_TRACE")
+_enabled = bool(_trace_path)
+
+_local = threading.local()
+_write_lock = threading.Lock()
+_totals = {}
+_can_reset_peak = None
+
+def enabled():
+    return _enabled
+
+class _NoopSpan:
+    """Returned when tracing is off: entering, exiting and counting do nothing."""
+    __slots__ = ()
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+    def count(self, name, value=1):
+        pass
+    def set(self, **attrs):
+        pass
+
+_NOOP = _NoopSpan()
+
+def _rss_mb():
+    """Current resident set size, from /proc on Linux; None elsewhere."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _peak_mb():
+    """Peak RSS since the last reset (VmHWM on Linux), else the process-lifetime peak."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+def _reset_peak():
+    """Resets VmHWM to the current RSS (Linux >= 4.0) so a span sees only its own peak."""
+    global _can_reset_peak
+    if _can_reset_peak is False:
+        return
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        _can_reset_peak = True
+    except OSError:
+        _can_reset_peak = False
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def _emit(record):
+    line = json.dumps(record, default=str) + "\n"
+    with _write_lock:
+        # O_APPEND keeps lines from concurrent processes whole
+        with open(_trace_path, "a") as f:
+            f.write(line)
+
+class Span:
+    """A timed, nested stage with counters; written to the trace when it ends."""
+    __slots__ = ("name", "attrs", "counters", "start", "t0", "peak", "rss_start", "parent", "depth")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.counters = {}
+
+    def __enter__(self):
+        stack = _stack()
+        self.parent = stack[-1] if stack else None
+        self.depth = len(stack)
+        # Peak memory is process-wide: fold the parent's peak so far in before resetting
+        if self.parent is not None:
+            self.parent.peak = max(self.parent.peak, _peak_mb())
+        _reset_peak()
+        self.peak = 0.0
+        self.rss_start = _rss_mb()
+        stack.append(self)
+        self.start = time.time()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.t0
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        self.peak = max(self.peak, _peak_mb())
+        if self.parent is not None:
+            self.parent.peak = max(self.parent.peak, self.peak)
+        record = {
+            "run": os.environ.get("RSIT_TRACE_RUN"), "name": self.name, "start": self.start,
+            "dur_s": round(duration, 6), "pid": os.getpid(), "tid": threading.get_ident(),
+            "depth": self.depth, "parent": self.parent.name if self.parent else None,
+            "attrs": self.attrs, "counters": self.counters,
+            "rss_start_mb": round(self.rss_start, 1) if self.rss_start is not None else None,
+            "peak_rss_mb": round(self.peak, 1), "peak_scope": "span" if _can_reset_peak else "process",
+        }
+        if exc_type is not None:
+            record["error"] = f"{exc_type.__name__}: {exc}"
+        _emit(record)
+        return False
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+        with _write_lock:
+            _totals[name] = _totals.get(name, 0) + value
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+def span(name, **attrs):
+    """Context manager timing a stage: `with span("smap.read", file=name) as s: s.count("bytes", n)`."""
+    if not _enabled:
+        return _NOOP
+    return Span(name, attrs)
+
+def traced(name=None):
+    """Decorator form of span(); the wrapped function is called directly when tracing is off."""
+    def decorate(func):
+        label = name or f"{func.__module__}.{func.__qualname__}"
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(label, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def count(name, value=1):
+    """Adds to a counter of the innermost open span on this thread, and to the run totals."""
+    if not _enabled:
+        return
+    stack = _stack()
+    if stack:
+        stack[-1].count(name, value)
+    else:
+        with _write_lock:
+            _totals[name] = _totals.get(name, 0) + value
+
+def to_chrome(trace_path, chrome_path, run=None):
+    """Converts trace lines (of one run, if given) to Chrome trace-event JSON."""
+    events = []
+    with open(trace_path) as f:
+        for line in f:
+            try:
+                r = json.loads(line)
+            except ValueError:
+                continue
+            if run is not None and r.get("run") != run:
+                continue
+            if r.get("name") == "process":
+                events.append({"name": "process_name", "ph": "M", "pid": r["pid"],
+                               "args": {"name": " ".join(r["attrs"].get("argv", []))[:80]}})
+                continue
+            args = dict(r.get("attrs") or {}, **(r.get("counters") or {}))
+            args["peak_rss_mb"] = r.get("peak_rss_mb")
+            events.append({"name": r["name"], "ph": "X", "ts": r["start"] * 1e6, "dur": r["dur_s"] * 1e6,
+                           "pid": r["pid"], "tid": r["tid"], "args": args})
+    with open(chrome_path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return len(events)
+
+def _finish():
+    """Per-process summary line; the process that started the run also writes the Chrome trace."""
+    record = {"run": os.environ.get("RSIT_TRACE_RUN"), "name": "process", "start": _started,
+              "dur_s": round(time.time() - _started, 6), "pid": os.getpid(), "tid": threading.get_ident(),
+              "depth": -1, "parent": None, "attrs": {"argv": sys.argv}, "counters": _totals,
+              "peak_rss_mb": None}
+    _emit(record)
+    chrome_path = os.environ.get("RSIT_TRACE_CHROME")
+    if chrome_path and os.environ.get("RSIT_TRACE_ROOT_PID") == str(os.getpid()):
+        to_chrome(_trace_path, chrome_path, run=record["run"])
+
+if _enabled:
+    _started = time.time()
+    # The first traced process names the run; child processes inherit the ID
+    os.environ.setdefault("RSIT_TRACE_RUN", uuid.uuid4().hex[:12])
+    os.environ.setdefault("RSIT_TRACE_ROOT_PID", str(os.getpid()))
+    atexit.register(_finish)
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python instrument.py <trace.jsonl> <chrome.json> [run id]")
+        sys.exit(1)
+    n = to_chrome(sys.argv[1], sys.argv[2], run=sys.argv[3] if len(sys.argv) == 4 else None)
+    print(f"Wrote {n} events to {sys.argv[2]}")
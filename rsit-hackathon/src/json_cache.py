@@ -0,0 +1,22 @@
+import os
+import json
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "rsit")
+
+def load(path):
+    """Loads a small JSON key/value cache file, returning {} if it is missing or unreadable."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def update(path, key, value):
+    """Merges one key into the cache file; the file is replaced atomically so readers never see a partial write."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    on_disk = load(path)
+    on_disk[key] = value
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(on_disk, f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,80 @@
+import warnings
+import numpy as np
+
+Z_95 = 1.96
+
+def _ffill(values):
+    idx = np.where(np.isnan(values), 0, np.arange(values.shape[1]))
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    return values[np.arange(values.shape[0])[:, None], idx]
+
+def _fill_gaps(history):
+    """Forward-fills NaNs along time, then back-fills leading NaNs, for all rows at once."""
+    values = _ffill(np.array(history, dtype=np.float64))
+    return _ffill(values[:, ::-1])[:, ::-1]
+
+def _row_std(residuals):
+    """Per-row std of residuals ignoring NaNs; all-NaN rows (no history) give NaN silently."""
+    if residuals.shape[1] == 0:
+        return np.zeros(residuals.shape[0])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanstd(residuals, axis=1)
+
+def holt_winters(history, horizon, season_length=7, alpha=0.3, beta=0.05, gamma=0.2, z=Z_95):
+    """Additive Holt-Winters forecast for many series at once.
+
+    `history` is a 2-D array (series x time) that may contain NaNs. All series are updated
+    together per time step, so the cost is one NumPy pass per step regardless of the number
+    of series. Falls back to Holt's linear trend when there are fewer than two full seasons.
+    Returns (point, lower, upper), each (series x horizon); the interval is a normal
+    approximation from the one-step-ahead residuals, widening with sqrt(h).
+    """
+    values = _fill_gaps(np.atleast_2d(history))
+    n_series, n_steps = values.shape
+    if n_steps == 0:
+        empty = np.full((n_series, horizon), np.nan)
+        return empty, empty.copy(), empty.copy()
+
+    m = season_length if season_length and n_steps >= 2 * season_length else 1
+    if m > 1:
+        level = values[:, :m].mean(axis=1)
+        trend = (values[:, m:2 * m].mean(axis=1) - level) / m
+        season = values[:, :m] - level[:, None]
+    else:
+        level = values[:, 0].copy()
+        trend = (values[:, -1] - values[:, 0]) / max(n_steps - 1, 1)
+        season = np.zeros((n_series, 1))
+
+    residuals = []
+    for t in range(m if m > 1 else 1, n_steps):
+        s = t % m
+        y = values[:, t]
+        residuals.append(y - (level + trend + season[:, s]))
+        new_level = alpha * (y - season[:, s]) + (1 - alpha) * (level + trend)
+        trend = beta * (new_level - level) + (1 - beta) * trend
+        season[:, s] = gamma * (y - new_level) + (1 - gamma) * season[:, s]
+        level = new_level
+
+    steps = np.arange(1, horizon + 1)
+    point = level[:, None] + steps[None, :] * trend[:, None] + season[:, (n_steps + steps - 1) % m]
+    sigma = _row_std(np.stack(residuals, axis=1)) if residuals else np.zeros(n_series)
+    spread = z * sigma[:, None] * np.sqrt(steps)[None, :]
+    return point, point - spread, point + spread
+
+def seasonal_naive(history, horizon, season_length=7, z=Z_95):
+    """Repeats the last observed season for every series; intervals from seasonal differences."""
+    values = _fill_gaps(np.atleast_2d(history))
+    m = min(season_length, values.shape[1])
+    steps = np.arange(horizon)
+    point = values[:, -m:][:, steps % m]
+    sigma = _row_std(values[:, m:] - values[:, :-m])
+    spread = z * sigma[:, None] * np.sqrt(steps // m + 1)[None, :]
+    return point, point - spread, point + spread
+
+METHODS = {"holt-winters": holt_winters, "seasonal-naive": seasonal_naive}
+
+def forecast(history, horizon, method="holt-winters", season_length=7):
+    """Forecasts every row of `history` (series x time). For daily data a season of 7 models
+    the weekly cycle; for hourly data use 168, which also captures the daily cycle."""
+    return METHODS[method](history, horizon, season_length=season_length)
@@ -1,9 +1,17 @@
 import json
 import os
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from elasticsearch import Elasticsearch
-from predict_model import get_es_forecast
+from predict_model import get_es_forecasts
+import local_forecast
+import instrument
+import finance_store
+from dashboard_artifacts import write_artifacts
+
+# 'es' (Elastic ML), 'local' (in-process Holt-Winters) or ES with the local engine as fallback
+FORECAST_ENGINES = ("es", "local", "es-with-local-fallback")
 
 # --- ES Connection --- 
 def get_es_client():
@@ -20,13 +28,26 @@ def get_es_client():
         print(f"Error connecting to ES: {e}")
     return None
 
-def fetch_past_data_from_es(es_client, days_to_fetch):
-    """Fetches the last N days of RSI data directly from Elasticsearch."""
+def fetch_past_data_from_es(es_client, days_to_fetch, page_size=1000):
+    """Fetches the last RSI/price per AOI and day over the last N days from Elasticsearch.
+
+    The daily reduction runs server-side: a composite terms(aoi) x date_histogram(1d)
+    aggregation with top_metrics keeps the latest point of each bucket and is paged with
+    after_key, so transfer size grows with AOIs x days instead of raw hits.
+    Returns a dict of NumPy columns (date, aoi, rsi, price), or {} if nothing was found.
+    """
     try:
         end_time = datetime.now()
         start_time = end_time - timedelta(days=days_to_fetch)
+        composite = {
+            "size": page_size,
+            "sources": [
+                {"aoi": {"terms": {"field": "aoi"}}},
+                {"date": {"date_histogram": {"field": "@timestamp", "calendar_interval": "1d"}}}
+            ]
+        }
         search_body = {
-            "size": 10000,
+            "size": 0,
             "query": {
                 "range": {
                     "@timestamp": {
@@ -35,97 +56,165 @@ def fetch_past_data_from_es(es_client, days_to_fetch):
                     }
                 }
             },
-            "sort": [{"@timestamp": "asc"}]
+            "aggs": {
+                "daily": {
+                    "composite": composite,
+                    "aggs": {
+                        "last": {
+                            "top_metrics": {
+                                "metrics": [{"field": "rsi"}, {"field": "price"}],
+                                "sort": {"@timestamp": "desc"}
+                            }
+                        }
+                    }
+                }
+            }
+        }
+
+        aois, dates, rsi, price = [], [], [], []
+        with instrument.span("merge.fetch_es", days=days_to_fetch) as span:
+            while True:
+                response = es_client.search(index="rsit-rsi-*", body=search_body)
+                daily = response.get("aggregations", {}).get("daily", {})
+                buckets = daily.get("buckets", [])
+                span.count("pages")
+                span.count("buckets", len(buckets))
+                for bucket in buckets:
+                    top = bucket["last"]["top"]
+                    metrics = top[0]["metrics"] if top else {}
+                    aois.append(bucket["key"]["aoi"])
+                    dates.append(bucket["key"]["date"])
+                    rsi.append(metrics.get("rsi"))
+                    price.append(metrics.get("price"))
+                if not buckets or "after_key" not in daily:
+                    break
+                composite["after"] = daily["after_key"]
+
+        print(f"Fetched {len(dates)} daily AOI records from Elasticsearch.")
+        if not dates:
+            return {}
+        return {
+            "date": np.array(dates, dtype="datetime64[ms]").astype("datetime64[ns]"),
+            "aoi": np.array(aois, dtype=object),
+            "rsi": np.array(rsi, dtype=np.float64),
+            "price": np.array(price, dtype=np.float64)
         }
-        response = es_client.search(index="rsit-rsi-*", body=search_body)
-        hits = response.get("hits", {}).get("hits", [])
-        
-        past_data = []
-        for hit in hits:
-            source = hit["_source"]
-            past_data.append({
-                "timestamp": source["@timestamp"],
-                "aoi": source["aoi"],
-                "rsi": source.get("rsi"),
-                "price": source.get("price")
-            })
-        print(f"Fetched {len(past_data)} past records from Elasticsearch.")
-        return past_data
     except Exception as e:
         print(f"Error fetching past data from ES: {e}")
-        return []
+        return {}
+
+def merge_and_forecast(rsi_data, forecast_days, es_client=None, forecast_engine="es-with-local-fallback",
+                       finance_symbol=None):
+    """Builds the (day x AOI) frame from daily RSI columns: fills the date grid, forecasts
+    `forecast_days` ahead and derives price_shift3. Returns the merged DataFrame.
+
+    rsi_lower/rsi_upper are always present, null where the engine gives no interval.
+    """
+    if forecast_engine not in FORECAST_ENGINES:
+        raise ValueError(f"Unknown forecast engine '{forecast_engine}'. Known: {', '.join(FORECAST_ENGINES)}")
+    # Already one row per (aoi, day), holding the last value of that day
+    rsi_df = pd.DataFrame(rsi_data).sort_values(['date', 'aoi'])
+
+    # Determine date range
+    last_rsi_date = rsi_df['date'].max()
+    start_date = rsi_df['date'].min() # Start from the actual beginning of the fetched data
+    end_date = last_rsi_date + timedelta(days=forecast_days)
+    all_aois = rsi_df['aoi'].unique()
+
+    # Create a complete date range DataFrame for merging
+    merged_df = pd.DataFrame({
+        'date': pd.to_datetime(pd.date_range(start=start_date, end=end_date, freq='D'))
+    }).merge(pd.DataFrame({'aoi': all_aois}), how='cross')
+
+    # Merge the historical data
+    merged_df = pd.merge(merged_df, rsi_df[['date', 'aoi', 'rsi', 'price']], on=['date', 'aoi'], how='left')
+
+    # A finance symbol takes prices from the local finance store instead of the indexed ones
+    if finance_symbol:
+        finance_store.update(finance_symbol, start=start_date.date())
+        bars = finance_store.read_range(finance_symbol, start_date.date(), end_date.date())
+        closes = pd.Series(bars['close'], index=pd.to_datetime(bars['date']))
+        merged_df['price'] = merged_df['date'].map(closes)
+
+    # Forecasting
+    merged_df['kind'] = 'past'
+    merged_df.loc[merged_df['date'] > last_rsi_date, 'kind'] = 'forecast'
+
+    # All AOI forecasts run concurrently against one deadline
+    job_ids = {aoi: f'rsit-rsi-detector-{aoi}' for aoi in all_aois}
+    forecasts = {}
+    if es_client and forecast_engine != 'local':
+        forecasts = get_es_forecasts(es_client, list(job_ids.values()), forecast_days)
+
+    # The local engine fits every AOI at once on an (AOI x day) matrix
+    if forecast_engine != 'es':
+        history = merged_df[merged_df['kind'] == 'past'].pivot(index='aoi', columns='date', values='rsi').reindex(all_aois)
+        local_point, local_lower, local_upper = local_forecast.forecast(history.to_numpy(), forecast_days)
+    merged_df['rsi_lower'] = np.nan
+    merged_df['rsi_upper'] = np.nan
+
+    for i, aoi in enumerate(all_aois):
+        forecast_mask = (merged_df['aoi'] == aoi) & (merged_df['date'] > last_rsi_date)
+        predictions = forecasts.get(job_ids[aoi])
+
+        if (predictions is None or len(predictions) != forecast_days) and forecast_engine != 'es' \
+                and not np.isnan(local_point[i]).any():
+            predictions = np.clip(local_point[i], 0, 1)
+            merged_df.loc[forecast_mask, 'rsi_lower'] = np.clip(local_lower[i], 0, 1)
+            merged_df.loc[forecast_mask, 'rsi_upper'] = np.clip(local_upper[i], 0, 1)
+
+        if predictions is not None and len(predictions) == forecast_days:
+            merged_df.loc[forecast_mask, 'rsi'] = predictions
+        else:
+            # Fallback if forecast fails
+            last_known_rsi = merged_df.loc[(merged_df['aoi'] == aoi) & (merged_df['date'] <= last_rsi_date), 'rsi'].ffill().iloc[-1]
+            merged_df.loc[forecast_mask, 'rsi'] = last_known_rsi
+
+    # Forward-fill gaps in historical data and price
+    merged_df['rsi'] = merged_df.groupby('aoi')['rsi'].ffill()
+    merged_df['price'] = merged_df.groupby('aoi')['price'].ffill().bfill()
+
+    # Create price_shift3 based on the available price data
+    merged_df['price_shift3'] = merged_df.groupby('aoi')['price'].shift(-3)
+    merged_df['price_shift3'] = merged_df.groupby('aoi')['price_shift3'].bfill()
+    return merged_df
 
 # --- Main Script ---
-os.makedirs("docs/data", exist_ok=True)
-es_client = get_es_client()
-
-# 1. Load data
-# Fetch past 7 days of data from ES instead of local result.json
-past_days = 7
-forecast_days = 3
-rsi_data = fetch_past_data_from_es(es_client, past_days) if es_client else []
-
-if not rsi_data:
-    print("No past data fetched from Elasticsearch. Aborting.")
-    # Create an empty file to avoid breaking the frontend
-    with open("docs/data/merged_from_es.json", "w") as f:
-        json.dump([], f)
-    exit()
-
-# 2. Convert to DataFrame
-rsi_df = pd.DataFrame(rsi_data)
-rsi_df['date'] = pd.to_datetime(rsi_df['timestamp']).dt.normalize()
-rsi_df = rsi_df.sort_values('date').drop_duplicates(subset=['date', 'aoi'], keep='last')
-
-# 3. Determine date range
-last_rsi_date = rsi_df['date'].max()
-start_date = rsi_df['date'].min() # Start from the actual beginning of the fetched data
-end_date = last_rsi_date + timedelta(days=forecast_days)
-all_aois = rsi_df['aoi'].unique()
-
-# 4. Create a complete date range DataFrame for merging
-merged_df = pd.DataFrame({
-    'date': pd.to_datetime(pd.date_range(start=start_date, end=end_date, freq='D'))
-}).merge(pd.DataFrame({'aoi': all_aois}), how='cross')
-
-# Merge the historical data
-merged_df = pd.merge(merged_df, rsi_df[['date', 'aoi', 'rsi', 'price']], on=['date', 'aoi'], how='left')
-
-# 5. Forecasting
-merged_df['kind'] = 'past'
-merged_df.loc[merged_df['date'] > last_rsi_date, 'kind'] = 'forecast'
-
-for aoi in all_aois:
-    forecast_mask = (merged_df['aoi'] == aoi) & (merged_df['date'] > last_rsi_date)
-    predictions = None
-    
-    if es_client:
-        job_id = f'rsit-rsi-detector-{aoi}'
-        predictions = get_es_forecast(es_client, job_id, forecast_days)
-
-    if predictions is not None and len(predictions) == forecast_days:
-        merged_df.loc[forecast_mask, 'rsi'] = predictions
-    else:
-        # Fallback if forecast fails
-        last_known_rsi = merged_df.loc[(merged_df['aoi'] == aoi) & (merged_df['date'] <= last_rsi_date), 'rsi'].ffill().iloc[-1]
-        merged_df.loc[forecast_mask, 'rsi'] = last_known_rsi
-
-# Forward-fill gaps in historical data and price
-merged_df['rsi'] = merged_df.groupby('aoi')['rsi'].ffill()
-merged_df['price'] = merged_df.groupby('aoi')['price'].ffill().bfill()
-
-# Create price_shift3 based on the available price data
-merged_df['price_shift3'] = merged_df.groupby('aoi')['price'].shift(-3)
-merged_df['price_shift3'] = merged_df.groupby('aoi')['price_shift3'].bfill()
-
-# 6. Convert to final JSON
-merged_df['date'] = merged_df['date'].dt.strftime('%Y-%m-%d')
-output_filename = "docs/data/merged_with_forecast.json"
-
-# Use pandas to_json which handles NaN correctly
-merged_df.to_json(output_filename, orient='records', indent=2)
-
-# Re-read for record count for the print statement
-with open(output_filename, 'r') as f:
-    num_records = len(json.load(f))
-print(f"Wrote {num_records} records to {output_filename}")
+if __name__ == "__main__":
+    forecast_engine = os.environ.get("FORECAST_ENGINE", "es-with-local-fallback")
+    if forecast_engine not in FORECAST_ENGINES:
+        print(f"Unknown FORECAST_ENGINE '{forecast_engine}'. Known: {', '.join(FORECAST_ENGINES)}")
+        exit(1)
+    os.makedirs("docs/data", exist_ok=True)
+    es_client = get_es_client()
+
+    # 1. Load data
+    # Fetch past 7 days of data from ES instead of local result.json
+    past_days = 7
+    forecast_days = 3
+    rsi_data = fetch_past_data_from_es(es_client, past_days) if es_client else []
+
+    if not rsi_data:
+        print("No past data fetched from Elasticsearch. Aborting.")
+        # Create an empty file to avoid breaking the frontend
+        with open("docs/data/merged_from_es.json", "w") as f:
+            json.dump([], f)
+        exit()
+
+    # 2-5. Merge onto the full date grid and forecast
+    # FINANCE_SYMBOL: take prices from the local finance store
+    with instrument.span("merge.forecast", forecast_days=forecast_days):
+        merged_df = merge_and_forecast(rsi_data, forecast_days, es_client, forecast_engine=forecast_engine,
+                                       finance_symbol=os.environ.get("FINANCE_SYMBOL"))
+
+    with instrument.span("merge.write", records=len(merged_df)):
+        # 6. Write the dashboard artifacts: per-AOI monthly columnar chunks plus a manifest
+        write_artifacts(merged_df, "docs/data/aoi")
+
+        # The single row-oriented file stays as the frontend fallback
+        merged_df['date'] = merged_df['date'].dt.strftime('%Y-%m-%d')
+        output_filename = "docs/data/merged_with_forecast.json"
+
+        # Use pandas to_json which handles NaN correctly
+        merged_df.to_json(output_filename, orient='records')
+    print(f"Wrote {len(merged_df)} records to {output_filename}")
@@ -0,0 +1,268 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+import subprocess
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import json_cache
+import instrument
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+STATE_FILE = os.path.join(json_cache.CACHE_DIR, "pipeline_state.json")
+
+def state_file():
+    return os.environ.get("PIPELINE_STATE", STATE_FILE)
+
+def stage(name, script, inputs=(), outputs=(), params=(), deps=(), args=()):
+    """A pipeline step: runs `script` (under src/) with `args` once its `deps` have finished.
+
+    `inputs` and `outputs` are paths (files or directories) relative to the repo root or
+    absolute; `params` are environment variables that change the result. The script itself
+    is always an input, so editing it invalidates the stage.
+    """
+    return {"name": name, "script": script, "inputs": [os.path.join("src", script)] + list(inputs),
+            "outputs": list(outputs), "params": list(params), "deps": list(deps), "args": list(args)}
+
+def window_reaches_today(time_range, day):
+    """Whether a TIME_RANGE search window ("start,end", ISO dates) is open-ended or ends on or
+    after `day`, so that searching it again later can find new granules."""
+    parts = (time_range or "").split(",")
+    end = parts[1].strip() if len(parts) > 1 else ""
+    return not end or not day or end[:10] >= day
+
+def default_stages():
+    """Stages of the local and demo pipelines. Paths come from the same environment
+    variables the scripts read, with the same defaults."""
+    download_dir = os.environ.get("DOWNLOAD_DIR", "./tmp_data")
+    output_file = os.environ.get("OUTPUT_FILE", "./docs/data/result.json")
+    store_dir = os.environ.get("RESULT_STORE")
+    # PROCESS_MODE=raster writes COGs and their index instead of the record file; with a
+    # result store, records are appended to it and the file is written by "export"
+    if os.environ.get("PROCESS_MODE") == "raster":
+        process_outputs = [os.environ.get("RASTER_DIR", "./docs/data/rsi")]
+    elif store_dir:
+        process_outputs = [store_dir]
+    else:
+        process_outputs = [output_file]
+    # A search window still open at its end returns new granules every day, so the day is
+    # then a parameter of "prepare"; a closed window in the past is fetched once
+    prepare_params = ["BBOX", "AOI_CATALOG", "MIN_COVERAGE", "TIME_RANGE", "MAX_FILES", "DOWNLOAD_DIR",
+                      "GRANULE_CACHE_DIR", "ACCESS_MODE"]
+    if window_reaches_today(os.environ.get("TIME_RANGE", "2023-07-15,2023-07-15"), os.environ.get("PIPELINE_DAY")):
+        prepare_params.append("PIPELINE_DAY")
+    return {s["name"]: s for s in [
+        stage("prepare", "prepare_data.py",
+              inputs=["src/download_engine.py", "src/granule_cache.py", "src/footprint_index.py",
+                      os.environ.get("AOI_CATALOG") or ""],
+              outputs=[download_dir],
+              params=prepare_params),
+        stage("finance", "get_finance_data.py",
+              inputs=["src/finance_store.py"],
+              outputs=["docs/data/finance_amzn_2023-07.json"],
+              params=["FINANCE_BASE_URL", "FINANCE_STORE_DIR"]),
+        stage("process", "process_data.py",
+              inputs=["src/smap_grid.py", "src/hdf5_schema.py", "src/ecostress_grid.py", "src/aoi_catalog.py",
+                      "src/result_store.py", "src/remote_io.py", "src/aoi_cube.py", os.environ.get("AOI_CATALOG") or ""],
+              outputs=process_outputs,
+              params=["BBOX", "AOI_NAME", "AOI_CATALOG", "PROCESS_MODE", "PAIR_TOLERANCE_HOURS",
+                      "RESULT_STORE", "RASTER_DIR", "AOI_CUBE_DIR", "START_DATE", "OUTPUT_FILE", "ACCESS_MODE"],
+              deps=["prepare"]),
+        # JSON view of the result store; run on demand, its cost grows with the whole history
+        stage("export", "result_store.py", outputs=[output_file], params=["RESULT_STORE", "OUTPUT_FILE"],
+              deps=["process"], args=["export"]),
+        # Upserts the records into Elasticsearch; ids are (aoi, timestamp), so reruns overwrite
+        stage("ingest", "ingest_es.py",
+              inputs=["src/seed_es.py", "src/result_store.py", "../.secrets/es_url"],
+              params=["ES_INDEX", "AOI_NAME", "RESULT_STORE", "OUTPUT_FILE"],
+              deps=["process"]),
+        # Seeding and merging are relative to the current day (synthetic series ending now, a
+        # rolling window read back), so the day is part of their parameters
+        stage("seed", "seed_es.py", inputs=["../.secrets/es_url"], params=["PIPELINE_DAY"]),
+        stage("merge", "merge_finance.py",
+              inputs=["src/predict_model.py", "src/local_forecast.py", "src/dashboard_artifacts.py",
+                      "src/finance_store.py"],
+              outputs=["docs/data/merged_with_forecast.json", "docs/data/aoi/manifest.json"],
+              params=["FORECAST_ENGINE", "FINANCE_SYMBOL", "PIPELINE_DAY"],
+              deps=["seed"]),
+        # Folds the hours indexed since the last run into the rollups and republishes them for the dashboard
+        stage("rollups", "rollups.py",
+              inputs=["src/dashboard_artifacts.py", "src/seed_es.py", "../.secrets/es_url"],
+              outputs=[os.environ.get("ROLLUP_EXPORT_DIR", "docs/data/rollups")],
+              params=["ROLLUP_DIR", "ROLLUP_EXPORT_DIR", "ROLLUP_DAYS", "PIPELINE_DAY"],
+              deps=["merge"]),
+    ]}
+
+# --- Fingerprints ---
+
+def _file_digest(path, cache):
+    """sha256 of a file, reused while its (size, mtime, inode) is unchanged."""
+    st = os.stat(path)
+    key = os.path.abspath(path)
+    stamp = [st.st_size, st.st_mtime_ns, st.st_ino]
+    cached = cache.get(key)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    cache[key] = [stamp, h.hexdigest()]
+    return cache[key][1]
+
+def path_digest(path, cache):
+    """Digest of a file or a directory tree (names and contents), or None if it is missing."""
+    path = os.path.join(ROOT, path) if not os.path.isabs(path) else path
+    if os.path.isfile(path):
+        return _file_digest(path, cache)
+    if not os.path.isdir(path):
+        return None
+    h = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for name in sorted(filenames):
+            full = os.path.join(dirpath, name)
+            if name.endswith((".part", ".lock")) or not os.path.exists(full):
+                continue
+            h.update(os.path.relpath(full, path).encode() + b"\0" + _file_digest(full, cache).encode())
+    return h.hexdigest()
+
+def fingerprint(st, upstream, cache):
+    """Hash of everything a stage's result depends on: parameters, input contents and the
+    output digests of the stages it depends on."""
+    payload = {
+        "params": {p: os.environ.get(p) for p in st["params"]},
+        "inputs": {p: path_digest(p, cache) for p in st["inputs"] if p},
+        "upstream": {d: upstream[d] for d in st["deps"]},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def outputs_digest(st, cache):
+    digests = [path_digest(p, cache) for p in st["outputs"]]
+    if any(d is None for d in digests):
+        return None
+    return hashlib.sha256("|".join(digests).encode()).hexdigest()
+
+# --- Execution ---
+
+def resolve(stages, targets):
+    """Targets plus all their transitive dependencies."""
+    needed, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in stages:
+            raise ValueError(f"Unknown stage '{name}'. Known: {', '.join(stages)}")
+        if name not in needed:
+            needed.add(name)
+            todo += stages[name]["deps"]
+    return needed
+
+def run_stage(st, python):
+    """Runs a stage script from the repo root; returns (returncode, combined output)."""
+    with instrument.span("pipeline." + st["name"]):
+        proc = subprocess.run([python, os.path.join("src", st["script"])] + st["args"], cwd=ROOT,
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    return proc.returncode, proc.stdout
+
+def run(stages, targets, workers=4, force=(), python=sys.executable):
+    """Runs the targets and their dependencies, skipping stages whose fingerprint and
+    outputs are unchanged since their last successful run, with independent stages in
+    parallel. Returns True if every needed stage succeeded or was up to date."""
+    needed = resolve(stages, targets)
+    key = lambda name: f"{ROOT}|{name}"
+    state = json_cache.load(state_file())
+    cache = state.get("hashes", {})
+    digests, failed, running = {}, set(), {}
+    remaining = set(needed)
+
+    def ready(name):
+        return all(d in digests for d in stages[name]["deps"])
+
+    def blocked(name):
+        return any(d in failed for d in stages[name]["deps"])
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while remaining or running:
+            for name in sorted(remaining):
+                if blocked(name):
+                    print(f"[{name}] skipped: a dependency failed")
+                    failed.add(name)
+                    remaining.discard(name)
+                elif ready(name):
+                    remaining.discard(name)
+                    st = stages[name]
+                    fp = fingerprint(st, digests, cache)
+                    previous = state.get(key(name), {})
+                    current = outputs_digest(st, cache)
+                    if name not in force and previous.get("fingerprint") == fp and previous.get("outputs") == current:
+                        print(f"[{name}] up to date")
+                        digests[name] = current or fp
+                        continue
+                    print(f"[{name}] running {st['script']}")
+                    running[pool.submit(run_stage, st, python)] = (name, fp)
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, fp = running.pop(future)
+                code, output = future.result()
+                for line in output.splitlines():
+                    print(f"[{name}] {line}")
+                st = stages[name]
+                current = outputs_digest(st, cache)
+                if code != 0 or (st["outputs"] and current is None):
+                    print(f"[{name}] FAILED (exit {code})" + ("" if code else ": outputs missing"))
+                    failed.add(name)
+                    continue
+                digests[name] = current or fp
+                state[key(name)] = {"fingerprint": fp, "outputs": current,
+                                    "finished": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+                json_cache.update(state_file(), key(name), state[key(name)])
+                print(f"[{name}] done")
+
+    json_cache.update(state_file(), "hashes", cache)
+    return not failed
+
+def _default_env():
+    """Fills BBOX from the AOI catalog for AOI_NAME, TIME_RANGE from START/END_DATE and the
+    day stamp used by date-relative stages."""
+    os.environ.setdefault("PIPELINE_DAY", datetime.now(timezone.utc).strftime("%Y-%m-%d"))
+    if "TIME_RANGE" not in os.environ and os.environ.get("START_DATE"):
+        os.environ["TIME_RANGE"] = f"{os.environ['START_DATE']},{os.environ.get('END_DATE', os.environ['START_DATE'])}"
+    if "BBOX" not in os.environ and os.environ.get("AOI_NAME"):
+        from aoi_catalog import load_catalog
+        aois = {a["name"]: a for a in load_catalog(os.path.join(ROOT, "aois.geojson"))}
+        aoi = aois.get(os.environ["AOI_NAME"])
+        if aoi is None:
+            raise ValueError(f"Unknown AOI_NAME={os.environ['AOI_NAME']}")
+        os.environ["BBOX"] = ",".join(str(v) for v in aoi["bbox"])
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run RSIT pipeline stages, skipping unchanged ones.")
+    parser.add_argument("targets", nargs="*", default=["process"], help="Stages to bring up to date (with their dependencies)")
+    parser.add_argument("--force", default="", help="Comma-separated stages to rerun regardless of fingerprints")
+    parser.add_argument("--workers", type=int, default=4, help="Stages run concurrently")
+    parser.add_argument("--python", default=sys.executable, help="Interpreter for stage scripts")
+    parser.add_argument("--list", action="store_true", help="List stages and exit")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        _default_env()
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    stages = default_stages()
+    if args.list:
+        for st in stages.values():
+            print(f"{st['name']:<8} {st['script']:<22} deps: {', '.join(st['deps']) or '-'}")
+        sys.exit(0)
+    try:
+        ok = run(stages, args.targets, workers=args.workers, force=set(filter(None, args.force.split(","))),
+                 python=args.python)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    sys.exit(0 if ok else 1)
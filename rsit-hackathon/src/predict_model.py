@@ -1,8 +1,35 @@
 import time
+from concurrent.futures import ThreadPoolExecutor
 from elasticsearch import Elasticsearch
+import instrument
 
-def ensure_job_open_and_running(es_client, job_id, datafeed_id, lookback="now-90d"):
-    """Checks job and datafeed state, handles opening/stuck states, and starts datafeed."""
+ML_RESULTS_INDEX = ".ml-anomalies-*"
+
+def wait_until(check, deadline, initial=0.5, factor=2.0, max_interval=8.0):
+    """Polls `check()` with exponential backoff until it returns a truthy value or the
+    `time.monotonic()` deadline passes. Returns the last value of `check()`."""
+    interval = initial
+    while True:
+        result = check()
+        instrument.count("polls")
+        remaining = deadline - time.monotonic()
+        if result or remaining <= 0:
+            return result
+        time.sleep(min(interval, remaining))
+        interval = min(interval * factor, max_interval)
+
+def _job_state(es_client, job_id):
+    return es_client.ml.get_job_stats(job_id=job_id)['jobs'][0].get('state')
+
+def _datafeed_state(es_client, datafeed_id):
+    return es_client.ml.get_datafeed_stats(datafeed_id=datafeed_id)['datafeeds'][0].get('state')
+
+def ensure_job_open_and_running(es_client, job_id, datafeed_id, lookback="now-90d", deadline=None):
+    """Checks job and datafeed state, handles opening/stuck states, and starts datafeed.
+
+    State changes are polled with backoff until `deadline` (time.monotonic()), 120s by default.
+    """
+    deadline = deadline or time.monotonic() + 120
     try:
         job_stats = es_client.ml.get_job_stats(job_id=job_id)['jobs'][0]
         job_state = job_stats.get('state')
@@ -17,24 +44,23 @@ def ensure_job_open_and_running(es_client, job_id, datafeed_id, lookback="now-90
             
             try: 
                 es_client.ml.close_job(job_id=job_id, force=True, timeout="2m")
-                time.sleep(5)
+                wait_until(lambda: _job_state(es_client, job_id) == 'closed', deadline)
             except Exception:
                 pass
 
             print(f"Opening job '{job_id}'...")
             es_client.ml.open_job(job_id=job_id, timeout="2m")
-            time.sleep(10)
 
-        job_stats = es_client.ml.get_job_stats(job_id=job_id)['jobs'][0]
-        if job_stats.get('state') != 'opened':
-            print(f"Job '{job_id}' failed to open. Final state: {job_stats.get('state')}. Aborting.")
+        if not wait_until(lambda: _job_state(es_client, job_id) == 'opened', deadline):
+            print(f"Job '{job_id}' failed to open. Final state: {_job_state(es_client, job_id)}. Aborting.")
             return False
 
-        datafeed_stats = es_client.ml.get_datafeed_stats(datafeed_id=datafeed_id)['datafeeds'][0]
-        if datafeed_stats['state'] != 'started':
+        if _datafeed_state(es_client, datafeed_id) != 'started':
             print(f"Starting datafeed '{datafeed_id}'...")
             es_client.ml.start_datafeed(datafeed_id=datafeed_id, start=lookback)
-            time.sleep(10)
+            if not wait_until(lambda: _datafeed_state(es_client, datafeed_id) == 'started', deadline):
+                print(f"Datafeed '{datafeed_id}' did not start in time.")
+                return False
         
         return True
 
@@ -42,11 +68,11 @@ def ensure_job_open_and_running(es_client, job_id, datafeed_id, lookback="now-90
         print(f"Error ensuring job/datafeed is running: {e}")
         return False
 
-def get_es_forecast(es_client, job_id, forecast_days):
-    """Ensures ML job is running, generates a forecast, and retrieves the results."""
+def _request_forecast(es_client, job_id, forecast_days, deadline):
+    """Prepares one job and requests its forecast; returns the forecast_id or None."""
     datafeed_id = f"datafeed-{job_id}"
-    
-    if not ensure_job_open_and_running(es_client, job_id, datafeed_id):
+
+    if not ensure_job_open_and_running(es_client, job_id, datafeed_id, deadline=deadline):
         print("Could not prepare ML job for forecast. Aborting forecast.")
         return None
 
@@ -55,37 +81,92 @@ def get_es_forecast(es_client, job_id, forecast_days):
         forecast_resp = es_client.ml.forecast(job_id=job_id, duration=f'{forecast_days}d')
         forecast_id = forecast_resp.get('forecast_id')
         print(f"Forecast requested. Forecast ID: {forecast_id}")
+        return forecast_id
+    except Exception as e:
+        print(f"Elastic ML forecast request failed for {job_id}: {e}")
+        return None
 
-        if not forecast_id:
-            raise ValueError("No forecast_id returned from forecast request.")
-
-        print("Waiting for forecast results to be indexed...")
-        time.sleep(20) # Wait for results to be indexed
-
-        search_body = {
-            "query": {
-                "bool": {
-                    "filter": [
-                        {"term": {"job_id": job_id}},
-                        {"term": {"forecast_id": forecast_id}},
-                        {"term": {"result_type": "model_forecast"}}
-                    ]
-                }
-            },
-            "sort": [{"timestamp": {"order": "asc"}}],
-            "size": 10000
-        }
-
-        results_resp = es_client.search(index=".ml-anomalies-*", body=search_body)
-        hits = results_resp.get("hits", {}).get("hits", [])
-        
-        if not hits:
-            raise ValueError("Forecast results are not yet available or empty.")
+def _forecast_query(job_id, forecast_id, result_type, size):
+    return {
+        "query": {
+            "bool": {
+                "filter": [
+                    {"term": {"job_id": job_id}},
+                    {"term": {"forecast_id": forecast_id}},
+                    {"term": {"result_type": result_type}}
+                ]
+            }
+        },
+        "sort": [{"timestamp": {"order": "asc"}}],
+        "size": size
+    }
 
-        predictions = [hit["_source"]['forecast_prediction'] for hit in hits]
-        print(f"Retrieved {len(predictions)} forecast points.")
-        return predictions[:forecast_days]
+def _msearch(es_client, queries):
+    """Runs one msearch over the ML results index and returns the hits of each query."""
+    body = []
+    for query in queries:
+        body += [{"index": ML_RESULTS_INDEX}, query]
+    responses = es_client.msearch(body=body)["responses"]
+    instrument.count("msearch")
+    return [r.get("hits", {}).get("hits", []) for r in responses]
 
+def get_es_forecasts(es_client, job_ids, forecast_days, timeout=300, workers=8):
+    """Forecasts many ML jobs concurrently and returns {job_id: predictions or None}.
+
+    Jobs are opened, their datafeeds started and forecasts requested in parallel threads.
+    Completion of all forecasts is then polled with one msearch per round (exponential
+    backoff) and the results of every finished forecast are fetched in a single msearch.
+    Everything shares one deadline of `timeout` seconds.
+    """
+    deadline = time.monotonic() + timeout
+    results = {job_id: None for job_id in job_ids}
+    if not job_ids:
+        return results
+
+    with instrument.span("forecast.request", jobs=len(job_ids)), \
+            ThreadPoolExecutor(max_workers=max(1, min(workers, len(job_ids)))) as pool:
+        forecast_ids = dict(zip(job_ids, pool.map(lambda j: _request_forecast(es_client, j, forecast_days, deadline), job_ids)))
+    pending = {j: f for j, f in forecast_ids.items() if f}
+
+    finished = {}
+    def poll():
+        jobs = [j for j in pending if j not in finished]
+        hits = _msearch(es_client, [_forecast_query(j, pending[j], "model_forecast_request_stats", 1) for j in jobs])
+        for job_id, job_hits in zip(jobs, hits):
+            status = job_hits[0]["_source"].get("forecast_status") if job_hits else None
+            if status in ("finished", "failed"):
+                finished[job_id] = status
+        return len(finished) == len(pending)
+
+    if pending:
+        print(f"Waiting for {len(pending)} forecast(s) to finish...")
+        with instrument.span("forecast.wait", jobs=len(pending)):
+            try:
+                wait_until(poll, deadline)
+            except Exception as e:
+                print(f"Polling forecast status failed: {e}")
+
+    done = [j for j, status in finished.items() if status == "finished"]
+    for job_id in pending:
+        if finished.get(job_id) != "finished":
+            print(f"Forecast for {job_id} did not finish in time (status: {finished.get(job_id, 'pending')}).")
+    if not done:
+        return results
+
+    try:
+        with instrument.span("forecast.fetch", jobs=len(done)) as span:
+            hits = _msearch(es_client, [_forecast_query(j, pending[j], "model_forecast", 10000) for j in done])
+            span.count("hits", sum(len(h) for h in hits))
     except Exception as e:
-        print(f"Elastic ML forecast process failed: {e}")
-        return None
\ No newline at end of file
+        print(f"Elastic ML forecast retrieval failed: {e}")
+        return results
+
+    for job_id, job_hits in zip(done, hits):
+        predictions = [hit["_source"]['forecast_prediction'] for hit in job_hits]
+        print(f"Retrieved {len(predictions)} forecast points for {job_id}.")
+        results[job_id] = predictions[:forecast_days] if predictions else None
+    return results
+
+def get_es_forecast(es_client, job_id, forecast_days):
+    """Ensures ML job is running, generates a forecast, and retrieves the results."""
+    return get_es_forecasts(es_client, [job_id], forecast_days)[job_id]
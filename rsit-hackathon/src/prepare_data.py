@@ -1,6 +1,11 @@
 import os
-import time
 import earthaccess
+from download_engine import granule_files, download_granules
+import granule_cache
+import remote_io
+import footprint_index
+from aoi_catalog import load_catalog, make_aoi
+import instrument
 
 DATASETS = {
     "ECO_L2T_LSTE": "002",
@@ -20,49 +25,97 @@ def robust_login():
         print(f"Auth error: {e}")
         return False
 
-def search_and_download(short_name, version, bounding_box, time_range, max_files, download_dir):
-    print(f"\n--- Processing: {short_name} v{version} ---")
+def search_granules(short_name, version, bounding_box, time_range, max_files, aois=None, min_coverage=footprint_index.MIN_COVERAGE):
+    """Searches CMR once for one product and picks granules by footprint.
+
+    Each AOI (default: the search bbox) gets up to `max_files` granules, ranked by how much
+    of it they cover and then by cloud cover; granules covering less than `min_coverage` of
+    an AOI are not used for it. Returns the distinct granules selected for any AOI.
+    """
+    print(f"\n--- Searching: {short_name} v{version} ---")
     try:
         q = earthaccess.DataGranules().short_name(short_name).version(version)
         q = q.bounding_box(*bounding_box).temporal(*time_range)
-        
-        results = q.get() # Fetch all available granules
+
+        with instrument.span("prepare.search", short_name=short_name) as s:
+            results = q.get() # Fetch all available granules
+            s.count("granules", len(results))
         if not results:
             print(f"NO_RESULTS:{short_name}")
             return []
 
-        print(f"Found {len(results)} granules, will download a max of {max_files}.")
-        results_to_download = results[:max_files]
-
-        downloaded = []
-        if results_to_download:
-            for attempt in range(3):
-                try:
-                    downloaded = earthaccess.download(results_to_download, local_path=download_dir)
-                    break
-                except Exception as e:
-                    wait = 2 ** (attempt + 1)
-                    print(f"Download attempt {attempt+1} failed: {e}. Retrying in {wait}s...")
-                    time.sleep(wait)
-
-        downloaded_files = [f for f in downloaded if str(f).endswith((".h5", ".hdf5", ".tif", ".tiff"))]
-        
-        print(f"Downloaded: {len(downloaded_files)} files")
-        print(f"Saved to: {download_dir}")
-        for f in downloaded_files:
-            print(f" - {os.path.basename(str(f))}")
-        return downloaded_files
+        aois = aois or [make_aoi("aoi", bounding_box)]
+        selected, per_aoi = footprint_index.assign(results, aois, max_files, min_coverage)
+        print(f"Found {len(results)} granules; selected {len(selected)} for {len(aois)} AOI(s) "
+              f"(max {max_files} each, coverage >= {min_coverage:.0%}).")
+        for name, ranked in per_aoi.items():
+            if not ranked:
+                print(f"  - {name}: no granule covers enough of the AOI")
+            elif len(aois) > 1 or len(ranked) < max_files:
+                print(f"  - {name}: {len(ranked)} granule(s), coverage " + ", ".join(f"{c:.0%}" for c, _, _ in ranked))
+        instrument.count("granules_selected", len(selected))
+        return selected
     except Exception as e:
         print(f"Unexpected error for {short_name}: {e}")
         return []
 
+def download(granules, download_dir, workers=4, retries=3, cache_dir=None):
+    """Downloads the data files of the given granules concurrently, file by file.
+
+    With a cache directory, files are fetched into the shared granule cache (or reused
+    from it) and only linked into `download_dir`. Returns (paths, fetched), where fetched
+    counts the files transferred in this call rather than reused.
+    """
+    files = [item for g in granules for item in granule_files(g)]
+    if not files:
+        return [], 0
+
+    if cache_dir:
+        for item in files:
+            item["dest"] = granule_cache.entry_path(cache_dir, item["granule_id"], item["version"], item["name"])
+
+    print(f"Downloading {len(files)} files with {workers} workers...")
+    with instrument.span("prepare.download", files=len(files), workers=workers) as s:
+        downloaded, failures, fetched = download_granules(files, download_dir, workers=workers, retries=retries)
+        s.count("failures", len(failures))
+        s.count("fetched", fetched)
+
+    if cache_dir:
+        for path in downloaded:
+            granule_cache.touch(path)
+        downloaded = [granule_cache.link_into(path, download_dir) for path in downloaded]
+        granule_cache.evict(cache_dir)
+
+    print(f"Downloaded: {fetched} new, {len(downloaded) - fetched} already present ({len(failures)} failed)")
+    print(f"Saved to: {download_dir}")
+    return downloaded, fetched
+
+def search_and_download(short_name, version, bounding_box, time_range, max_files, download_dir, workers=4, retries=3, cache_dir=None):
+    granules = search_granules(short_name, version, bounding_box, time_range, max_files)
+    return download(granules, download_dir, workers=workers, retries=retries, cache_dir=cache_dir)
+
 def main():
     bbox_str = os.environ.get("BBOX", "-77.6,38.85,-77.3,39.15")
     time_range_str = os.environ.get("TIME_RANGE", "2023-07-15,2023-07-15")
     max_files = int(os.environ.get("MAX_FILES", 2))
     download_dir = os.path.abspath(os.environ.get("DOWNLOAD_DIR", "./tmp_data"))
+    workers = int(os.environ.get("DOWNLOAD_WORKERS", 4))
+    retries = int(os.environ.get("DOWNLOAD_RETRIES", 3))
+    cache_dir = granule_cache.cache_root()
+
+    catalog_path = os.environ.get("AOI_CATALOG")
+    min_coverage = float(os.environ.get("MIN_COVERAGE", footprint_index.MIN_COVERAGE))
 
-    bounding_box = tuple(map(float, bbox_str.split(',')))
+    # With a catalog, one search over the union bbox serves every AOI
+    if catalog_path:
+        aois = load_catalog(catalog_path)
+        bboxes = [aoi["bbox"] for aoi in aois]
+        bounding_box = (min(b[0] for b in bboxes), min(b[1] for b in bboxes),
+                        max(b[2] for b in bboxes), max(b[3] for b in bboxes))
+        print(f"Loaded {len(aois)} AOIs from {catalog_path}")
+    else:
+        bounding_box = tuple(map(float, bbox_str.split(',')))
+        aois = [make_aoi(os.environ.get("AOI_NAME", "aoi"), bounding_box)]
     time_range = tuple(time_range_str.split(','))
 
     if not robust_login():
@@ -71,23 +124,40 @@ def main():
 
     os.makedirs(download_dir, exist_ok=True)
     print(f"Download directory ready: {download_dir}")
+    if cache_dir:
+        print(f"Using granule cache: {cache_dir}")
 
-    total_files = 0
+    # Search every product first so the downloads of all products share one worker pool
+    granules = []
     for short_name, version in DATASETS.items():
-        files = search_and_download(
+        granules += search_granules(
             short_name=short_name,
             version=version,
             bounding_box=bounding_box,
             time_range=time_range,
             max_files=max_files,
-            download_dir=download_dir
+            aois=aois,
+            min_coverage=min_coverage
         )
-        total_files += len(files)
+
+    if remote_io.access_mode() == "stream":
+        # process_data reads only the AOI windows over HTTP range requests
+        files = [item for g in granules for item in granule_files(g)]
+        path = remote_io.write_manifest(download_dir, files)
+        print(f"\n=== Summary ===")
+        print(f"Streaming {len(files)} files; URL manifest written to {path}")
+        return
+
+    files, fetched = download(granules, download_dir, workers=workers, retries=retries, cache_dir=cache_dir)
+    total_files = len(files)
+    # DOWNLOAD_DIR keeps the links of earlier AOIs and dates; the manifest names this run's files
+    remote_io.write_manifest(download_dir, [{"name": os.path.basename(f), "path": f} for f in files])
 
     print(f"\n=== Summary ===")
-    print(f"Total new files: {total_files}")
+    print(f"Total files: {total_files} ({fetched} newly downloaded, {total_files - fetched} reused from disk or cache)")
     if total_files < 1:
         print("No files downloaded. Consider adjusting parameters and rerun.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with instrument.span("prepare_data"):
+        main()
\ No newline at end of file
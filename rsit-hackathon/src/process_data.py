@@ -1,191 +1,455 @@
 import os
-import h5py
-import rasterio
-from rasterio.mask import mask
-from rasterio.warp import transform_geom
+import re
+from rasterio.windows import Window
 import numpy as np
 import json
 import glob
-from datetime import datetime
-
-def find_hdf5_variable(group, keywords, priority_keywords):
-    """Recursively search for a dataset, prioritizing certain keywords."""
-    candidates = {}
-    for key in group:
-        if isinstance(group[key], h5py.Dataset):
-            if all(k in key.lower() for k in keywords):
-                candidates[key] = group[key]
-        elif isinstance(group[key], h5py.Group):
-            found = find_hdf5_variable(group[key], keywords, priority_keywords)
-            if found: return found
-
-    if not candidates: return None
-
-    for p_key in priority_keywords:
-        for c_key in candidates:
-            if p_key in c_key.lower():
-                return candidates[c_key]
-    
-    return list(candidates.values())[0]
-
-def get_smap_data(file_path):
-    """Extracts and normalizes soil moisture data from a SMAP HDF5 file."""
-    try:
-        with h5py.File(file_path, 'r') as f:
-            sm_surface_data = find_hdf5_variable(f, ['soil', 'moisture'], ['surface'])
-            sm_root_data = find_hdf5_variable(f, ['soil', 'moisture'], ['root'])
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+import granule_cache
+import smap_grid
+import hdf5_schema
+import ecostress_grid
+from aoi_catalog import load_catalog, make_aoi
+import result_store
+import aoi_cube
+import rsi_raster
+import remote_io
+import instrument
+
+def read_smap_aois(file_path, aois):
+    """Extracts and normalizes soil moisture for many AOIs from one open SMAP HDF5 file.
 
-            sm_surface_norm, sm_root_norm = None, None
+    The file and its variable paths are resolved once; each AOI then reads only the
+    hyperslab covering its bbox. Returns {aoi name: (sm_surface_norm, sm_root_norm)}.
+    Errors are raised to the caller.
+    """
+    with instrument.span("smap.read", file=os.path.basename(file_path), aois=len(aois)), \
+            remote_io.open_h5(file_path, **smap_grid.CHUNK_CACHE) as f:
+        variables = hdf5_schema.resolve(f, file_path)
+        lat_data, lon_data = variables['cell_lat'], variables['cell_lon']
+        if lat_data is None or lon_data is None:
+            raise ValueError("No lat/lon datasets found to locate the AOI window.")
 
-            if sm_surface_data is not None:
-                sm_surface = np.nanmean(sm_surface_data[:])
-                sm_surface_norm = float(np.clip(sm_surface / 0.5, 0, 1))
+        cube_dir = aoi_cube.cube_root()
+        timestamp = parse_granule_time(file_path)
+        stats = {}
+        for aoi in aois:
+            window = smap_grid.find_window(lat_data, lon_data, aoi["bbox"])
+            stats[aoi["name"]] = _smap_norms(variables, window)
+            if cube_dir and timestamp is not None and variables['sm_surface'] is not None:
+                # The window was just read, so these come from the chunk cache
+                cells = {name: smap_grid.read_window(variables[name], window) if variables[name] is not None
+                         else np.full((window[1] - window[0]) * (window[3] - window[2]), np.nan)
+                         for name in ("sm_surface", "sm_rootzone")}
+                aoi_cube.append(cube_dir, aoi["name"], "sm", timestamp.replace(tzinfo=timezone.utc),
+                                os.path.basename(file_path), cells)
+        return stats
 
-            if sm_root_data is not None:
-                sm_root = np.nanmean(sm_root_data[:])
-                sm_root_norm = float(np.clip(sm_root / 0.5, 0, 1))
+def read_smap_data(file_path, bbox=None):
+    """Extracts and normalizes soil moisture over the AOI window of a SMAP HDF5 file.
 
-            return sm_surface_norm, sm_root_norm
+    Only the hyperslab covering `bbox` is read; without a bbox the whole grid is averaged.
+    Errors are raised to the caller.
+    """
+    if bbox is not None:
+        return read_smap_aois(file_path, [make_aoi("aoi", bbox)])["aoi"]
+    with remote_io.open_h5(file_path, **smap_grid.CHUNK_CACHE) as f:
+        return _smap_norms(hdf5_schema.resolve(f, file_path), None)
+
+def get_smap_data(file_path, bbox=None):
+    """Like read_smap_data, but reports errors and returns (None, None)."""
+    try:
+        return read_smap_data(file_path, bbox)
     except Exception as e:
         print(f"Error processing SMAP file {os.path.basename(file_path)}: {e}")
         return None, None
 
+def _smap_norms(variables, window):
+    sm_surface_data = variables['sm_surface']
+    sm_root_data = variables['sm_rootzone']
+    sm_surface_norm, sm_root_norm = None, None
+
+    if sm_surface_data is not None:
+        sm_surface = _window_mean(sm_surface_data, window)
+        if sm_surface is not None:
+            sm_surface_norm = float(np.clip(sm_surface / 0.5, 0, 1))
+
+    if sm_root_data is not None:
+        sm_root = _window_mean(sm_root_data, window)
+        if sm_root is not None:
+            sm_root_norm = float(np.clip(sm_root / 0.5, 0, 1))
+
+    return sm_surface_norm, sm_root_norm
+
+def _window_mean(dataset, window):
+    """Mean of the valid cells in a window (the full grid if window is None), or None if all are fill."""
+    if window is None:
+        window = [0, dataset.shape[0], 0, dataset.shape[1]]
+    data = smap_grid.read_window(dataset, window)
+    instrument.count("bytes_read", data.nbytes)
+    if np.all(np.isnan(data)):
+        return None
+    return float(np.nanmean(data))
+
+def read_ecostress_aois(lst_file_path, aois):
+    """Extracts, masks, and normalizes LST for many AOIs from one ECOSTRESS GeoTIFF.
+
+    AOIs whose window misses the tile are skipped from the header alone. LST and QC are
+    read once over the block-aligned union of the remaining AOI windows, and each AOI's
+    statistic comes from a vectorized pixel mask on that array.
+    Returns {aoi name: (avg_lst, lst_norm)} for the intersecting AOIs. Errors are raised.
+    """
+    with instrument.span("ecostress.read", file=os.path.basename(lst_file_path), aois=len(aois)) as s, \
+            remote_io.open_raster(lst_file_path) as src:
+        print(f"  - Raster CRS: {src.crs}")
+        if not src.crs:
+            raise ValueError("Source raster has no CRS specified.")
+
+        # Windows and AOI masks are cached per (CRS, transform), which repeats for the same tile
+        hits = []
+        for aoi in aois:
+            window, outside = ecostress_grid.aoi_window(src, aoi["geometry"])
+            if window is not None and not outside.all():
+                hits.append((aoi, window, outside))
+        if not hits:
+            print("  - Result: Tile does not intersect any AOI.")
+            s.count("tiles_skipped")
+            return {}
+
+        row0 = min(int(w.row_off) for _, w, _ in hits)
+        col0 = min(int(w.col_off) for _, w, _ in hits)
+        row1 = max(int(w.row_off + w.height) for _, w, _ in hits)
+        col1 = max(int(w.col_off + w.width) for _, w, _ in hits)
+        union = Window(col0, row0, col1 - col0, row1 - row0)
+
+        raw = src.read(1, window=union)
+        data = raw.astype(np.float32)
+        s.count("bytes_read", raw.nbytes)
+        nodata = src.nodata
+
+        # --- QC Data Masking ---
+        qc_file_path = lst_file_path.replace('_LST.tif', '_QC.tif')
+        qc_data = None
+        if remote_io.exists(qc_file_path):
+            with remote_io.open_raster(qc_file_path) as qc_src:
+                if qc_src.crs == src.crs and qc_src.transform == src.transform and qc_src.shape == src.shape:
+                    qc_data = qc_src.read(1, window=union)
+                else:
+                    # Pixels line up only on the same grid; otherwise QC is resampled onto the LST window
+                    print(f"  - Warning: QC grid of {os.path.basename(qc_file_path)} differs from LST; "
+                          "resampling it (nearest) onto the LST grid.")
+                    qc_data = ecostress_grid.read_onto(qc_src, src.crs, src.window_transform(union),
+                                                       (int(union.height), int(union.width)))
+                s.count("bytes_read", qc_data.nbytes)
+                data[qc_data != 0] = np.nan
+
+        # --- Data Conversion and Filtering ---
+        data[data == src.nodata] = np.nan
+        data = data * 0.02 - 273.15 # Apply scale and offset
+        data[data < -50] = np.nan # Filter out unrealistic values
+
+    stats = {}
+    for aoi, window, outside in hits:
+        r, c = int(window.row_off) - row0, int(window.col_off) - col0
+        values = data[r:r + outside.shape[0], c:c + outside.shape[1]][~outside]
+        if values.size == 0 or np.all(np.isnan(values)):
+            print(f"  - Result [{aoi['name']}]: No valid data in AOI after masking.")
+            stats[aoi["name"]] = (None, None)
+            continue
+
+        avg_lst = np.nanmean(values)
+        lst_norm = np.clip((avg_lst - 0) / 40, 0, 1)
+        print(f"  - Result [{aoi['name']}]: Success! Avg LST: {avg_lst:.2f}°C")
+        stats[aoi["name"]] = (float(avg_lst), float(lst_norm))
+
+    # Raw LST/QC of each AOI's pixels go to the data cube for later re-analysis
+    cube_dir = aoi_cube.cube_root()
+    timestamp = parse_granule_time(lst_file_path)
+    if cube_dir and timestamp is not None:
+        for aoi, window, outside in hits:
+            r, c = int(window.row_off) - row0, int(window.col_off) - col0
+            inside = ~outside
+            pixels = raw[r:r + outside.shape[0], c:c + outside.shape[1]][inside]
+            qc = (qc_data[r:r + outside.shape[0], c:c + outside.shape[1]][inside] if qc_data is not None
+                  else np.zeros(pixels.size, dtype=np.uint16))
+            aoi_cube.append(cube_dir, aoi["name"], "lst", timestamp.replace(tzinfo=timezone.utc),
+                            os.path.basename(lst_file_path), {"lst": pixels, "qc": qc}, nodata=nodata)
+    return stats
+
+def read_ecostress_data(lst_file_path, bbox):
+    """Extracts, masks, and normalizes LST data from an ECOSTRESS GeoTIFF.
+
+    LST and QC are read through the same block-aligned window around the AOI, and tiles
+    that do not intersect the AOI are rejected from their header before any pixel is read.
+    Errors are raised to the caller.
+    """
+    return read_ecostress_aois(lst_file_path, [make_aoi("aoi", bbox)]).get("aoi", (None, None))
+
 def get_ecostress_data(lst_file_path, bbox):
-    """Extracts, masks, and normalizes LST data from an ECOSTRESS GeoTIFF."""
+    """Like read_ecostress_data, but reports errors and returns (None, None)."""
     try:
-        with rasterio.open(lst_file_path) as src:
-            print(f"  - Raster CRS: {src.crs}")
-            if not src.crs:
-                raise ValueError("Source raster has no CRS specified.")
-
-            # Define the geometry in WGS84
-            geom = [{'type': 'Polygon', 'coordinates': [[(bbox[0], bbox[1]), (bbox[2], bbox[1]), (bbox[2], bbox[3]), (bbox[0], bbox[3]), (bbox[0], bbox[1])]]}]
-            
-            # Transform the geometry to the raster's CRS
-            print(f"  - Warping geometry from EPSG:4326 to {src.crs}...")
-            warped_geom = [transform_geom('EPSG:4326', src.crs, g) for g in geom]
-            print(f"  - Warped geometry: {warped_geom}")
-
-            # Mask the raster with the warped geometry
-            try:
-                out_image, out_transform = mask(src, warped_geom, crop=True)
-            except ValueError as e:
-                print(f"  - ERROR during mask operation: {e}")
-                # Re-raise or return to indicate failure
-                raise e
-
-            data = out_image[0].astype(np.float32)
-
-            # --- QC Data Masking ---
-            qc_file_path = lst_file_path.replace('_LST.tif', '_QC.tif')
-            if os.path.exists(qc_file_path):
-                with rasterio.open(qc_file_path) as qc_src:
-                    qc_out_image, _ = mask(qc_src, warped_geom, crop=True)
-                    qc_data = qc_out_image[0]
-                    data[qc_data != 0] = np.nan
-
-            # --- Data Conversion and Filtering ---
-            data[data == src.nodata] = np.nan
-            data = data * 0.02 - 273.15 # Apply scale and offset
-            data[data < -50] = np.nan # Filter out unrealistic values
-
-            if np.all(np.isnan(data)):
-                print("  - Result: No valid data in AOI after masking.")
-                return None, None
-
-            avg_lst = np.nanmean(data)
-            lst_norm = np.clip((avg_lst - 0) / 40, 0, 1)
-            
-            print(f"  - Result: Success! Avg LST: {avg_lst:.2f}°C")
-            return float(avg_lst), float(lst_norm)
-
+        return read_ecostress_data(lst_file_path, bbox)
     except Exception as e:
         print(f"Error processing ECOSTRESS file {os.path.basename(lst_file_path)}: {e}")
         return None, None
 
+EXTRACTORS = {"smap": read_smap_aois, "ecostress": read_ecostress_aois}
+
+def extract_granule(task):
+    """Pool worker: runs one (kind, path, aois) extraction and returns a small picklable summary."""
+    kind, path, aois = task
+    try:
+        return {"kind": kind, "path": path, "values": EXTRACTORS[kind](path, aois), "error": None}
+    except Exception as e:
+        return {"kind": kind, "path": path, "values": {}, "error": f"{type(e).__name__}: {e}"}
+
+def extract_all(tasks, workers=1):
+    """Extracts many granules, in a process pool when workers > 1, preserving task order.
+
+    Returns (values, errors): one {aoi name: (a, b)} dict per task, and a list of
+    {"path", "error"} for the tasks that failed.
+    """
+    with instrument.span("process.extract", tasks=len(tasks), workers=workers) as span:
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                summaries = list(pool.map(extract_granule, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+        else:
+            summaries = [extract_granule(t) for t in tasks]
+        errors = [{"path": s["path"], "error": s["error"]} for s in summaries if s["error"]]
+        span.count("granules", len(tasks))
+        span.count("errors", len(errors))
+    return [s["values"] for s in summaries], errors
+
+def parse_granule_time(file_path):
+    """Acquisition time from a granule file name (the first YYYYMMDDTHHMMSS token), or None."""
+    match = re.search(r'(?<!\d)(\d{8}T\d{6})(?!\d)', os.path.basename(file_path))
+    return datetime.strptime(match.group(1), '%Y%m%dT%H%M%S') if match else None
+
+def timed_granules(files):
+    """Parses every file name once and returns [(datetime, path)] sorted by time."""
+    granules = []
+    for path in files:
+        t = parse_granule_time(path)
+        if t is None:
+            print(f"Skipping file without a timestamp: {os.path.basename(path)}")
+            continue
+        granules.append((t, path))
+    return sorted(granules)
+
+def pair_granules(eco_granules, smap_granules, tolerance):
+    """Pairs each ECOSTRESS granule with the nearest SMAP granule within `tolerance`.
+
+    Both inputs must be sorted by time; a two-pointer merge makes this O(n + m).
+    Returns [(eco_time, eco_path, smap_path or None)] in time order.
+    """
+    pairs = []
+    j = 0
+    for eco_time, eco_path in eco_granules:
+        while j + 1 < len(smap_granules) and smap_granules[j + 1][0] <= eco_time:
+            j += 1
+        best = None
+        for smap_time, smap_path in smap_granules[j:j + 2]:
+            delta = abs(eco_time - smap_time)
+            if delta < tolerance and (best is None or delta < best[0]):
+                best = (delta, smap_path)
+        pairs.append((eco_time, eco_path, best[1] if best else None))
+    return pairs
+
+def build_record(timestamp, aoi_name, aoi_bbox, lst, lst_norm, sm_surface_norm, sm_root_norm):
+    """Computes the RSI for one timestamp, falling back to neutral values for missing inputs."""
+    if lst is None:
+        print("Warning: LST data not found. Assuming neutral temperature of 25°C for RSI calculation.")
+        lst = 25.0
+        lst_norm = np.clip((lst - 0) / 40, 0, 1)
+
+    t_norm = lst_norm
+    m_norm = sm_surface_norm if sm_surface_norm is not None else 0.5
+    m_deficit = 1 - m_norm
+    rsi = (0.6 * t_norm) + (0.4 * m_deficit)
+
+    return {
+        "timestamp": timestamp,
+        "aoi": {"name": aoi_name, "bbox": list(aoi_bbox)},
+        "lst_c": round(lst, 2) if lst is not None else None,
+        "sm_surface": sm_surface_norm,
+        "sm_root": sm_root_norm,
+        "t_norm": float(t_norm) if t_norm is not None else None,
+        "m_norm": float(m_norm) if m_norm is not None else None,
+        "rsi": round(rsi, 4)
+    }
+
+def process_latest(eco_granules, smap_granules, aois, tolerance):
+    """Builds one record per AOI from the newest ECOSTRESS granule with valid pixels in it.
+
+    Granules are tried newest-first, each opened once for all AOIs still without a value.
+    """
+    found = {}
+
+    # Try to find a valid ECOSTRESS file first
+    for eco_time, eco_path, smap_path in reversed(pair_granules(eco_granules, smap_granules, tolerance)):
+        pending = [aoi for aoi in aois if aoi["name"] not in found]
+        if not pending:
+            break
+        print(f"Processing ECOSTRESS: {os.path.basename(eco_path)}")
+        try:
+            stats = read_ecostress_aois(eco_path, pending)
+        except Exception as e:
+            print(f"Error processing ECOSTRESS file {os.path.basename(eco_path)}: {e}")
+            continue
+        for name, (lst, lst_norm) in stats.items():
+            if lst is not None:
+                found[name] = (eco_time.isoformat() + "Z", lst, lst_norm, smap_path)
+
+    # If no valid LST was found, fall back to SMAP or START_DATE for timestamp
+    for aoi in aois:
+        if aoi["name"] in found:
+            continue
+        if smap_granules:
+            smap_time, smap_path = smap_granules[-1]
+            found[aoi["name"]] = (smap_time.isoformat() + "Z", None, None, smap_path)
+        else:
+            timestamp = datetime.strptime(os.environ.get("START_DATE"), '%Y-%m-%d').isoformat() + "Z"
+            found[aoi["name"]] = (timestamp, None, None, None)
+
+    # Each SMAP file is opened once for all AOIs that use it
+    smap_stats = {}
+    for smap_path in sorted({v[3] for v in found.values() if v[3]}):
+        print(f"Processing SMAP: {os.path.basename(smap_path)}")
+        try:
+            smap_stats[smap_path] = read_smap_aois(smap_path, [a for a in aois if found[a["name"]][3] == smap_path])
+        except Exception as e:
+            print(f"Error processing SMAP file {os.path.basename(smap_path)}: {e}")
+
+    results = []
+    for aoi in aois:
+        timestamp, lst, lst_norm, smap_path = found[aoi["name"]]
+        sm_surface_norm, sm_root_norm = smap_stats.get(smap_path, {}).get(aoi["name"], (None, None))
+        results.append(build_record(timestamp, aoi["name"], aoi["bbox"], lst, lst_norm, sm_surface_norm, sm_root_norm))
+    return results
+
+def process_batch(eco_granules, smap_granules, aois, tolerance, workers=1, processed=frozenset()):
+    """Builds one record per AOI and ECOSTRESS/SMAP pair in a single pass over all granules.
+
+    Every granule is opened once for all AOIs. ECOSTRESS granules without SMAP within
+    `tolerance` still produce records, with the neutral soil moisture fallback of build_record.
+    ECOSTRESS granules listed in `processed` (a set of (aoi name, granule ID)) are skipped for
+    those AOIs. Returns (records, errors, done), where errors follow extract_all and done lists
+    the (aoi name, granule ID) pairs paired with SMAP and handled successfully in this run.
+    """
+    results = []
+    seen = set()
+    pairs = []
+    for eco_time, eco_path, smap_path in pair_granules(eco_granules, smap_granules, tolerance):
+        pending = [aoi for aoi in aois if (aoi["name"], os.path.basename(eco_path)) not in processed]
+        if pending:
+            pairs.append((eco_time, eco_path, smap_path, pending))
+    unmatched = [os.path.basename(p[1]) for p in pairs if p[2] is None]
+    print(f"{len(pairs)} of {len(eco_granules)} ECOSTRESS granules not yet processed.")
+    if unmatched:
+        print(f"Warning: {len(unmatched)} ECOSTRESS granule(s) have no SMAP within {tolerance}; "
+              f"using neutral soil moisture for: {', '.join(unmatched)}")
+
+    # Each SMAP file is extracted once even when it pairs with several LST granules
+    smap_paths = sorted({p[2] for p in pairs if p[2] is not None})
+    tasks = [("ecostress", p[1], p[3]) for p in pairs] + [("smap", path, aois) for path in smap_paths]
+    print(f"Extracting {len(tasks)} granules for {len(aois)} AOI(s) with {workers} worker(s)...")
+    values, errors = extract_all(tasks, workers)
+    smap_values = dict(zip(smap_paths, values[len(pairs):]))
+    failed = {e["path"] for e in errors}
+
+    done = []
+    for (eco_time, eco_path, smap_path, pending), eco_stats in zip(pairs, values[:len(pairs)]):
+        # Unmatched granules stay pending so a later run can redo them once their SMAP arrives
+        if smap_path is not None and eco_path not in failed and smap_path not in failed:
+            done += [(aoi["name"], os.path.basename(eco_path)) for aoi in pending]
+        for aoi in pending:
+            lst, lst_norm = eco_stats.get(aoi["name"], (None, None))
+            if lst is None or (aoi["name"], eco_time) in seen:
+                continue  # Another tile of the same acquisition already produced this timestamp
+            sm_surface_norm, sm_root_norm = smap_values.get(smap_path, {}).get(aoi["name"], (None, None))
+            results.append(build_record(eco_time.isoformat() + "Z", aoi["name"], aoi["bbox"], lst, lst_norm, sm_surface_norm, sm_root_norm))
+            seen.add((aoi["name"], eco_time))
+    return results, errors, done
+
 def main():
     input_dir = os.path.abspath(os.environ.get("DOWNLOAD_DIR", "./tmp_data"))
     aoi_bbox_str = os.environ.get("BBOX", "-77.6,38.85,-77.3,39.15")
     output_file = os.path.abspath(os.environ.get("OUTPUT_FILE", "./docs/data/result.json"))
     aoi_name = os.environ.get("AOI_NAME", "ashburn")
+    catalog_path = os.environ.get("AOI_CATALOG")
 
-    aoi_bbox = tuple(map(float, aoi_bbox_str.split(',')))
+    if catalog_path:
+        aois = load_catalog(catalog_path)
+        print(f"Loaded {len(aois)} AOIs from {catalog_path}")
+    else:
+        aois = [make_aoi(aoi_name, tuple(map(float, aoi_bbox_str.split(','))))]
 
     print(f"Starting data processing from: {input_dir}")
-    smap_files = sorted(glob.glob(os.path.join(input_dir, '*_SM_*.h5')))
-    lst_files = sorted(glob.glob(os.path.join(input_dir, '*_LST.tif')))
+    # prepare_data lists the granules of its run (paths, or URLs read remotely when streaming);
+    # without a manifest every granule in the directory is used
+    files = remote_io.read_manifest(input_dir)
+    if files is None and remote_io.access_mode() != "stream":
+        files = glob.glob(os.path.join(input_dir, '*'))
+    files = sorted(files or [], key=os.path.basename)
+    smap_files = [f for f in files if re.search(r'_SM_.*\.h5$', os.path.basename(f))]
+    lst_files = [f for f in files if f.endswith('_LST.tif')]
+    # Inputs are usually links into the shared granule cache; reading them counts as a use for LRU eviction
+    for path in smap_files + lst_files:
+        if not remote_io.is_remote(path):
+            granule_cache.touch(path)
 
     print(f"Found {len(smap_files)} SMAP files and {len(lst_files)} ECOSTRESS LST files.")
 
-    results = []
+    mode = os.environ.get("PROCESS_MODE", "latest")
+    tolerance = timedelta(hours=float(os.environ.get("PAIR_TOLERANCE_HOURS", 3)))
+    workers = int(os.environ.get("WORKERS", 1))
+    store_dir = os.environ.get("RESULT_STORE")
+
+    if mode == "raster":
+        # Per-pixel RSI COGs per AOI and granule under RASTER_DIR; the record file is left as is
+        raster_dir = os.path.abspath(os.environ.get("RASTER_DIR", "./docs/data/rsi"))
+        pairs = pair_granules(timed_granules(lst_files), timed_granules(smap_files), tolerance)
+        with instrument.span("process.raster", aois=len(aois), granules=len(pairs)) as span:
+            written = rsi_raster.write_rasters(pairs, aois, raster_dir)
+            span.count("rasters", len(written))
+        os.makedirs(raster_dir, exist_ok=True)
+        index_path = os.path.join(raster_dir, "index.json")
+        for summary in written:
+            summary["path"] = os.path.relpath(summary["path"], raster_dir)
+        with open(index_path + ".tmp", "w") as f:
+            json.dump(written, f, indent=2)
+        os.replace(index_path + ".tmp", index_path)
+        print(f"Wrote {len(written)} RSI rasters and {index_path}")
+        return
+
+    results, errors, done = [], [], []
     if not smap_files and not lst_files:
         print("No data files found to process.")
     else:
-        sm_surface_norm, sm_root_norm, lst, lst_norm = None, None, None, None
-        timestamp = "N/A"
-
-        # Try to find a valid ECOSTRESS file first
-        for eco_path in reversed(lst_files):
-            print(f"Processing ECOSTRESS: {os.path.basename(eco_path)}")
-            lst, lst_norm = get_ecostress_data(eco_path, aoi_bbox)
-            if lst is not None:
-                try:
-                    fname = os.path.basename(eco_path)
-                    dt_str = fname.split('_')[5]
-                    timestamp = datetime.strptime(dt_str, '%Y%m%dT%H%M%S').isoformat() + "Z"
-                    # Find a corresponding SMAP file by timestamp
-                    for smap_path in reversed(smap_files):
-                        smap_fname = os.path.basename(smap_path)
-                        smap_dt_str = smap_fname.split('_')[4]
-                        smap_timestamp = datetime.strptime(smap_dt_str, '%Y%m%dT%H%M%S')
-                        eco_timestamp = datetime.strptime(dt_str, '%Y%m%dT%H%M%S')
-                        if abs((eco_timestamp - smap_timestamp).total_seconds()) < 3 * 3600:
-                            print(f"Found matching SMAP: {smap_fname}")
-                            sm_surface_norm, sm_root_norm = get_smap_data(smap_path)
-                            break
-                    break  # Found a valid LST, so we stop
-                except Exception as e:
-                    print(f"Timestamp parsing or SMAP search error: {e}")
-                    continue
-
-        # If no valid LST was found, fall back to SMAP or START_DATE for timestamp
-        if timestamp == "N/A":
-            if smap_files:
-                smap_path = smap_files[-1]
-                try:
-                    fname = os.path.basename(smap_path)
-                    dt_str = fname.split('_')[4]
-                    timestamp = datetime.strptime(dt_str, '%Y%m%dT%H%M%S').isoformat() + "Z"
-                    print(f"Processing SMAP for timestamp: {fname}")
-                    sm_surface_norm, sm_root_norm = get_smap_data(smap_path)
-                except Exception as e: 
-                    print(f"SMAP processing error: {e}")
+        eco_granules = timed_granules(lst_files)
+        smap_granules = timed_granules(smap_files)
+        with instrument.span("process." + mode, aois=len(aois)) as span:
+            if mode == "batch":
+                processed = result_store.load_processed(store_dir) if store_dir else frozenset()
+                results, errors, done = process_batch(eco_granules, smap_granules, aois, tolerance, workers, processed)
             else:
-                timestamp = datetime.strptime(os.environ.get("START_DATE"), '%Y-%m-%d').isoformat() + "Z"
-
-        # --- RSI Calculation ---
-        if lst is None:
-            print("Warning: LST data not found. Assuming neutral temperature of 25°C for RSI calculation.")
-            lst = 25.0
-            lst_norm = np.clip((lst - 0) / 40, 0, 1)
-
-        t_norm = lst_norm
-        m_norm = sm_surface_norm if sm_surface_norm is not None else 0.5
-        m_deficit = 1 - m_norm
-        rsi = (0.6 * t_norm) + (0.4 * m_deficit)
-
-        record = {
-            "timestamp": timestamp,
-            "aoi": {"name": aoi_name, "bbox": list(aoi_bbox)},
-            "lst_c": round(lst, 2) if lst is not None else None,
-            "sm_surface": sm_surface_norm,
-            "sm_root": sm_root_norm,
-            "t_norm": float(t_norm) if t_norm is not None else None,
-            "m_norm": float(m_norm) if m_norm is not None else None,
-            "rsi": round(rsi, 4)
-        }
-        results.append(record)
-        print(f"Calculated record: {record}")
+                results = process_latest(eco_granules, smap_granules, aois, tolerance)
+            span.count("records", len(results))
+        for record in results:
+            print(f"Calculated record: {record}")
+        if errors:
+            print(f"{len(errors)} granule(s) failed:")
+            for e in errors:
+                print(f" - {os.path.basename(e['path'])}: {e['error']}")
+
+    if store_dir:
+        # History lives in the append-only store, so a run costs only its new records. The
+        # deduplicated JSON view is written separately: python src/result_store.py export
+        with instrument.span("process.store"):
+            result_store.append(store_dir, results, done)
+        print(f"Appended {len(results)} records to the result store at {store_dir}")
+        return
 
     try:
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
@@ -196,4 +460,5 @@ def main():
         print(f"Error writing to JSON file: {e}")
 
 if __name__ == "__main__":
-    main()
+    with instrument.span("process_data"):
+        main()
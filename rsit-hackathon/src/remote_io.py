@@ -0,0 +1,298 @@
+import io
+import os
+import re
+import sys
+import json
+import threading
+from collections import OrderedDict
+import instrument
+from download_engine import get_session
+
+# Range reads are made in whole blocks of BLOCK_SIZE bytes; up to CACHE_BYTES of them are kept
+# per open file (LRU). Sequential reads fetch READAHEAD extra blocks, and missing blocks closer
+# than COALESCE_GAP blocks apart are fetched in one request.
+BLOCK_SIZE = 64 * 1024
+CACHE_BYTES = 32 * 1024 ** 2
+READAHEAD = 4
+COALESCE_GAP = 2
+MANIFEST_NAME = "granules.json"
+
+_auth_lock = threading.Lock()
+_logged_in = False
+
+def is_remote(path):
+    return isinstance(path, str) and path.startswith(("http://", "https://"))
+
+def access_mode():
+    """'download' (default) keeps whole files in DOWNLOAD_DIR; 'stream' reads granules over HTTP."""
+    return os.environ.get("ACCESS_MODE", "download")
+
+def session_factory():
+    """requests session for range reads: Earthdata-authenticated by default, plain with REMOTE_AUTH=none."""
+    import requests
+    if os.environ.get("REMOTE_AUTH", "earthdata") == "none":
+        return requests.Session()
+    global _logged_in
+    import earthaccess
+    with _auth_lock:
+        if not _logged_in:
+            earthaccess.login(strategy="netrc")
+            _logged_in = True
+    return earthaccess.get_requests_https_session()
+
+def _session():
+    # Thread-local, like the download workers: requests.Session is not thread-safe
+    return get_session(session_factory)
+
+class HTTPRangeFile(io.RawIOBase):
+    """Read-only, seekable file over HTTP byte-range requests with a block LRU cache.
+
+    Only the blocks covering what the reader asks for are transferred, so h5py and GDAL read
+    just the chunks/tiles of an AOI window. The URL after redirects (e.g. a signed S3 URL) is
+    reused for later requests and re-resolved if it is refused.
+    """
+
+    def __init__(self, url, session=None, block_size=BLOCK_SIZE, cache_bytes=CACHE_BYTES,
+                 readahead=READAHEAD, coalesce_gap=COALESCE_GAP):
+        super().__init__()
+        self.url = url
+        self.name = url
+        self._resolved = url
+        self._session = session
+        self.block_size = block_size
+        self.max_blocks = max(1, cache_bytes // block_size)
+        self.readahead = readahead
+        self.coalesce_gap = coalesce_gap
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+        self._pos = 0
+        self._last_end = None
+        self.size = None
+        self.requests = 0
+        self.bytes_fetched = 0
+        # The first block holds the HDF5 superblock / TIFF header and tells us the file size
+        self._fetch(0, 0)
+
+    # --- io.RawIOBase ---
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}")
+        if self._pos < 0:
+            raise ValueError("Negative seek position")
+        return self._pos
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast("B")
+        data = self.pread(self._pos, len(view))
+        view[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def readall(self):
+        return self.read(max(self.size - self._pos, 0))
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = max(self.size - self._pos, 0)
+        data = self.pread(self._pos, size)
+        self._pos += len(data)
+        return data
+
+    # --- Block cache ---
+
+    def pread(self, offset, length):
+        """Bytes [offset, offset + length), fetching only the blocks not cached yet."""
+        if offset >= self.size or length <= 0:
+            return b""
+        end = min(offset + length, self.size)
+        first, last = offset // self.block_size, (end - 1) // self.block_size
+        with self._lock:
+            # Collected here rather than read back from the cache, which a read larger than
+            # CACHE_BYTES overflows while fetching its own blocks
+            blocks = {b: self._blocks[b] for b in range(first, last + 1) if b in self._blocks}
+            missing = [b for b in range(first, last + 1) if b not in blocks]
+            if missing:
+                # A read continuing where the last one ended is likely sequential: read ahead
+                if self._last_end == offset and self.readahead:
+                    last_block = (self.size - 1) // self.block_size
+                    missing += [b for b in range(last + 1, min(last + self.readahead, last_block) + 1)
+                                if b not in self._blocks]
+                for run_first, run_last in self._runs(missing):
+                    blocks.update(self._fetch(run_first, run_last))
+            parts = []
+            for b in range(first, last + 1):
+                block = blocks[b]
+                if b in self._blocks:
+                    self._blocks.move_to_end(b)
+                lo = offset - b * self.block_size if b == first else 0
+                hi = end - b * self.block_size if b == last else len(block)
+                parts.append(block[lo:hi])
+            self._last_end = end
+        return b"".join(parts)
+
+    def prefetch(self, ranges):
+        """Loads many (offset, length) ranges with as few requests as the gap rule allows."""
+        with self._lock:
+            wanted = sorted({b for offset, length in ranges if length > 0
+                             for b in range(offset // self.block_size, (min(offset + length, self.size) - 1) // self.block_size + 1)
+                             if b not in self._blocks})
+            for run_first, run_last in self._runs(wanted):
+                self._fetch(run_first, run_last)
+
+    def _runs(self, blocks):
+        """Groups sorted block numbers into (first, last) runs, bridging gaps up to coalesce_gap."""
+        runs = []
+        for b in sorted(set(blocks)):
+            if runs and b - runs[-1][1] <= self.coalesce_gap + 1:
+                runs[-1][1] = b
+            else:
+                runs.append([b, b])
+        return [tuple(r) for r in runs]
+
+    def _fetch(self, first, last):
+        start, stop = first * self.block_size, (last + 1) * self.block_size - 1
+        if self.size is not None:
+            stop = min(stop, self.size - 1)
+        data = self._get(start, stop)
+        blocks = {b: data[(b - first) * self.block_size:(b - first + 1) * self.block_size] for b in range(first, last + 1)}
+        for b, block in blocks.items():
+            self._blocks[b] = block
+            self._blocks.move_to_end(b)
+        while len(self._blocks) > self.max_blocks:
+            self._blocks.popitem(last=False)
+        return blocks
+
+    def _get(self, start, stop):
+        session = self._session or _session()
+        for attempt in range(2):
+            r = session.get(self._resolved, headers={"Range": f"bytes={start}-{stop}"}, timeout=60)
+            if r.status_code in (401, 403) and self._resolved != self.url and attempt == 0:
+                self._resolved = self.url  # Expired signed URL: resolve again through the redirect
+                continue
+            break
+        if r.status_code == 404:
+            raise FileNotFoundError(self.url)
+        r.raise_for_status()
+        if r.status_code != 206:
+            raise IOError(f"Server ignored the range request for {self.url} (HTTP {r.status_code})")
+        if self.size is None:
+            match = re.match(r"bytes \d+-\d+/(\d+)", r.headers.get("Content-Range", ""))
+            if not match:
+                raise IOError(f"No file size in the range response for {self.url}")
+            self.size = int(match.group(1))
+        self._resolved = r.url or self._resolved
+        self.requests += 1
+        self.bytes_fetched += len(r.content)
+        instrument.count("range_requests")
+        instrument.count("bytes_remote", len(r.content))
+        return r.content
+
+# --- Opening granules by path or URL ---
+
+def open_h5(path, **kwargs):
+    """h5py.File for a local path or, for a URL, over an HTTPRangeFile."""
+    import h5py
+    if is_remote(path):
+        return h5py.File(HTTPRangeFile(path), 'r', **kwargs)
+    return h5py.File(path, 'r', **kwargs)
+
+def _opener(path, mode="rb"):
+    # GDAL also probes side-car files (.aux.xml, .ovr); those surface as FileNotFoundError
+    if "w" in mode or "a" in mode:
+        raise PermissionError(f"{path} is read-only")
+    if not is_remote(path):
+        raise FileNotFoundError(path)
+    return HTTPRangeFile(path)
+
+def open_raster(path):
+    """rasterio dataset for a local path or, for a URL, read through HTTPRangeFile so GDAL
+    fetches only the internal tiles it reads."""
+    import rasterio
+    if is_remote(path):
+        return rasterio.open(path, opener=_opener)
+    return rasterio.open(path)
+
+def exists(path):
+    """os.path.exists for local paths; for URLs, whether a one-byte range request succeeds."""
+    if not is_remote(path):
+        return os.path.exists(path)
+    r = _session().get(path, headers={"Range": "bytes=0-0"}, timeout=60)
+    instrument.count("range_requests")
+    return r.status_code in (200, 206)
+
+# --- Granule manifest ---
+
+def write_manifest(directory, files):
+    """Records the data files selected by this run in `directory`: their URLs (ACCESS_MODE=stream)
+    or, for downloads, their local paths. process_data reads only what the manifest lists, so
+    files left in the directory by earlier runs are ignored."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, MANIFEST_NAME)
+    entries = [{"name": f["name"], "url": f["url"], "size": f.get("size")} if "url" in f
+               else {"name": f["name"], "path": f["path"]} for f in files]
+    with open(path + ".tmp", "w") as f:
+        json.dump(entries, f, indent=2)
+    os.replace(path + ".tmp", path)
+    return path
+
+def read_manifest(directory):
+    """Paths or URLs listed in the manifest of `directory`, or None without one."""
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            return [entry.get("path") or entry["url"] for entry in json.load(f)]
+    except (OSError, ValueError, KeyError):
+        return None
+
+def serve(directory, port=8000):
+    """Serves a directory over HTTP with single byte-range support, for trying ACCESS_MODE=stream locally."""
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+    class RangeHandler(SimpleHTTPRequestHandler):
+        def send_head(self):
+            match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+            path = self.translate_path(self.path)
+            if not match or not os.path.isfile(path):
+                return super().send_head()
+            size = os.path.getsize(path)
+            start = int(match.group(1))
+            stop = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+            if start >= size:
+                self.send_error(416)
+                return None
+            with open(path, "rb") as f:
+                f.seek(start)
+                body = f.read(stop - start + 1)
+            self.send_response(206)
+            self.send_header("Content-Type", self.guess_type(path))
+            self.send_header("Content-Range", f"bytes {start}-{stop}/{size}")
+            self.send_header("Content-Length", str(stop - start + 1))
+            self.end_headers()
+            return io.BytesIO(body)
+
+    handler = lambda *args, **kwargs: RangeHandler(*args, directory=directory, **kwargs)
+    with ThreadingHTTPServer(("127.0.0.1", port), handler) as httpd:
+        print(f"Serving {directory} with range support on http://127.0.0.1:{port}/")
+        httpd.serve_forever()
+
+if __name__ == "__main__":
+    if len(sys.argv) in (3, 4) and sys.argv[1] == "serve":
+        serve(os.path.abspath(sys.argv[2]), int(sys.argv[3]) if len(sys.argv) == 4 else 8000)
+    else:
+        print("Usage: python remote_io.py serve <directory> [port]")
+        sys.exit(1)
@@ -0,0 +1,102 @@
+import os
+import sys
+import json
+import fcntl
+from contextlib import contextmanager
+
+RESULTS_FILE = "results.ndjson"
+MANIFEST_FILE = "processed.tsv"
+
+def record_key(record):
+    """(aoi, timestamp) key of a process_data record; 'aoi' may be a name or {"name", "bbox"}."""
+    aoi = record.get("aoi")
+    return (aoi.get("name") if isinstance(aoi, dict) else aoi, record.get("timestamp"))
+
+@contextmanager
+def _locked(store_dir):
+    """Serializes writers (appends and compaction) across processes."""
+    os.makedirs(store_dir, exist_ok=True)
+    with open(os.path.join(store_dir, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+def _append_lines(path, lines):
+    with open(path, "a") as f:
+        f.writelines(line + "\n" for line in lines)
+        f.flush()
+        os.fsync(f.fileno())
+
+def append(store_dir, records, processed=()):
+    """Appends records, then the (aoi, granule) pairs they came from, to the store.
+
+    The manifest is written after the records, so a crash in between only causes a
+    granule to be processed again; the duplicate record is removed by compaction.
+    """
+    with _locked(store_dir):
+        if records:
+            _append_lines(os.path.join(store_dir, RESULTS_FILE), [json.dumps(r) for r in records])
+        if processed:
+            _append_lines(os.path.join(store_dir, MANIFEST_FILE), [f"{aoi}\t{granule}" for aoi, granule in processed])
+
+def load_processed(store_dir):
+    """Set of (aoi, granule ID) pairs already processed."""
+    try:
+        with open(os.path.join(store_dir, MANIFEST_FILE)) as f:
+            return {tuple(line.rstrip("\n").split("\t", 1)) for line in f if "\t" in line}
+    except FileNotFoundError:
+        return set()
+
+def read_records(store_dir):
+    """All records, deduplicated by (aoi, timestamp) with the latest write winning, sorted by key."""
+    latest = {}
+    try:
+        with open(os.path.join(store_dir, RESULTS_FILE)) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Torn last line from an interrupted append
+                latest[record_key(record)] = record
+    except FileNotFoundError:
+        return []
+    return [latest[k] for k in sorted(latest, key=lambda k: (str(k[0]), str(k[1])))]
+
+def compact(store_dir):
+    """Rewrites the store sorted and deduplicated, and the manifest deduplicated. Returns the record count."""
+    with _locked(store_dir):
+        records = read_records(store_dir)
+        processed = sorted(load_processed(store_dir))
+        for name, lines in ((RESULTS_FILE, [json.dumps(r) for r in records]),
+                            (MANIFEST_FILE, [f"{aoi}\t{granule}" for aoi, granule in processed])):
+            path = os.path.join(store_dir, name)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.writelines(line + "\n" for line in lines)
+            os.replace(tmp_path, path)
+    print(f"Compacted {store_dir}: {len(records)} records, {len(processed)} processed granules.")
+    return len(records)
+
+def export(store_dir, output_file):
+    """Writes the deduplicated records as the JSON array process_data writes without a store.
+    Returns the record count."""
+    records = read_records(store_dir)
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    tmp_path = f"{output_file}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(records, f, indent=4)
+    os.replace(tmp_path, output_file)
+    print(f"Exported {len(records)} records from {store_dir} to {output_file}.")
+    return len(records)
+
+if __name__ == "__main__":
+    # export defaults to RESULT_STORE and OUTPUT_FILE, as the pipeline's "export" stage runs it
+    if len(sys.argv) == 3 and sys.argv[1] == "compact":
+        compact(sys.argv[2])
+    elif len(sys.argv) in (2, 4) and sys.argv[1] == "export" and (len(sys.argv) == 4 or os.environ.get("RESULT_STORE")):
+        export(*(sys.argv[2:] or [os.environ["RESULT_STORE"], os.environ.get("OUTPUT_FILE", "./docs/data/result.json")]))
+    else:
+        print("Usage: python result_store.py compact <store_dir> | export [<store_dir> <output_file>]")
+        sys.exit(1)
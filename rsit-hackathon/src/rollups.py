@@ -0,0 +1,298 @@
+import os
+import sys
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import json_cache
+from dashboard_artifacts import MANIFEST_FILE, _brotli, _column, _write
+
+# Resolution name -> nominal bucket length in seconds (months are averaged)
+RESOLUTIONS = {"1h": 3600, "1d": 86400, "1w": 7 * 86400, "1M": 2629746}
+# Each coarser level is reduced from the finer one it nests in
+PARENTS = {"1d": "1h", "1w": "1d", "1M": "1d"}
+FIELDS = ("rsi", "price")
+STATS = ("min", "max", "sum", "count", "last")
+ROLLUP_DIR = os.path.join(json_cache.CACHE_DIR, "rollups")
+# Static copy read by the dashboard
+EXPORT_DIR = "docs/data/rollups"
+
+def rollup_dir():
+    return os.environ.get("ROLLUP_DIR", ROLLUP_DIR)
+
+def export_dir():
+    return os.environ.get("ROLLUP_EXPORT_DIR", EXPORT_DIR)
+
+def floor_time(times, resolution):
+    """Bucket start of each datetime64 value; weeks start on Monday, all buckets in UTC."""
+    times = np.asarray(times, dtype="datetime64[s]")
+    if resolution == "1h":
+        return times.astype("datetime64[h]").astype("datetime64[s]")
+    if resolution == "1d":
+        return times.astype("datetime64[D]").astype("datetime64[s]")
+    if resolution == "1w":
+        days = times.astype("datetime64[D]")
+        # 1970-01-01 was a Thursday, so Monday-based weekday is (days + 3) % 7
+        return (days - (days.astype(np.int64) + 3) % 7).astype("datetime64[s]")
+    if resolution == "1M":
+        return times.astype("datetime64[M]").astype("datetime64[s]")
+    raise ValueError(f"Unknown resolution '{resolution}'.")
+
+def _empty():
+    columns = {"aoi": np.array([], dtype=str), "bucket": np.array([], dtype="datetime64[s]")}
+    for field in FIELDS:
+        for stat in STATS:
+            columns[f"{field}_{stat}"] = np.array([], dtype=np.float64)
+    return columns
+
+def _path(resolution, root):
+    return os.path.join(root, f"rollup_{resolution}.npz")
+
+def load(resolution, root=None):
+    """Columns of one resolution sorted by (aoi, bucket), empty if nothing is stored."""
+    try:
+        with np.load(_path(resolution, root or rollup_dir())) as data:
+            return {k: data[k] for k in data.files if not k.startswith("_")}
+    except (OSError, ValueError):
+        return _empty()
+
+def _meta(key, root=None):
+    """Value saved with the hourly level (which is written last), or None."""
+    try:
+        with np.load(_path("1h", root or rollup_dir())) as data:
+            return data[f"_{key}"][()] if f"_{key}" in data.files else None
+    except (OSError, ValueError):
+        return None
+
+def high_water(root=None):
+    """Start of the newest hourly bucket ingested, or None before the first update."""
+    return _meta("high_water", root)
+
+def index_identity(es_client, index):
+    """Names and UUIDs of the indices behind `index`; changes when an index is deleted and recreated."""
+    response = es_client.indices.get(index=index)
+    indices = getattr(response, "body", response)
+    return "|".join(sorted(f"{name}:{info['settings']['index']['uuid']}" for name, info in indices.items()))
+
+def _save(resolution, columns, root, **meta):
+    os.makedirs(root, exist_ok=True)
+    path = _path(resolution, root)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+    np.savez(tmp_path, **columns, **{f"_{k}": v for k, v in meta.items()})
+    os.replace(tmp_path, path)
+
+def _sorted(columns):
+    order = np.lexsort((columns["bucket"], columns["aoi"]))
+    return {k: v[order] for k, v in columns.items()}
+
+def _replace_from(stored, new, since):
+    """Stored rows before `since`, plus `new` (which covers everything from `since` on)."""
+    keep = stored["bucket"] < since
+    merged = {k: np.concatenate([stored[k][keep], new[k]]) for k in stored}
+    merged["aoi"] = merged["aoi"].astype(str)
+    return _sorted(merged)
+
+def _reduce(columns, starts):
+    """Merges the row groups beginning at `starts` (rows sorted, groups contiguous).
+
+    min/max ignore empty buckets, sums and counts add up, and `last` is taken from the
+    last non-empty bucket of each group. The first row of a group gives its aoi/bucket.
+    """
+    out = {"aoi": columns["aoi"][starts], "bucket": columns["bucket"][starts]}
+    for field in FIELDS:
+        count = columns[f"{field}_count"]
+        out[f"{field}_min"] = np.fmin.reduceat(columns[f"{field}_min"], starts)
+        out[f"{field}_max"] = np.fmax.reduceat(columns[f"{field}_max"], starts)
+        out[f"{field}_sum"] = np.add.reduceat(columns[f"{field}_sum"], starts)
+        out[f"{field}_count"] = np.add.reduceat(count, starts)
+        last_row = np.maximum.reduceat(np.where(count > 0, np.arange(count.size), -1), starts)
+        out[f"{field}_last"] = np.where(last_row >= 0, columns[f"{field}_last"][np.maximum(last_row, 0)], np.nan)
+    return out
+
+def _group_starts(*keys):
+    change = np.zeros(keys[0].size, dtype=bool)
+    change[:1] = True
+    for key in keys:
+        change[1:] |= key[1:] != key[:-1]
+    return np.flatnonzero(change)
+
+def rollup(fine, resolution):
+    """Reduces finer rows (sorted by aoi, bucket) to `resolution` buckets."""
+    if fine["bucket"].size == 0:
+        return _empty()
+    coarse = dict(fine)
+    coarse["bucket"] = floor_time(fine["bucket"], resolution)
+    return _reduce(coarse, _group_starts(coarse["aoi"], coarse["bucket"]))
+
+def fetch_hourly(es_client, since, index="rsit-rsi-*", page_size=1000):
+    """Hourly min/max/sum/count/last of rsi and price per AOI from `since` on, computed
+    server-side with a composite terms(aoi) x date_histogram(1h) aggregation paged by after_key."""
+    composite = {
+        "size": page_size,
+        "sources": [
+            {"aoi": {"terms": {"field": "aoi"}}},
+            {"bucket": {"date_histogram": {"field": "@timestamp", "fixed_interval": "1h"}}}
+        ]
+    }
+    sub_aggs = {f"{field}_stats": {"stats": {"field": field}} for field in FIELDS}
+    sub_aggs["last"] = {"top_metrics": {"metrics": [{"field": f} for f in FIELDS], "sort": {"@timestamp": "desc"}}}
+    search_body = {
+        "size": 0,
+        "query": {"range": {"@timestamp": {"gte": str(since) + "Z"}}},
+        "aggs": {"hourly": {"composite": composite, "aggs": sub_aggs}}
+    }
+
+    rows = {k: [] for k in _empty()}
+    while True:
+        response = es_client.search(index=index, body=search_body)
+        agg = response.get("aggregations", {}).get("hourly", {})
+        for b in agg.get("buckets", []):
+            rows["aoi"].append(b["key"]["aoi"])
+            rows["bucket"].append(np.datetime64(b["key"]["bucket"], "ms"))
+            top = b.get("last", {}).get("top", [])
+            metrics = top[0].get("metrics", {}) if top else {}
+            for field in FIELDS:
+                stats = b[f"{field}_stats"]
+                rows[f"{field}_min"].append(stats.get("min") if stats.get("min") is not None else np.nan)
+                rows[f"{field}_max"].append(stats.get("max") if stats.get("max") is not None else np.nan)
+                rows[f"{field}_sum"].append(stats.get("sum") or 0.0)
+                rows[f"{field}_count"].append(stats.get("count") or 0)
+                rows[f"{field}_last"].append(metrics.get(field) if metrics.get(field) is not None else np.nan)
+        if "after_key" not in agg or not agg.get("buckets"):
+            break
+        composite["after"] = agg["after_key"]
+
+    columns = {"aoi": np.array(rows["aoi"], dtype=str),
+               "bucket": np.array(rows["bucket"], dtype="datetime64[ms]").astype("datetime64[s]")}
+    columns.update({k: np.array(v, dtype=np.float64) for k, v in rows.items() if k not in columns})
+    return _sorted(columns)
+
+def update(es_client, root=None, days=365, index="rsit-rsi-*"):
+    """Brings every resolution up to date from the high-water mark.
+
+    The newest hourly bucket may have been partial at the previous run, so fetching restarts
+    at its start and replaces it. Coarser levels are re-reduced only for buckets that
+    overlap the refreshed hours. The increments assume the indexed history only grows: when
+    the indices were recreated since the last update (seed_es replaces its index), every
+    level is rebuilt from `days` back. Returns the number of hourly buckets fetched.
+    """
+    root = root or rollup_dir()
+    identity = index_identity(es_client, index)
+    since = high_water(root)
+    rebuild = since is not None and _meta("index", root) != identity
+    if rebuild:
+        print(f"Indices behind {index} changed since the last update; rebuilding the rollups.")
+    if since is None or rebuild:
+        since = floor_time(np.datetime64(datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)), "1h")
+    stored = (lambda resolution: _empty()) if rebuild else (lambda resolution: load(resolution, root))
+    new = fetch_hourly(es_client, since, index=index)
+
+    levels = {"1h": _replace_from(stored("1h"), new, since)}
+    hw = levels["1h"]["bucket"].max() if levels["1h"]["bucket"].size else since
+    for resolution, parent in PARENTS.items():
+        affected = floor_time(since, resolution)
+        fine = levels[parent]
+        fine = {k: v[fine["bucket"] >= affected] for k, v in fine.items()}
+        levels[resolution] = _replace_from(stored(resolution), rollup(fine, resolution), affected)
+
+    # Coarse levels first: the hourly file carries the mark, so it is written last
+    for resolution in ("1M", "1w", "1d"):
+        _save(resolution, levels[resolution], root)
+    _save("1h", levels["1h"], root, high_water=hw, index=identity)
+    return new["bucket"].size
+
+def select_resolution(start, end, width):
+    """Finest resolution with at most `width` buckets between start and end (one per pixel)."""
+    span = (np.datetime64(end, "s") - np.datetime64(start, "s")).astype(np.int64)
+    for resolution, seconds in RESOLUTIONS.items():
+        if span / seconds <= width:
+            return resolution
+    return "1M"
+
+def query(aoi, start, end, width, root=None):
+    """Rollup rows of one AOI between start and end at the resolution chosen for `width`
+    points, with mean columns added. Never returns more than `width` rows: ranges longer than
+    `width` months are merged further into equal groups of months."""
+    resolution = select_resolution(start, end, width)
+    columns = load(resolution, root)
+    lo, hi = np.searchsorted(columns["aoi"], aoi, side="left"), np.searchsorted(columns["aoi"], aoi, side="right")
+    buckets = columns["bucket"][lo:hi]
+    lo, hi = (lo + np.searchsorted(buckets, floor_time(np.datetime64(start, "s"), resolution), side="left"),
+              lo + np.searchsorted(buckets, np.datetime64(end, "s"), side="right"))
+    rows = {k: v[lo:hi] for k, v in columns.items()}
+
+    if rows["bucket"].size > width:
+        rows = _reduce(rows, np.arange(0, rows["bucket"].size, int(np.ceil(rows["bucket"].size / width))))
+    for field in FIELDS:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rows[f"{field}_mean"] = rows[f"{field}_sum"] / rows[f"{field}_count"]
+    return resolution, rows
+
+def _json_rows(rows):
+    keys = [k for k in rows if not k.endswith(("_sum", "_count"))]
+    out = []
+    for i in range(rows["bucket"].size):
+        row = {k: (str(rows[k][i]) if k in ("aoi", "bucket") else
+                   None if np.isnan(rows[k][i]) else round(float(rows[k][i]), 6)) for k in keys}
+        out.append(row)
+    return out
+
+def export(out_dir=None, root=None):
+    """Writes every AOI's rows of every resolution for the dashboard as columnar JSON
+    ({aoi}/{resolution}.json, with .gz/.br siblings) plus a manifest of files and ranges.
+
+    The dashboard picks the resolution for its date range and chart width the way
+    select_resolution does. Returns the manifest.
+    """
+    out_dir = out_dir or export_dir()
+    brotli = _brotli()
+    manifest = {"updated": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "resolutions": RESOLUTIONS, "high_water": None, "aois": {}}
+    hw = high_water(root)
+    if hw is not None:
+        manifest["high_water"] = str(hw) + "Z"
+    for resolution in RESOLUTIONS:
+        columns = load(resolution, root)
+        if columns["bucket"].size == 0:
+            continue
+        starts = _group_starts(columns["aoi"])
+        for lo, hi in zip(starts, list(starts[1:]) + [columns["bucket"].size]):
+            aoi = str(columns["aoi"][lo])
+            payload = {"aoi": aoi, "resolution": resolution,
+                       "bucket": [str(b) + "Z" for b in columns["bucket"][lo:hi]]}
+            for field in FIELDS:
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    payload[f"{field}_mean"] = _column(columns[f"{field}_sum"][lo:hi] / columns[f"{field}_count"][lo:hi])
+                for stat in ("min", "max", "last"):
+                    payload[f"{field}_{stat}"] = _column(columns[f"{field}_{stat}"][lo:hi])
+            name = f"{aoi}/{resolution}.json"
+            os.makedirs(os.path.join(out_dir, aoi), exist_ok=True)
+            _write(os.path.join(out_dir, name), json.dumps(payload, separators=(",", ":")).encode(), brotli)
+            manifest["aois"].setdefault(aoi, {})[resolution] = {
+                "file": name, "rows": int(hi - lo), "start": payload["bucket"][0], "end": payload["bucket"][-1]}
+    os.makedirs(out_dir, exist_ok=True)
+    # Manifest last, so readers never see files that are not written yet
+    _write(os.path.join(out_dir, MANIFEST_FILE), json.dumps(manifest, separators=(",", ":")).encode(), brotli)
+    return manifest
+
+if __name__ == "__main__":
+    # Without arguments (the pipeline's "rollups" stage): update from Elasticsearch, then export
+    command = sys.argv[1] if len(sys.argv) >= 2 else "update"
+    if command == "update" and len(sys.argv) <= 2:
+        from seed_es import get_es_client
+        es = get_es_client()
+        if not es:
+            sys.exit(1)
+        n = update(es, days=int(os.environ.get("ROLLUP_DAYS", "365")))
+        print(f"Fetched {n} hourly buckets; rollups in {rollup_dir()} up to {high_water()}.")
+        manifest = export()
+        print(f"Exported rollups of {len(manifest['aois'])} AOIs to {export_dir()}.")
+    elif command == "export" and len(sys.argv) == 2:
+        manifest = export()
+        print(f"Exported rollups of {len(manifest['aois'])} AOIs to {export_dir()}.")
+    elif command == "query" and len(sys.argv) == 6:
+        resolution, rows = query(sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5]))
+        print(json.dumps({"resolution": resolution, "rows": _json_rows(rows)}, indent=2))
+    else:
+        print("Usage: python rollups.py [update | export | query <aoi> <start> <end> <width>]")
+        sys.exit(1)
@@ -0,0 +1,223 @@
+import os
+import sys
+import rasterio
+import rasterio.shutil
+import numpy as np
+from rasterio import windows
+from rasterio.enums import Resampling
+from rasterio.features import geometry_mask
+from rasterio.warp import transform as warp_transform, transform_bounds, transform_geom
+from rasterio.windows import Window
+import smap_grid
+import hdf5_schema
+import ecostress_grid
+import remote_io
+from aoi_catalog import make_aoi
+import instrument
+
+# Pixels per side of a processing block. Memory is bounded by a few float arrays of this size,
+# however large the AOI window or the tile is.
+BLOCK_SIZE = 512
+# GDAL block cache while building overviews and the COG copy
+GDAL_CACHE_MB = 64
+COG_OPTIONS = {"compress": "DEFLATE", "predictor": 3, "blocksize": BLOCK_SIZE,
+               "overview_resampling": "average", "overviews": "AUTO"}
+
+def block_size():
+    return int(os.environ.get("RSI_BLOCK_SIZE", BLOCK_SIZE))
+
+def read_smap_grid(smap_path, bounds):
+    """Surface soil moisture (normalized like process_data) around lon/lat `bounds`, padded by one
+    cell so every pixel inside has four neighbours. Returns (lat column, lon row, m_norm) for the
+    separable EASE-Grid 2.0."""
+    with remote_io.open_h5(smap_path, **smap_grid.CHUNK_CACHE) as f:
+        variables = hdf5_schema.resolve(f, smap_path)
+        lat_ds, lon_ds, sm_ds = variables['cell_lat'], variables['cell_lon'], variables['sm_surface']
+        if lat_ds is None or lon_ds is None or sm_ds is None:
+            raise ValueError("SMAP file lacks lat/lon or surface soil moisture datasets.")
+        if not (lat_ds[0, 0] == lat_ds[0, -1] and lon_ds[0, 0] == lon_ds[-1, 0]):
+            raise ValueError("Per-pixel resampling needs a separable (EASE-Grid 2.0) SMAP grid.")
+        row0, row1, col0, col1 = smap_grid.find_window(lat_ds, lon_ds, bounds)
+        row0, col0 = max(row0 - 1, 0), max(col0 - 1, 0)
+        row1, col1 = min(row1 + 1, lat_ds.shape[0]), min(col1 + 1, lat_ds.shape[1])
+        sm = smap_grid.read_window(sm_ds, [row0, row1, col0, col1])
+        instrument.count("bytes_read", sm.nbytes)
+        lat = lat_ds[row0:row1, col0].astype(np.float64)
+        lon = lon_ds[row0, col0:col1].astype(np.float64)
+    return lat, lon, np.clip(sm / 0.5, 0, 1)
+
+def _fractional_index(coords, values):
+    """Fractional positions of values along a monotonic coordinate vector (clamped at the edges)."""
+    index = np.arange(coords.size, dtype=np.float64)
+    if coords.size > 1 and coords[0] > coords[-1]:
+        return np.interp(values, coords[::-1], index[::-1])
+    return np.interp(values, coords, index)
+
+def resample_bilinear(grid, lat, lon, pixel_lat, pixel_lon):
+    """Bilinear interpolation of a (lat, lon) grid at pixel coordinates, skipping NaN neighbours."""
+    r = _fractional_index(lat, pixel_lat)
+    c = _fractional_index(lon, pixel_lon)
+    r0 = np.minimum(np.floor(r).astype(np.intp), grid.shape[0] - 1)
+    c0 = np.minimum(np.floor(c).astype(np.intp), grid.shape[1] - 1)
+    r1, c1 = np.minimum(r0 + 1, grid.shape[0] - 1), np.minimum(c0 + 1, grid.shape[1] - 1)
+    fr, fc = r - r0, c - c0
+
+    total = np.zeros(r.shape, dtype=np.float64)
+    weight = np.zeros(r.shape, dtype=np.float64)
+    for rows, cols, w in ((r0, c0, (1 - fr) * (1 - fc)), (r0, c1, (1 - fr) * fc),
+                          (r1, c0, fr * (1 - fc)), (r1, c1, fr * fc)):
+        v = grid[rows, cols]
+        ok = ~np.isnan(v)
+        total[ok] += v[ok] * w[ok]
+        weight[ok] += w[ok]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(weight > 0, total / weight, np.nan)
+
+def _block_windows(window, size):
+    """Windows of at most size x size pixels tiling `window` (in source raster coordinates)."""
+    row0, col0 = int(window.row_off), int(window.col_off)
+    for r in range(0, int(window.height), size):
+        for c in range(0, int(window.width), size):
+            yield Window(col0 + c, row0 + r, min(size, int(window.width) - c), min(size, int(window.height) - r))
+
+def _pixel_lonlat(src, block):
+    """WGS84 coordinates of the pixel centres of one block."""
+    t = windows.transform(block, src.transform)
+    cols, rows = np.meshgrid(np.arange(int(block.width)) + 0.5, np.arange(int(block.height)) + 0.5)
+    xs, ys = t * (cols.ravel(), rows.ravel())
+    lon, lat = warp_transform(src.crs, "EPSG:4326", xs, ys)
+    shape = (int(block.height), int(block.width))
+    return np.asarray(lat).reshape(shape), np.asarray(lon).reshape(shape)
+
+def rsi_block(lst, qc, nodata, m_norm):
+    """Per-pixel RSI with the weights and LST scaling of process_data.build_record. Pixels with no
+    valid LST are NaN; pixels without SMAP moisture use the neutral m_norm of 0.5."""
+    lst = lst.astype(np.float32)
+    if qc is not None:
+        lst[qc != 0] = np.nan
+    if nodata is not None:
+        lst[lst == nodata] = np.nan
+    lst = lst * 0.02 - 273.15
+    lst[lst < -50] = np.nan
+    t_norm = np.clip(lst / 40, 0, 1)
+    m_norm = np.where(np.isnan(m_norm), 0.5, m_norm)
+    return (0.6 * t_norm + 0.4 * (1 - m_norm)).astype(np.float32)
+
+def _overview_factors(width, height, tile):
+    """Decimation factors down to the first level that fits in one tile, as GDAL does."""
+    factors = []
+    factor = 2
+    while max(width, height) / (factor // 2) > tile:
+        factors.append(factor)
+        factor *= 2
+    return factors
+
+def write_rsi_cog(lst_path, smap_path, aoi, out_path, size=None):
+    """Writes the per-pixel RSI of one AOI on the LST grid of one ECOSTRESS granule as a COG.
+
+    The AOI window is processed block by block: LST/QC are read per block, SMAP moisture is
+    resampled onto the block's pixels and pixels outside the AOI geometry are set to nodata.
+    Blocks go to a tiled intermediate GeoTIFF, which gets internal overviews and is copied to
+    a Cloud-Optimized GeoTIFF. Returns a summary dict, or None if the tile misses the AOI.
+    Errors are raised to the caller.
+    """
+    size = size or block_size()
+    with instrument.span("raster.write", file=os.path.basename(lst_path), aoi=aoi["name"]) as s, \
+            rasterio.Env(GDAL_CACHEMAX=GDAL_CACHE_MB), remote_io.open_raster(lst_path) as src:
+        if not src.crs:
+            raise ValueError("Source raster has no CRS specified.")
+        warped = transform_geom("EPSG:4326", src.crs, aoi["geometry"])
+        window = ecostress_grid.warped_window(src, warped)
+        if window is None:
+            return None
+
+        bounds = transform_bounds(src.crs, "EPSG:4326", *windows.bounds(window, src.transform))
+        grid = read_smap_grid(smap_path, bounds) if smap_path else None
+
+        qc_path = lst_path.replace('_LST.tif', '_QC.tif')
+        qc_src = remote_io.open_raster(qc_path) if remote_io.exists(qc_path) else None
+        # Off-grid QC is resampled per block onto the LST grid instead of read by window
+        qc_aligned = qc_src is None or (qc_src.crs == src.crs and qc_src.transform == src.transform
+                                         and qc_src.shape == src.shape)
+        if not qc_aligned:
+            print(f"  - Warning: QC grid of {os.path.basename(qc_path)} differs from LST; "
+                  "resampling it (nearest) onto the LST grid.")
+
+        os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+        tmp_path = out_path + ".tmp.tif"
+        profile = {"driver": "GTiff", "width": int(window.width), "height": int(window.height), "count": 1,
+                   "dtype": "float32", "nodata": np.nan, "crs": src.crs,
+                   "transform": windows.transform(window, src.transform), "tiled": True,
+                   "blockxsize": size, "blockysize": size, "compress": "deflate", "predictor": 3}
+        total, valid = 0.0, 0
+        try:
+            with rasterio.open(tmp_path, "w", **profile) as dst:
+                for block in _block_windows(window, size):
+                    lst = src.read(1, window=block)
+                    if qc_src is None:
+                        qc = None
+                    elif qc_aligned:
+                        qc = qc_src.read(1, window=block)
+                    else:
+                        qc = ecostress_grid.read_onto(qc_src, src.crs, windows.transform(block, src.transform),
+                                                      (int(block.height), int(block.width)))
+                    s.count("bytes_read", lst.nbytes + (qc.nbytes if qc is not None else 0))
+                    if grid is not None:
+                        pixel_lat, pixel_lon = _pixel_lonlat(src, block)
+                        m_norm = resample_bilinear(grid[2], grid[0], grid[1], pixel_lat, pixel_lon)
+                    else:
+                        m_norm = np.full(lst.shape, np.nan)
+                    rsi = rsi_block(lst, qc, src.nodata, m_norm)
+                    outside = geometry_mask([warped], out_shape=lst.shape, transform=windows.transform(block, src.transform))
+                    rsi[outside] = np.nan
+                    ok = ~np.isnan(rsi)
+                    total += float(rsi[ok].sum())
+                    valid += int(ok.sum())
+                    dst.write(rsi, 1, window=Window(int(block.col_off - window.col_off),
+                                                    int(block.row_off - window.row_off), block.width, block.height))
+                    s.count("blocks")
+            with rasterio.open(tmp_path, "r+") as dst:
+                dst.build_overviews(_overview_factors(dst.width, dst.height, size), Resampling.average)
+            rasterio.shutil.copy(tmp_path, out_path + ".part", driver="COG", **dict(COG_OPTIONS, blocksize=size))
+            os.replace(out_path + ".part", out_path)
+        finally:
+            if qc_src is not None:
+                qc_src.close()
+            for path in (tmp_path, tmp_path + ".ovr", out_path + ".part"):
+                if os.path.exists(path):
+                    os.remove(path)
+        s.count("pixels", valid)
+
+    return {"aoi": aoi["name"], "path": out_path, "width": profile["width"], "height": profile["height"],
+            "valid_pixels": valid, "rsi_mean": round(total / valid, 4) if valid else None}
+
+def raster_name(lst_path, aoi_name):
+    return f"{aoi_name}/{os.path.basename(lst_path).replace('_LST.tif', '_RSI.tif')}"
+
+def write_rasters(pairs, aois, out_dir, size=None):
+    """Writes one RSI COG per (AOI, ECOSTRESS granule) for [(eco_time, lst_path, smap_path or None)]
+    pairs. Failures are reported and skipped; returns the summaries of the written files."""
+    written = []
+    for eco_time, lst_path, smap_path in pairs:
+        for aoi in aois:
+            out_path = os.path.join(out_dir, raster_name(lst_path, aoi["name"]))
+            try:
+                summary = write_rsi_cog(lst_path, smap_path, aoi, out_path, size)
+            except Exception as e:
+                print(f"Error writing RSI raster for {aoi['name']} from {os.path.basename(lst_path)}: {e}")
+                continue
+            if summary is None:
+                continue
+            summary["timestamp"] = eco_time.isoformat() + "Z"
+            print(f"  - RSI raster [{aoi['name']}]: {summary['width']}x{summary['height']} px, "
+                  f"mean {summary['rsi_mean']} -> {out_path}")
+            written.append(summary)
+    return written
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (4, 5):
+        print("Usage: python rsi_raster.py <LST.tif> <minx,miny,maxx,maxy> <out.tif> [SMAP.h5]")
+        sys.exit(1)
+    bbox = tuple(map(float, sys.argv[2].split(',')))
+    result = write_rsi_cog(sys.argv[1], sys.argv[4] if len(sys.argv) == 5 else None, make_aoi("aoi", bbox), sys.argv[3])
+    print(result if result else "Tile does not intersect the AOI.")
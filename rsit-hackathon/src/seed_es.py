@@ -1,10 +1,13 @@
 import os
-import random
+import sys
+import time
+import hashlib
+import argparse
 import numpy as np
-import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
 from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
+from elasticsearch.helpers import parallel_bulk
+import instrument
 
 def get_es_client():
     try:
@@ -21,32 +24,48 @@ def get_es_client():
         print(f"Error connecting to Elasticsearch: {e}")
     return None
 
-def create_time_series_data(days, points_per_day, aois):
-    docs = []
+def doc_id(aoi, timestamp):
+    """Deterministic _id so re-ingesting the same (aoi, timestamp) overwrites instead of duplicating.
+    Also stored as the keyword field doc_id, the sort tiebreaker of incremental exports."""
+    return hashlib.sha1(f"{aoi}|{timestamp}".encode()).hexdigest()
+
+def generate_aoi_series(base_time, n_points, points_per_day, rng):
+    """Vectorized series for one AOI: `points_per_day` offsets, weekly RSI cycle and 30-day price cycle with noise.
+
+    Offsets are whole seconds computed in integers, so cadences that do not divide a minute
+    neither drift nor collide (up to one point per second).
+    """
+    offsets = np.arange(n_points, dtype=np.int64) * 86400 // points_per_day
+    hours = offsets / 3600.0
+    days = np.floor(hours / 24)
+    rsi_base = 0.5 + 0.2 * np.sin(2 * np.pi * hours / (24 * 7)) # Weekly seasonality
+    rsi = np.round(np.clip(rsi_base + rng.uniform(-0.05, 0.05, n_points), 0, 1), 4)
+    price = 150 + 20 * np.sin(2 * np.pi * days / 30) + rng.uniform(-5, 5, n_points) # Monthly seasonality
+    price_shift3 = np.round(price * (1 + rng.uniform(-0.05, 0.05, n_points)), 2)
+    timestamps = np.datetime64(base_time, 'us') - offsets.astype('timedelta64[s]')
+    return timestamps, rsi, np.round(price, 2), price_shift3
+
+def create_time_series_data(days, points_per_day, aois, index_name="rsit-rsi-000001", seed=None, aoi_chunk=64):
+    """Lazily yields bulk actions for every AOI, generating the series with NumPy in chunks of AOIs."""
     base_time = datetime.now()
-    for aoi in aois:
-        for day in range(days):
-            for point in range(points_per_day):
-                timestamp = base_time - timedelta(days=day, hours=point)
-                # Simulate some seasonality and noise
-                rsi_base = 0.5 + 0.2 * np.sin(2 * np.pi * (day * 24 + point) / (24 * 7)) # Weekly seasonality
-                rsi = rsi_base + random.uniform(-0.05, 0.05)
-                price = 150 + 20 * np.sin(2 * np.pi * day / 30) + random.uniform(-5, 5) # Monthly seasonality
-                
-                doc = {
-                    "_index": "rsit-rsi-000001",
-                    "_source": {
-                        "@timestamp": timestamp.isoformat(),
-                        "aoi": aoi,
-                        "rsi": round(np.clip(rsi, 0, 1), 4),
-                        "price": round(price, 2),
-                        "price_shift3": round(price * (1 + random.uniform(-0.05, 0.05)), 2)
-                    }
+    rng = np.random.default_rng(seed)
+    n_points = days * points_per_day
+    for start in range(0, len(aois), aoi_chunk):
+        series = [(aoi, generate_aoi_series(base_time, n_points, points_per_day, rng)) for aoi in aois[start:start + aoi_chunk]]
+        for aoi, (timestamps, rsi, price, price_shift3) in series:
+            columns = (np.datetime_as_string(timestamps, unit='s').tolist(), rsi.tolist(), price.tolist(), price_shift3.tolist())
+            for ts, r, p, p3 in zip(*columns):
+                _id = doc_id(aoi, ts)
+                yield {
+                    "_index": index_name,
+                    "_id": _id,
+                    "_source": {"@timestamp": ts, "aoi": aoi, "doc_id": _id, "rsi": r, "price": p, "price_shift3": p3}
                 }
-                docs.append(doc)
-    return docs
 
-def seed_elasticsearch(client):
+def seed_elasticsearch(client, days=90, points_per_day=24, aois=("ashburn", "phoenix", "dallas"), seed=None,
+                       chunk_size=2000, threads=4, max_chunk_bytes=10 * 1024 * 1024):
+    if not 1 <= points_per_day <= 86400:
+        raise ValueError(f"points_per_day must be between 1 and 86400 (one point per second), got {points_per_day}.")
     template_name = "rsit-rsi-template"
     template_body = {
         "index_patterns": ["rsit-rsi-*"],
@@ -55,6 +74,7 @@ def seed_elasticsearch(client):
                 "properties": {
                     "@timestamp": {"type": "date"},
                     "aoi": {"type": "keyword"},
+                    "doc_id": {"type": "keyword"},
                     "rsi": {"type": "float"},
                     "price": {"type": "float"},
                     "price_shift3": {"type": "float"}
@@ -79,20 +99,54 @@ def seed_elasticsearch(client):
     print(f"Creating index '{index_name}'...")
     client.indices.create(index=index_name)
 
-    print("Generating 90 days of sample time series data...")
-    aois = ["ashburn", "phoenix", "dallas"]
-    # Generate data for 90 days, with one point per hour
-    documents = create_time_series_data(days=90, points_per_day=24, aois=aois)
-    
+    print(f"Generating {days} days x {points_per_day} points of sample data for {len(aois)} AOIs...")
+    documents = create_time_series_data(days=days, points_per_day=points_per_day, aois=list(aois), index_name=index_name, seed=seed)
+    total = days * points_per_day * len(aois)
+
+    # Refresh is disabled during the load and restored afterwards
+    client.indices.put_settings(index=index_name, body={"index": {"refresh_interval": "-1"}})
     try:
-        print(f"Bulk indexing {len(documents)} documents...")
-        success, _ = bulk(client, documents, index=index_name, raise_on_error=True)
-        print(f"Successfully indexed {success} documents.")
-        client.indices.refresh(index=index_name)
+        print(f"Bulk indexing {total} documents with {threads} threads, {chunk_size} docs per request...")
+        start = time.perf_counter()
+        success, failed = 0, 0
+        with instrument.span("seed.bulk", docs=total, threads=threads, chunk_size=chunk_size) as span:
+            for ok, item in parallel_bulk(client, documents, thread_count=threads, chunk_size=chunk_size,
+                                          max_chunk_bytes=max_chunk_bytes, raise_on_error=False):
+                if ok:
+                    success += 1
+                else:
+                    failed += 1
+                    if failed <= 5:
+                        print(f"Failed to index document: {item}")
+            span.count("indexed", success)
+            span.count("failed", failed)
+        elapsed = time.perf_counter() - start
+        print(f"Successfully indexed {success} documents ({failed} failed) in {elapsed:.1f}s, {success / max(elapsed, 1e-9):.0f} docs/sec.")
     except Exception as e:
         print(f"Error bulk indexing documents: {e}")
+    finally:
+        client.indices.put_settings(index=index_name, body={"index": {"refresh_interval": None}})
+        client.indices.refresh(index=index_name)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Seed Elasticsearch with synthetic RSI time series.")
+    parser.add_argument("--days", type=int, default=90, help="Time span in days (default: 90)")
+    parser.add_argument("--points-per-day", type=int, default=24, help="Cadence as points per day (default: 24, hourly)")
+    parser.add_argument("--aois", default="ashburn,phoenix,dallas", help="Comma-separated AOI names")
+    parser.add_argument("--num-aois", type=int, default=0, help="Generate this many synthetic AOIs (aoi-00000, ...) instead of --aois")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible data")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="Documents per bulk request")
+    parser.add_argument("--threads", type=int, default=4, help="Concurrent bulk requests")
+    return parser.parse_args()
 
 if __name__ == "__main__":
+    args = parse_args()
+    if not 1 <= args.points_per_day <= 86400:
+        print("--points-per-day must be between 1 and 86400 (one point per second).")
+        sys.exit(1)
+    aois = [f"aoi-{i:05d}" for i in range(args.num_aois)] if args.num_aois else args.aois.split(",")
     es = get_es_client()
     if es:
-        seed_elasticsearch(es)
+        with instrument.span("seed_es", aois=len(aois), days=args.days):
+            seed_elasticsearch(es, days=args.days, points_per_day=args.points_per_day, aois=aois, seed=args.seed,
+                               chunk_size=args.chunk_size, threads=args.threads)
@@ -0,0 +1,68 @@
+import os
+import numpy as np
+import json_cache
+
+DEFAULT_INDEX_FILE = os.path.join(json_cache.CACHE_DIR, "smap_windows.json")
+
+# HDF5 chunk cache for hyperslab reads: large enough for the few chunks an AOI window touches,
+# with a prime slot count and w0=1 so fully read chunks are evicted first.
+CHUNK_CACHE = {"rdcc_nbytes": 4 * 1024 ** 2, "rdcc_nslots": 10007, "rdcc_w0": 1.0}
+
+_index = None
+
+def index_file():
+    return os.environ.get("SMAP_WINDOW_INDEX", DEFAULT_INDEX_FILE)
+
+def _load_index():
+    global _index
+    if _index is None:
+        _index = json_cache.load(index_file())
+    return _index
+
+def _nearest_span(coords, lo, hi):
+    """Indices of coords within [lo, hi], or the single nearest index when the range falls inside one cell."""
+    idx = np.nonzero((coords >= lo) & (coords <= hi))[0]
+    if idx.size:
+        return int(idx.min()), int(idx.max()) + 1
+    nearest = int(np.argmin(np.abs(coords - (lo + hi) / 2)))
+    return nearest, nearest + 1
+
+def compute_window(lat_ds, lon_ds, bbox):
+    """Maps a (minx, miny, maxx, maxy) bbox to a (row0, row1, col0, col1) window of a lat/lon grid.
+
+    Global EASE-Grid 2.0 is separable (latitude depends on the row, longitude on the column),
+    so only one column of latitudes and one row of longitudes are read. Other grids fall back
+    to a full 2-D lookup.
+    """
+    minx, miny, maxx, maxy = bbox
+    if lat_ds[0, 0] == lat_ds[0, -1] and lon_ds[0, 0] == lon_ds[-1, 0]:
+        row0, row1 = _nearest_span(lat_ds[:, 0], miny, maxy)
+        col0, col1 = _nearest_span(lon_ds[0, :], minx, maxx)
+        return [row0, row1, col0, col1]
+
+    lats, lons = lat_ds[:], lon_ds[:]
+    rows, cols = np.nonzero((lats >= miny) & (lats <= maxy) & (lons >= minx) & (lons <= maxx))
+    if rows.size == 0:
+        dist = np.abs(lats - (miny + maxy) / 2) + np.abs(lons - (minx + maxx) / 2)
+        r, c = np.unravel_index(np.nanargmin(dist), dist.shape)
+        return [int(r), int(r) + 1, int(c), int(c) + 1]
+    return [int(rows.min()), int(rows.max()) + 1, int(cols.min()), int(cols.max()) + 1]
+
+def find_window(lat_ds, lon_ds, bbox):
+    """Returns the grid window for a bbox, computing it only once per (grid shape, bbox)."""
+    key = f"{lat_ds.shape[0]}x{lat_ds.shape[1]}|" + ",".join(f"{v:.6f}" for v in bbox)
+    index = _load_index()
+    if key not in index:
+        index[key] = compute_window(lat_ds, lon_ds, bbox)
+        json_cache.update(index_file(), key, index[key])
+    return index[key]
+
+def read_window(dataset, window):
+    """Reads only the window hyperslab of a 2-D dataset, with fill and negative values as NaN."""
+    row0, row1, col0, col1 = window
+    data = dataset[row0:row1, col0:col1].astype(np.float32)
+    fill = dataset.attrs.get("_FillValue")
+    if fill is not None:
+        data[data == np.float32(np.ravel(fill)[0])] = np.nan
+    data[data < 0] = np.nan
+    return data
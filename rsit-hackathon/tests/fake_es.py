@@ -0,0 +1,115 @@
+"""In-memory stand-in for the parts of the Elasticsearch client predict_model uses.
+
+Each ML job follows a script of states: every get_job_stats, get_datafeed_stats and forecast
+status lookup returns the next entry of its current list, repeating the last one once it runs
+out. close_job, open_job and start_datafeed switch to the list scripted for that action.
+
+    es = FakeES({"job-a": script(job="closed", opening=["opening", "opened"],
+                                 forecast=[None, "finished"], predictions=[0.1, 0.2])})
+"""
+import threading
+
+
+def script(job="opened", opening=("opened",), datafeed="started", starting=("started",),
+           forecast=("finished",), predictions=(), assignment_explanation="", forecast_error=None):
+    """Scripted behaviour of one ML job.
+
+    `job` and `datafeed` are the initial states; `opening` and `starting` the states polled
+    after open_job and start_datafeed. `forecast` lists the forecast_status seen by successive
+    polls (None: no stats document yet). When `forecast_error` is set, ml.forecast raises
+    with that message.
+    """
+    return {"job": job, "opening": list(opening), "datafeed": datafeed, "starting": list(starting),
+            "forecast": list(forecast), "predictions": list(predictions),
+            "assignment_explanation": assignment_explanation, "forecast_error": forecast_error}
+
+
+class _Step:
+    """Returns the entries of a list one per call, then keeps returning the last one."""
+
+    def __init__(self, values):
+        self.values = list(values)
+        self.calls = 0
+
+    def next(self):
+        value = self.values[min(self.calls, len(self.values) - 1)]
+        self.calls += 1
+        return value
+
+
+class FakeML:
+    def __init__(self, es):
+        self._es = es
+
+    def get_job_stats(self, job_id):
+        with self._es.lock:
+            job = self._es.scripts[job_id]
+            state = self._es.job_states[job_id].next()
+        return {"jobs": [{"job_id": job_id, "state": state,
+                          "assignment_explanation": job["assignment_explanation"]}]}
+
+    def get_datafeed_stats(self, datafeed_id):
+        job_id = datafeed_id.removeprefix("datafeed-")
+        with self._es.lock:
+            state = self._es.datafeed_states[job_id].next()
+        return {"datafeeds": [{"datafeed_id": datafeed_id, "state": state}]}
+
+    def close_job(self, job_id, **kwargs):
+        self._es.record("close_job", job_id)
+        with self._es.lock:
+            self._es.job_states[job_id] = _Step(["closed"])
+
+    def open_job(self, job_id, **kwargs):
+        self._es.record("open_job", job_id)
+        with self._es.lock:
+            self._es.job_states[job_id] = _Step(self._es.scripts[job_id]["opening"])
+
+    def start_datafeed(self, datafeed_id, **kwargs):
+        self._es.record("start_datafeed", datafeed_id)
+        job_id = datafeed_id.removeprefix("datafeed-")
+        with self._es.lock:
+            self._es.datafeed_states[job_id] = _Step(self._es.scripts[job_id]["starting"])
+
+    def forecast(self, job_id, duration):
+        self._es.record("forecast", job_id)
+        if self._es.scripts[job_id]["forecast_error"]:
+            raise RuntimeError(self._es.scripts[job_id]["forecast_error"])
+        return {"acknowledged": True, "forecast_id": f"fc-{job_id}"}
+
+
+class FakeES:
+    def __init__(self, scripts):
+        self.scripts = scripts
+        self.lock = threading.Lock()
+        self.calls = []
+        self.job_states = {j: _Step([s["job"]]) for j, s in scripts.items()}
+        self.datafeed_states = {j: _Step([s["datafeed"]]) for j, s in scripts.items()}
+        self.forecast_states = {j: _Step(s["forecast"]) for j, s in scripts.items()}
+        self.ml = FakeML(self)
+
+    def record(self, name, arg):
+        with self.lock:
+            self.calls.append((name, arg))
+
+    def _hits(self, query):
+        terms = {}
+        for f in query["query"]["bool"]["filter"]:
+            terms.update(f["term"])
+        job_id = terms["job_id"]
+        if job_id not in self.scripts or terms["forecast_id"] != f"fc-{job_id}":
+            return []
+        if terms["result_type"] == "model_forecast_request_stats":
+            with self.lock:
+                status = self.forecast_states[job_id].next()
+            return [] if status is None else [{"_source": {"forecast_status": status}}]
+        if terms["result_type"] == "model_forecast":
+            return [{"_source": {"forecast_prediction": p}} for p in self.scripts[job_id]["predictions"]][:query.get("size", 10)]
+        return []
+
+    def search(self, index=None, body=None, **kwargs):
+        self.record("search", index)
+        return {"hits": {"hits": self._hits(body)}}
+
+    def msearch(self, body):
+        self.record("msearch", len(body) // 2)
+        return {"responses": [{"hits": {"hits": self._hits(query)}} for query in body[1::2]]}
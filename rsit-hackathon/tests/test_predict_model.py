@@ -0,0 +1,107 @@
+"""get_es_forecasts and wait_until against the scripted fake ES client.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import predict_model
+from fake_es import FakeES, script
+
+
+class FakeClock:
+    """time.monotonic/time.sleep replacement: sleeping advances the clock instantly."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+        self.lock = threading.Lock()
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.sleeps.append(seconds)
+            self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(predict_model, "time", clock)
+    return clock
+
+
+def test_wait_until_backs_off_and_stops_at_deadline(clock):
+    calls = []
+    result = predict_model.wait_until(lambda: calls.append(1) and False, clock.now + 20)
+    assert result is None
+    assert clock.sleeps == [0.5, 1.0, 2.0, 4.0, 8.0, 4.5]
+    assert clock.now == 1020.0
+    assert len(calls) == 7
+
+
+def test_wait_until_returns_first_truthy_value(clock):
+    values = iter([None, 0, "ready"])
+    assert predict_model.wait_until(lambda: next(values), clock.now + 60) == "ready"
+    assert clock.sleeps == [0.5, 1.0]
+
+
+def test_forecasts_for_several_aois(clock):
+    es = FakeES({
+        "rsit-rsi-detector-a": script(forecast=[None, "started", "finished"], predictions=[0.1, 0.2, 0.3, 0.4]),
+        "rsit-rsi-detector-b": script(job="closed", opening=["opening", "opening", "opened"], datafeed="stopped",
+                                      starting=["starting", "started"], forecast=["scheduled", "finished"],
+                                      predictions=[0.5, 0.6, 0.7]),
+        "rsit-rsi-detector-c": script(forecast=["finished"], predictions=[]),
+    })
+    results = predict_model.get_es_forecasts(es, list(es.scripts), forecast_days=3)
+
+    assert results == {"rsit-rsi-detector-a": [0.1, 0.2, 0.3],
+                       "rsit-rsi-detector-b": [0.5, 0.6, 0.7],
+                       "rsit-rsi-detector-c": None}
+    assert ("open_job", "rsit-rsi-detector-b") in es.calls
+    assert ("start_datafeed", "datafeed-rsit-rsi-detector-b") in es.calls
+    assert not any(c[1] == "rsit-rsi-detector-a" for c in es.calls if c[0] in ("close_job", "open_job"))
+    # Status polls for all jobs share one msearch per round, and results come in one more
+    assert [c for c in es.calls if c[0] == "msearch"] == [("msearch", 3), ("msearch", 2), ("msearch", 1), ("msearch", 3)]
+
+
+def test_forecasts_with_timeout_and_failures(clock):
+    es = FakeES({
+        "ok": script(forecast=[None, "finished"], predictions=[0.2, 0.3]),
+        "slow": script(forecast=["started"]),
+        "failed": script(forecast=["failed"], predictions=[0.9, 0.9]),
+        "stuck": script(job="opening", assignment_explanation="no suitable nodes found"),
+        "rejected": script(forecast_error="forecast limit reached"),
+    })
+    results = predict_model.get_es_forecasts(es, list(es.scripts), forecast_days=2, timeout=30)
+
+    assert results == {"ok": [0.2, 0.3], "slow": None, "failed": None,
+                       "stuck": None, "rejected": None}
+    assert ("open_job", "stuck") not in es.calls
+    assert ("forecast", "rejected") in es.calls
+    assert not any(c[0] == "forecast" and c[1] == "stuck" for c in es.calls)
+    # Status polls stop at the deadline shared by every job
+    assert clock.now == 1030.0
+
+
+def test_preparation_timeouts(clock):
+    es = FakeES({"never_opens": script(job="closed", opening=["opening"]),
+                 "no_datafeed": script(datafeed="stopped", starting=["starting"])})
+    results = predict_model.get_es_forecasts(es, list(es.scripts), forecast_days=2, timeout=30)
+
+    assert results == {"never_opens": None, "no_datafeed": None}
+    assert sorted(es.calls) == [("close_job", "never_opens"), ("open_job", "never_opens"),
+                                ("start_datafeed", "datafeed-no_datafeed")]
+
+
+def test_single_forecast_wrapper(clock):
+    es = FakeES({"job": script(predictions=[0.4, 0.5])})
+    assert predict_model.get_es_forecast(es, "job", 2) == [0.4, 0.5]